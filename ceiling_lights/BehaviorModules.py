@@ -7,14 +7,29 @@ colorfull things).
 
 This module requires these modules:
 - Color, ws and PixelStrip classes from the rpi_ws281x module;
+- the strip manager module that owns the ledstrips;
 - Threading to allow visual effects to happen in their own non-blocking thread;
+- the animation cache and framebuffer modules to precompute animations and play them back;
+- the frame_sequence module to play precompiled frame sequence files;
+- the frame_scheduler module to animate the scheduled behaviors without a thread of their own;
+- the audio_stream module to capture and analyze the audio of the AudioReactive behavior (imported when it's used);
+- the pixel_stream module to receive the frames of the Stream behavior over the network (imported when it's used,
+  so the lights that don't stream don't load asyncio);
 """
 
 import threading
 import sys
+import os
 from rpi_ws281x import Color, PixelStrip, ws
+from animation_cache import cache
+from strip_manager import strips
+from frame_scheduler import scheduler
+from framebuffer import newFrame, readFrame, writeFrame, writePixels, FrameBuffer, LED_TYPECODE
+from frame_sequence import FrameSequence
+from array import array
+from operator import itemgetter
 from random import randint
-from time import sleep
+from time import sleep, monotonic, time, localtime
 
 
 #
@@ -23,8 +38,24 @@ from time import sleep
 class BehaviorModule():
   """
   Template Class for ledstrip behavior modules.
+
+  Behavior modules are looked up by name through the behavior_registry module.  The 'parameters' class attribute
+  describes the settings that the behavior accepts and is exposed through the '/behaviors' API endpoint:
+    parameters={
+      "<name>": {
+        "type": "int" | "float" | "bool" | "str" | "choice" | "palette",
+        "default": <value>,
+        "min": <value>,                 # optional for "int" and "float";
+        "max": <value>,                 # optional for "int" and "float";
+        "choices": [<value>, ...],      # required for "choice";
+        "description": "<text>"
+      }
+    }
+  A palette is a list of colors, with each color a list of [red, green, blue] or [red, green, blue, white] values.
+  Behaviors precompute everything they need from the parameter values in 'compile()', which is called each
+  time the parameters change, so their animation loop doesn't need to parse or convert anything.
   """
-  knownBehaviors=["Default", "Christmas", "Fluid"]
+  parameters={}
 
   def __init__(self, name: str="Blank", ledSettings: dict=None):
     """ Constructor of our BehaviorModule instance.
@@ -46,6 +77,9 @@ class BehaviorModule():
                             "ledChannel": 0,
                             "stripGpioPin": 18,           # RaspberryPI GPIO pin that is used to drive the LED strip;
                             "strip": None,                # Instance of the rpi_ws281x LED strip;
+                            "powerLimiter": None,         # Optional PowerLimiter to keep the strip within its power budget;
+                            "holdShow": False,            # Keep the frame in the buffer until the batch update shows it;
+                            "pendingShow": False,         # A frame is waiting in the buffer to be shown;
                             "lightState": [True|False]    # Is the light "off" (false) or "on" (true);
                           }
     """
@@ -61,6 +95,10 @@ class BehaviorModule():
     #       SK6812_STRIP_BGRW
 #    self._stripType=ws.SK6812_STRIP_RGBW
     self._stripType=ws.SK6812_STRIP_GRBW
+    # Start with the default values for the parameters of this behavior:
+    self._parameterValues={_name: _spec["default"] for _name, _spec in self.parameters.items()}
+    # Sparse effects keep their frame in a FrameBuffer that only writes the leds that changed:
+    self._buffer=None
     self.log("Constructor")
     self.log(f"ledSettings: {ledSettings}", debug=True)
 
@@ -78,9 +116,16 @@ class BehaviorModule():
     """ Method to release and cleanup resources. """
     # Release the ledstrip properly if we have one set:
     if isinstance(self._ledSettings["strip"], PixelStrip):
-      self._ledSettings["strip"]._cleanup()
+      strips.release(self._ledSettings["stripGpioPin"], self._ledSettings["ledChannel"])
       self._ledSettings["strip"]=None
 
+  def _initStrip(self):
+    """ Get the ledstrip of the light from the strip manager if we don't have it yet.
+    The strip manager owns the hardware and only sets it up once, so switching behaviors never resets the strip.
+    """
+    if self._ledSettings["strip"] == None:
+      self._ledSettings["strip"]=strips.acquire(self._ledSettings, self._stripType)
+
   @property
   def name(self) -> str:
     """ Return the name of this behavior module. """
@@ -96,6 +141,107 @@ class BehaviorModule():
     """ Set the debug level. """
     self._debug=flag
 
+  @property
+  def frameStats(self) -> dict:
+    """ Return the statistics of the leds written per frame (None if the behavior doesn't use a FrameBuffer). """
+    if self._buffer is None:
+      return None
+    return self._buffer.stats
+
+  def _sparseFrame(self, strip) -> FrameBuffer:
+    """ Return the FrameBuffer of the behavior, starting from what's on the strip if it's new (or was resized). """
+    if self._buffer is None or self._buffer.ledCount != self._ledSettings["ledCount"]:
+      self._buffer=FrameBuffer(self._ledSettings["ledCount"])
+      self._buffer.write(readFrame(strip))
+    return self._buffer
+
+  @property
+  def parameterValues(self) -> dict:
+    """ Return a copy of the current parameter values of this behavior. """
+    return dict(self._parameterValues)
+
+  def setParameters(self, values: dict):
+    """ Validate and apply new values for (some of) the parameters and recompile the behavior.
+    Nothing is changed if any of the values is invalid.
+
+    Arguments:
+      values (dict): parameter name -> new value;
+    """
+    _values=dict(self._parameterValues)
+    _values.update(self.validateParameters(values, self._name))
+    self._parameterValues=_values
+    self.log(f"parameters: {self._parameterValues}", debug=True)
+    self.compile()
+
+  @classmethod
+  def validateParameters(cls, values: dict, behaviorName: str) -> dict:
+    """ Return the parameter values converted to their types or raise an exception if any of them is invalid.
+    This doesn't need an instance of the behavior, so updates can be validated before anything gets changed.
+
+    Arguments:
+      values (dict): parameter name -> new value;
+      behaviorName (str): the name of the behavior (for the error messages);
+    """
+    _values={}
+    for _name, _value in (values or {}).items():
+      if not _name in cls.parameters: raise Exception(f"Behavior '{behaviorName}' has no parameter '{_name}'!")
+      _values[_name]=cls._validateParameter(behaviorName, _name, cls.parameters[_name], _value)
+    return _values
+
+  @classmethod
+  def _validateParameter(cls, behaviorName: str, name: str, spec: dict, value):
+    """ Return the value converted to the type of the parameter or raise an exception if it's not valid. """
+    _type=spec["type"]
+    try:
+      if _type == "int":
+        value=int(value)
+      elif _type == "float":
+        value=float(value)
+      elif _type == "bool":
+        value=value.lower() in ('true', 'yes', 'y', '1') if isinstance(value, str) else bool(value)
+      elif _type == "str":
+        value=str(value)
+      elif _type == "palette":
+        value=[cls._validateColor(_color) for _color in value]
+        if len(value) == 0: raise ValueError("a palette needs at least 1 color")
+    except (TypeError, ValueError) as exc:
+      raise Exception(f"Invalid value '{value}' for parameter '{name}' of behavior '{behaviorName}': {exc}")
+    if _type == "choice" and not value in spec["choices"]:
+      raise Exception(f"Parameter '{name}' of behavior '{behaviorName}' needs to be one of {spec['choices']}!")
+    if "min" in spec and value < spec["min"]:
+      raise Exception(f"Parameter '{name}' of behavior '{behaviorName}' needs to be at least {spec['min']}!")
+    if "max" in spec and value > spec["max"]:
+      raise Exception(f"Parameter '{name}' of behavior '{behaviorName}' needs to be at most {spec['max']}!")
+    return value
+
+  @staticmethod
+  def _validateColor(color) -> list:
+    """ Return a palette color as a [red, green, blue, white] list.  Colors may also be given as a dictionary. """
+    if isinstance(color, dict):
+      color=[color.get("red", 0), color.get("green", 0), color.get("blue", 0), color.get("white", 0)]
+    color=[int(_value) for _value in color]
+    if len(color) == 3:
+      color.append(0)
+    if len(color) != 4: raise ValueError(f"color {color} needs 3 or 4 values")
+    if not all(0 <= _value <= 255 for _value in color): raise ValueError(f"color {color} values need to be between 0 and 255")
+    return color
+
+  def compile(self):
+    """ Precompute whatever the behavior needs from the current parameter values (nothing by default). """
+    pass
+
+  def _show(self, strip):
+    """ Send the led buffer to the strip at the light's brightness, lowered to the light's power budget (if any). """
+    _brightness=self._ledSettings["ledBrightness"]
+    if self._ledSettings.get("powerLimiter") is not None:
+      _brightness=self._ledSettings["powerLimiter"].limit(strip, _brightness)
+    strip.setBrightness(_brightness)
+    if self._ledSettings.get("holdShow"):
+      # The light is part of a batch update that shows the frames of all its lights at once (see ledstrip.RenderTick):
+      self._ledSettings["pendingShow"]=True
+      return
+    strip.show()
+
   def log(self, *args, debug: bool=False):
     """ Simple function to log messages to the console. """
     _log=True
@@ -120,6 +266,12 @@ class BehaviorModule():
     self.log("Off()")
     self.log(f"ledSettings: {self._ledSettings}", debug=True)
 
+  def join(self, timeout: float=None):
+    """ Wait for the thread of the behavior (if it has one) to end after Off(). """
+    _thread=getattr(self, "_thread", None)
+    if _thread is not None and _thread is not threading.current_thread():
+      _thread.join(timeout)
+
 
 #
 #----------------------------------
@@ -154,6 +306,31 @@ class DefaultModule(BehaviorModule):
     self.log("Off()")
     self.Code(state=False)
 
+  def showFrame(self, frame, state: bool=True):
+    """ Show a pre-rendered frame (like the frame of a scene) with a single copy into the strip's buffer.
+
+    Arguments:
+      frame: array or memoryview of Color() values (see the framebuffer module);
+      state (bool): the light's state after showing the frame (a frame of 0 values to turn the light off);
+    """
+    self._initStrip()
+    writeFrame(self._ledSettings["strip"], frame)
+    self._show(self._ledSettings["strip"])
+    self._ledSettings["lightState"]=state
+
+  def showPixels(self, data, channels: int=3):
+    """ Show a frame of packed pixels (like a frame that was pushed through the API) with a single copy into the
+    strip's buffer.
+
+    Arguments:
+      data: bytes-like object with 3 (red, green, blue) or 4 (red, green, blue, white) bytes per led;
+      channels (int): the number of bytes per led: 3 or 4 (default=3);
+    """
+    self._initStrip()
+    writePixels(self._ledSettings["strip"], data, channels)
+    self._show(self._ledSettings["strip"])
+    self._ledSettings["lightState"]=True
+
   def Code(self, state: bool):
     """ Here we have the actual code to turn the ledstrip on or off.
 
@@ -161,20 +338,7 @@ class DefaultModule(BehaviorModule):
       state (bool): True == turn leds on; False == turn leds off
     """
     self.log(f"behavior module '{self._name}' ledSettings: {self._ledSettings}", debug=True)
-    # Initialize the ledstrip if that's not done yet:
-    if self._ledSettings["strip"] == None:
-      # PixelStrip.__init__(self, num, pin, freq_hz=800000, dma=10, invert=False, brightness=255, \
-      #                           channel=0, strip_type=None, gamma=None):
-      self._ledSettings["strip"]=PixelStrip(num=self._ledSettings["ledCount"], \
-                  pin=self._ledSettings["stripGpioPin"], \
-                  freq_hz=self._ledSettings["ledFrequency"], \
-                  dma=self._ledSettings["ledDmaChannel"], \
-                  invert=self._ledSettings["ledInvert"], \
-                  brightness=self._ledSettings["ledBrightness"], \
-                  channel=self._ledSettings["ledChannel"], \
-                  strip_type=self._stripType)
-      # Initialize the library (must be called once before other functions):
-      self._ledSettings["strip"].begin()
+    self._initStrip()
     if state:
       # Turn the leds on.
       # Generate the color setting for each led:
@@ -192,13 +356,10 @@ class DefaultModule(BehaviorModule):
       # Update the brightness of the leds:
       self._ledSettings["strip"].setBrightness(0)
       self.log("turn leds off", debug=True)
-    # Loop and apply the color setting to all leds on the strip:
-    for i in range(self._ledSettings["strip"].numPixels()):
-      self._ledSettings["strip"].setPixelColor(i, color)
-    # Update the brightness of the leds:
-    self._ledSettings["strip"].setBrightness(self._ledSettings["ledBrightness"])
-    # Force the ledstrip to show the applied changes:
-    self._ledSettings["strip"].show()
+    # Apply the color setting to all leds on the strip:
+    writeFrame(self._ledSettings["strip"], newFrame(self._ledSettings["strip"].numPixels(), color))
+    # Update the brightness of the leds and force the ledstrip to show the applied changes:
+    self._show(self._ledSettings["strip"])
     # Set our light status accordingly:
     self._ledSettings["lightState"]=state
 
@@ -211,64 +372,95 @@ class ChristmasModule(BehaviorModule):
   """
   Behavior Module to implement Christmas light effect functionality.
   """
+  parameters={
+    "speed": {"type": "int", "default": 10, "min": 1, "max": 100,
+              "description": "Number of animation steps per second"},
+    "palette": {"type": "palette",
+                "default": [[128, 0,   0,   0],     # red
+                            [128, 64,  0,   0],     # orange
+                            [128, 128, 0,   0],     # yellow
+                            [0,   128, 0,   0],     # green
+                            [0,   128, 128, 0],     # lightblue
+                            [0,   0,   128, 0],     # blue
+                            [64,  0,   64,  0],     # purple
+                            [128, 0,   64,  0]],    # pink
+                "description": "Colors that chase each other over the strip"},
+    "density": {"type": "int", "default": 1, "min": 1, "max": 100,
+                "description": "Number of consecutive leds that get the same color"},
+    "direction": {"type": "choice", "default": "forward", "choices": ["forward", "backward"],
+                  "description": "Direction in which the colors move over the strip"}
+  }
+
   def __init__(self, ledSettings: dict):
     """ Constructor """
     super().__init__(name="Christmas", ledSettings=ledSettings)
     self.log(f"behavior module '{self._name}' ledSettings: {self._ledSettings}", debug=True)
-    self._delayMilliseconds=100
     self._thread=None
+    self.compile()
+
+  def compile(self):
+    """ Precompute the frames of the animation from the parameters.
+
+    The strip shows a window of 'ledCount' colors from a pattern of repeating palette colors.  The window
+    moves 1 led per animation step, so the animation repeats itself after 'palette size * density' steps.
+    The pattern is 1 period longer than the strip so that each frame is a simple window in the pattern:
+      pixel i -> pattern[offset + i]
+    The whole cycle of frames is rendered once into the animation cache and shared by all the lights that
+    run the same animation.  The windows in the pattern are used if the cycle doesn't fit in the cache.
+    """
     # Define colors which will be used by the module.
-    self._DOT_COLORS=[Color(red=128, green=0,   blue=0,   white=0),   # red
-                      Color(red=128, green=64,  blue=0,   white=0),   # orange
-                      Color(red=128, green=128, blue=0,   white=0),   # yellow
-                      Color(red=0,   green=128, blue=0,   white=0),   # green
-                      Color(red=0,   green=128, blue=128, white=0),   # lightblue
-                      Color(red=0,   green=0,   blue=128, white=0),   # blue
-                      Color(red=64,  green=0,   blue=64,  white=0),   # purple
-                      Color(red=128, green=0,   blue=64,  white=0)]   # pink
+    self._DOT_COLORS=[Color(red=_red, green=_green, blue=_blue, white=_white) \
+                        for _red, _green, _blue, _white in self._parameterValues["palette"]]
+    _density=self._parameterValues["density"]
+    _period=len(self._DOT_COLORS) * _density
+    _ledCount=self._ledSettings["ledCount"]
+    _pattern=newFrame(_ledCount + _period)
+    for i in range(len(_pattern)):
+      _pattern[i]=self._DOT_COLORS[(i // _density) % len(self._DOT_COLORS)]
+    _pattern=memoryview(_pattern)
+
+    def _window(offset: int) -> memoryview:
+      return _pattern[offset:offset + _ledCount]
+
+    def _renderFrame(index: int, frame: memoryview):
+      frame[:]=_window(index)
+
+    _cycle=cache.get((self._name, _ledCount, tuple(self._DOT_COLORS), _density), _period, _ledCount, _renderFrame)
+    _frames=_window if _cycle is None else _cycle.frame
+    if self._parameterValues["direction"] == "forward":
+      _step=1
+    else:
+      _step=_period - 1
+    # Swap in all the precomputed values at once so that a running animation never sees a mix of old and new:
+    self._animation=(_frames, _period, _step, 1 / self._parameterValues["speed"], _ledCount)
 
   def run(self):
     self.log("starting the behavior in its own thread...", debug=True)
     offset=0
-    # Initialize the ledstrip if that's not done yet:
-    if self._ledSettings["strip"] == None:
-      # PixelStrip.__init__(self, num, pin, freq_hz=800000, dma=10, invert=False, brightness=255, \
-      #                           channel=0, strip_type=None, gamma=None):
-      self._ledSettings["strip"]=PixelStrip(num=self._ledSettings["ledCount"], \
-                  pin=self._ledSettings["stripGpioPin"], \
-                  freq_hz=self._ledSettings["ledFrequency"], \
-                  dma=self._ledSettings["ledDmaChannel"], \
-                  invert=self._ledSettings["ledInvert"], \
-                  brightness=self._ledSettings["ledBrightness"], \
-                  channel=self._ledSettings["ledChannel"], \
-                  strip_type=self._stripType)
-      # Initialize the library (must be called once before other functions):
-      self._ledSettings["strip"].begin()
+    # Get the ledstrip from the strip manager (it's only set up the first time):
+    self._initStrip()
+    # The number of leds may have changed since the animation was compiled:
+    if self._animation[4] != self._ledSettings["ledCount"]:
+      self.compile()
+    strip=self._ledSettings["strip"]
     # Keep looping in the thread until the user switches off the lights:
     while self._ledSettings["lightState"]:
-      # Update each LED color in the buffer.
-      for i in range(self._ledSettings["ledCount"]):
-        # Pick a color based on LED position and an offset for animation.
-        color=self._DOT_COLORS[(i + offset) % len(self._DOT_COLORS)]
-        # Set the LED color buffer value.
-        self._ledSettings["strip"].setPixelColor(i, color)
-        # Increase offset to animate colors moving.  Will eventually overflow, which is fine.
-        offset += 1
-      # Update the brightness of the leds:
-      self._ledSettings["strip"].setBrightness(self._ledSettings["ledBrightness"])
-      # Force the ledstrip to show the applied changes:
-      self._ledSettings["strip"].show()
-      # Optionally slow down the loop:
-      if self._delayMilliseconds > 0:
-         sleep(self._delayMilliseconds / 1000)
+      frames, period, step, delay, ledCount=self._animation
+      offset%=period
+      # Copy the precomputed frame at the current offset into the LED color buffer:
+      writeFrame(strip, frames(offset))
+      # Move the pattern 1 led for the next step to animate colors moving:
+      offset+=step
+      # Update the brightness of the leds and force the ledstrip to show the applied changes:
+      self._show(strip)
+      # Slow down the loop to the requested speed:
+      sleep(delay)
     # The loop ended.
     self.log("ending Christmas thread...", debug=True)
     # Turn the leds off.
     # The color setting of each led needs to be set to 0:
     self.log("turn leds off", debug=True)
-    color=Color(0, 0, 0, 0)
-    for i in range(self._ledSettings["ledCount"]):
-      self._ledSettings["strip"].setPixelColor(i, color)
+    writeFrame(self._ledSettings["strip"], newFrame(self._ledSettings["ledCount"]))
     # Force the ledstrip to show the applied changes:
     self._ledSettings["strip"].show()
 
@@ -282,7 +474,7 @@ class ChristmasModule(BehaviorModule):
       self._thread=threading.Thread(target=self.run)
       self._thread.start()
     else:
-      if not self._thread.isAlive():
+      if not self._thread.is_alive():
         self.log("Need to start the thread", debug=True)
         self._thread=None
         self._thread=threading.Thread(target=self.run)
@@ -300,79 +492,63 @@ class FluidModule(BehaviorModule):
   """
   Behavior Module to implement Fluid color changing light effect functionality.
   """
+  parameters={
+    "speed": {"type": "int", "default": 10, "min": 1, "max": 100,
+              "description": "Number of color changes per second"},
+    "density": {"type": "int", "default": 100, "min": 1, "max": 100,
+                "description": "Percentage of the leds that get a new color at each change"}
+  }
+
   def __init__(self, ledSettings: dict):
     """ Constructor """
     super().__init__(name="Fluid", ledSettings=ledSettings)
     self.log(f"behavior module '{self._name}' ledSettings: {self._ledSettings}", debug=True)
-    self._delayMilliseconds=100
     self._thread=None
+    self.compile()
+
+  def compile(self):
+    """ Precompute the number of leds to change per step and the delay between steps from the parameters. """
+    _ledCount=self._ledSettings["ledCount"]
+    _changes=max(1, _ledCount * self._parameterValues["density"] // 100)
+    # Changing all the leds writes whole frames, changing some of them picks random leds in a FrameBuffer:
+    _allLeds=_changes == _ledCount
+    self._animation=(_changes, _allLeds, 1 / self._parameterValues["speed"], _ledCount)
 
   def run(self):
     self.log("starting the behavior in its own thread...", debug=True)
-    offset=0
-    # Initialize the ledstrip if that's not done yet:
-    if self._ledSettings["strip"] == None:
-      # PixelStrip.__init__(self, num, pin, freq_hz=800000, dma=10, invert=False, brightness=255, \
-      #                           channel=0, strip_type=None, gamma=None):
-      self._ledSettings["strip"]=PixelStrip(num=self._ledSettings["ledCount"], \
-                  pin=self._ledSettings["stripGpioPin"], \
-                  freq_hz=self._ledSettings["ledFrequency"], \
-                  dma=self._ledSettings["ledDmaChannel"], \
-                  invert=self._ledSettings["ledInvert"], \
-                  brightness=self._ledSettings["ledBrightness"], \
-                  channel=self._ledSettings["ledChannel"], \
-                  strip_type=self._stripType)
-      # Initialize the library (must be called once before other functions):
-      self._ledSettings["strip"].begin()
-    red=0
-    green=0
-    blue=0
-    isRed=True
-    isGreen=False
-    isBlue=False
+    # Get the ledstrip from the strip manager (it's only set up the first time):
+    self._initStrip()
+    # The number of leds may have changed since the animation was compiled:
+    if self._animation[3] != self._ledSettings["ledCount"]:
+      self.compile()
+    strip=self._ledSettings["strip"]
+    # The leds that didn't change keep their color.  Start from what's on the strip now:
+    self._buffer=None
     # Keep looping in the thread until the user switches off the lights:
     while self._ledSettings["lightState"]:
-      # Update each LED color in the buffer:
-      for i in range(self._ledSettings["ledCount"]):
-#        if isRed:
-#          red+=1
-#          if red>255:
-#            red=0
-#            isRed=False
-#            isGreen=True
-#        elif isGreen:
-#          green+=1
-#          if green>255:
-#            green=0
-#            isGreen=False
-#            isBlue=True
-#        elif isBlue:
-#          blue+=1
-#          if blue>255:
-#            blue=0
-#            isBlue=False
-#            isRed=True
-        red=randint(1, 255)
-        green=randint(1, 255)
-        blue=randint(1, 255)
-        color=Color(red=red, green=green, blue=blue, white=0)
-        self._ledSettings["strip"].setPixelColor(i, color)
-#        self._ledSettings["strip"].show()
-      # Update the brightness of the leds:
-      self._ledSettings["strip"].setBrightness(self._ledSettings["ledBrightness"])
-      # Force the ledstrip to show the applied changes:
-      self._ledSettings["strip"].show()
-      # Optionally slow down the loop:
-      if self._delayMilliseconds > 0:
-         sleep(self._delayMilliseconds / 1000)
+      changes, allLeds, delay, ledCount=self._animation
+      if allLeds:
+        # Every led changes.  Tracking them in a FrameBuffer costs more than writing the whole frame at once:
+        self._buffer=None
+        writeFrame(strip, array(LED_TYPECODE, [Color(red=randint(1, 255), green=randint(1, 255), blue=randint(1, 255), white=0) \
+                                               for i in range(ledCount)]))
+      else:
+        frame=self._sparseFrame(strip)
+        # Update the colors of some random leds in the buffer:
+        for i in range(changes):
+          frame.setPixel(randint(0, ledCount - 1), Color(red=randint(1, 255), green=randint(1, 255), blue=randint(1, 255), white=0))
+        # Only the spans of leds that changed go into the strip's buffer:
+        frame.flush(strip)
+      # Update the brightness of the leds and force the ledstrip to show the applied changes:
+      self._show(strip)
+      # Slow down the loop to the requested speed:
+      sleep(delay)
     # The loop ended.
-    self.log("ending Fluid thread...", debug=True)
+    self.log(f"ending Fluid thread... (leds written: {self.frameStats})", debug=True)
     # Turn the leds off.
     # The color setting of each led needs to be set to 0:
     self.log("turn leds off", debug=True)
-    color=Color(0, 0, 0, 0)
-    for i in range(self._ledSettings["ledCount"]):
-      self._ledSettings["strip"].setPixelColor(i, color)
+    writeFrame(self._ledSettings["strip"], newFrame(self._ledSettings["ledCount"]))
     # Force the ledstrip to show the applied changes:
     self._ledSettings["strip"].show()
 
@@ -386,7 +562,118 @@ class FluidModule(BehaviorModule):
       self._thread=threading.Thread(target=self.run)
       self._thread.start()
     else:
-      if not self._thread.isAlive():
+      if not self._thread.is_alive():
+        self.log("Need to start the thread", debug=True)
+        self._thread=None
+        self._thread=threading.Thread(target=self.run)
+        self._thread.start()
+
+  def Off(self):
+    self.log("turning the leds off...")
+    self._ledSettings["lightState"]=False
+
+
+#
+#----------------------------------
+#
+class PlaybackModule(BehaviorModule):
+  """
+  Behavior Module to play a precompiled frame sequence file (see compile_effect.py).
+  """
+  # Frame sequence files are looked up in this directory:
+  SEQUENCES_DIRECTORY=os.path.join(os.path.dirname(os.path.abspath(__file__)), "sequences")
+
+  parameters={
+    "file": {"type": "str", "default": "",
+             "description": "Name of the frame sequence file in the 'sequences' directory"},
+    "speed": {"type": "float", "default": 1.0, "min": 0.1, "max": 10.0,
+              "description": "Playback speed relative to the frame rate of the file"},
+    "loop": {"type": "bool", "default": True,
+             "description": "Start over at the end of the sequence"}
+  }
+
+  def __init__(self, ledSettings: dict):
+    """ Constructor """
+    super().__init__(name="Playback", ledSettings=ledSettings)
+    self.log(f"behavior module '{self._name}' ledSettings: {self._ledSettings}", debug=True)
+    self._thread=None
+    self._sequence=None
+    self.compile()
+
+  def compile(self):
+    """ Open (memory-map) the frame sequence file and compute the delay between frames. """
+    _fileName=self._parameterValues["file"]
+    if _fileName != os.path.basename(_fileName): raise Exception(f"Frame sequence '{_fileName}' needs to be a file name without a path!")
+    _sequence=None
+    _delay=0
+    if _fileName != "":
+      _sequence=FrameSequence(os.path.join(self.SEQUENCES_DIRECTORY, _fileName))
+      if _sequence.ledCount != self._ledSettings["ledCount"]:
+        self.log(f"frame sequence '{_fileName}' has {_sequence.ledCount} leds and the strip has {self._ledSettings['ledCount']}")
+      _delay=1 / (_sequence.fps * self._parameterValues["speed"])
+    # Swap in the new sequence at once so that a running playback never sees a mix of old and new:
+    self._animation=(_sequence, _delay, self._parameterValues["loop"])
+    # The previous sequence gets unmapped when the playback loop lets go of it.
+    self._sequence=_sequence
+
+  def run(self):
+    self.log("starting the behavior in its own thread...", debug=True)
+    # Get the ledstrip from the strip manager (it's only set up the first time):
+    self._initStrip()
+    strip=self._ledSettings["strip"]
+    index=0
+    sequence=None
+    nextFrame=monotonic()
+    # Keep looping in the thread until the user switches off the lights or the sequence ends:
+    while self._ledSettings["lightState"]:
+      if self._animation[0] is not sequence:
+        # The sequence changed.  Start at its first frame:
+        sequence, delay, loop=self._animation
+        index=0
+      else:
+        _, delay, loop=self._animation
+      if sequence is None or sequence.frameCount == 0:
+        sleep(0.1)
+        continue
+      if index >= sequence.frameCount:
+        if not loop:
+          # The sequence is over and so is the light:
+          self._ledSettings["lightState"]=False
+          break
+        index=0
+      # Copy the frame from the file straight into the LED color buffer:
+      writeFrame(strip, sequence.frame(index))
+      index+=1
+      # Update the brightness of the leds and force the ledstrip to show the applied changes:
+      self._show(strip)
+      # Keep the frame rate of the sequence, whatever time it took to show this frame:
+      nextFrame+=delay
+      _wait=nextFrame - monotonic()
+      if _wait > 0:
+        sleep(_wait)
+      else:
+        # We're running late.  Don't try to catch up by rushing through the next frames:
+        nextFrame=monotonic()
+    # The loop ended.
+    self.log("ending Playback thread...", debug=True)
+    # Turn the leds off.
+    # The color setting of each led needs to be set to 0:
+    self.log("turn leds off", debug=True)
+    writeFrame(strip, newFrame(self._ledSettings["ledCount"]))
+    # Force the ledstrip to show the applied changes:
+    strip.show()
+
+  def On(self):
+    self.log("turning the leds on...")
+    # The thread will loop for as long as the 'lightState' is true:
+    self._ledSettings["lightState"]=True
+    # Start the thread if not running yet:
+    if self._thread == None:
+      self.log("Creating a new thread", debug=True)
+      self._thread=threading.Thread(target=self.run)
+      self._thread.start()
+    else:
+      if not self._thread.is_alive():
         self.log("Need to start the thread", debug=True)
         self._thread=None
         self._thread=threading.Thread(target=self.run)
@@ -395,3 +682,677 @@ class FluidModule(BehaviorModule):
   def Off(self):
     self.log("turning the leds off...")
     self._ledSettings["lightState"]=False
+
+
+#
+#----------------------------------
+#
+def wheel(pos: int) -> int:
+  """ Generate rainbow colors across 0-255 positions (from the strandtest.py example). """
+  if pos < 85:
+    return Color(pos * 3, 255 - pos * 3, 0)
+  elif pos < 170:
+    pos-=85
+    return Color(255 - pos * 3, 0, pos * 3)
+  else:
+    pos-=170
+    return Color(0, pos * 3, 255 - pos * 3)
+
+
+# The 256 colors of the wheel, twice in a row so that the wheel turned by 'j' positions is a plain slice:
+#   _WHEEL[j:j + 256][pos] == wheel((pos + j) & 255)
+_WHEEL=array(LED_TYPECODE, [wheel(_pos) for _pos in range(256)]) * 2
+
+
+def _gather(indices: list):
+  """ Return a function that picks the values at 'indices' out of a sequence with a single call into C
+  (operator.itemgetter), which is a lot faster than a Python loop over the leds.
+  """
+  if len(indices) == 1:
+    _index=indices[0]
+    return lambda values: (values[_index],)
+  return itemgetter(*indices)
+
+
+class ScheduledModule(BehaviorModule):
+  """
+  Template Class for behavior modules that are animated by the frame scheduler instead of their own thread.
+
+  Subclasses precompute their animation in 'compile()' into a tuple that ends with the number of leds that it
+  was compiled for, and implement 'step(strip)' to put the next frame into the strip's buffer.
+  Turning the light on or off only adds or removes the behavior from the scheduler, so it never blocks.
+  """
+
+  def __init__(self, name: str, ledSettings: dict):
+    """ Constructor """
+    # Fail when the behavior is created instead of the first time that the scheduler renders a frame:
+    if type(self).step is ScheduledModule.step:
+      raise Exception(f"Behavior module '{type(self).__name__}' needs to implement step()!")
+    super().__init__(name=name, ledSettings=ledSettings)
+    self.log(f"behavior module '{self._name}' ledSettings: {self._ledSettings}", debug=True)
+    self.compile()
+
+  def step(self, strip) -> float:
+    """ Put the next frame into the buffer of the strip and return the number of seconds until the next one.
+
+    Every subclass needs to implement this.  It's called from the thread of the frame scheduler, so it should only
+    read the precomputed 'self._animation' and write the strip's buffer, without sleeping or showing the leds
+    (that's done by 'renderFrame()').  Return None to stop being scheduled.
+
+    Arguments:
+      strip: the ledstrip to write the next frame to
+    """
+    raise Exception(f"Behavior module '{type(self).__name__}' needs to implement step()!")
+
+  def setParameters(self, values: dict):
+    """ Apply new parameter values and, if the behavior is running, render its next frame with them right away. """
+    super().setParameters(values)
+    if scheduler.isScheduled(self):
+      scheduler.stop(self)
+      scheduler.start(self)
+
+  def renderFrame(self) -> float:
+    """ Render and show the next frame (called by the frame scheduler). """
+    if not self._ledSettings["lightState"]:
+      return None
+    strip=self._ledSettings["strip"]
+    _delay=self.step(strip)
+    # Update the brightness of the leds and force the ledstrip to show the applied changes:
+    self._show(strip)
+    return _delay
+
+  def On(self):
+    self.log("turning the leds on...")
+    # Get the ledstrip from the strip manager (it's only set up the first time):
+    self._initStrip()
+    # The number of leds may have changed since the animation was compiled:
+    if self._animation[-1] != self._ledSettings["ledCount"]:
+      self.compile()
+    self._ledSettings["lightState"]=True
+    scheduler.start(self)
+
+  def Off(self):
+    self.log("turning the leds off...")
+    scheduler.stop(self)
+    self._ledSettings["lightState"]=False
+    if self._buffer is not None:
+      self.log(f"leds written: {self.frameStats}", debug=True)
+    if self._ledSettings["strip"] is None:
+      return
+    # Turn the leds off:
+    writeFrame(self._ledSettings["strip"], newFrame(self._ledSettings["ledCount"]))
+    self._show(self._ledSettings["strip"])
+
+
+class ColorWipeModule(ScheduledModule):
+  """
+  Behavior Module that wipes the colors of a palette across the strip, 1 led at a time.
+  """
+  parameters={
+    "speed": {"type": "int", "default": 20, "min": 1, "max": 1000,
+              "description": "Number of leds that get the new color per second"},
+    "palette": {"type": "palette",
+                "default": [[255, 0, 0, 0],     # red
+                            [0, 255, 0, 0],     # green
+                            [0, 0, 255, 0]],    # blue
+                "description": "Colors that are wiped across the strip, 1 after the other"}
+  }
+
+  def __init__(self, ledSettings: dict):
+    """ Constructor """
+    self._position=0
+    super().__init__(name="ColorWipe", ledSettings=ledSettings)
+
+  def compile(self):
+    """ Precompute the colors and the delay between 2 leds from the parameters. """
+    _colors=[Color(red=_red, green=_green, blue=_blue, white=_white) \
+               for _red, _green, _blue, _white in self._parameterValues["palette"]]
+    self._animation=(_colors, 1 / self._parameterValues["speed"], self._ledSettings["ledCount"])
+
+  def On(self):
+    # Wipe over what's on the strip now:
+    self._buffer=None
+    super().On()
+
+  def step(self, strip) -> float:
+    colors, delay, ledCount=self._animation
+    frame=self._sparseFrame(strip)
+    # Only the next led changes:
+    _position=self._position % (ledCount * len(colors))
+    frame.setPixel(_position % ledCount, colors[_position // ledCount])
+    frame.flush(strip)
+    self._position=_position + 1
+    return delay
+
+
+class TheaterChaseModule(ScheduledModule):
+  """
+  Behavior Module for the movie theater light style chaser animation: every 3rd led is on and the lit leds
+  move 1 led per step.
+  """
+  parameters={
+    "speed": {"type": "int", "default": 20, "min": 1, "max": 100,
+              "description": "Number of animation steps per second"},
+    "palette": {"type": "palette",
+                "default": [[127, 127, 127, 0],   # white
+                            [127, 0, 0, 0],       # red
+                            [0, 0, 127, 0]],      # blue
+                "description": "Colors of the chaser, 1 after the other"},
+    "iterations": {"type": "int", "default": 10, "min": 1, "max": 1000,
+                   "description": "Number of times that each color chases over 3 leds before the next color"}
+  }
+
+  def __init__(self, ledSettings: dict):
+    """ Constructor """
+    self._step=0
+    super().__init__(name="TheaterChase", ledSettings=ledSettings)
+
+  def compile(self):
+    """ Precompute the 3 frames of each color of the palette into the animation cache. """
+    _colors=[Color(red=_red, green=_green, blue=_blue, white=_white) \
+               for _red, _green, _blue, _white in self._parameterValues["palette"]]
+    _ledCount=self._ledSettings["ledCount"]
+
+    def _renderFrame(index: int, frame: memoryview):
+      _color=_colors[index // 3]
+      frame[:]=array(LED_TYPECODE, [_color if i % 3 == index % 3 else 0 for i in range(_ledCount)])
+
+    _frameCount=len(_colors) * 3
+    _cycle=cache.get((self._name, _ledCount, tuple(_colors)), _frameCount, _ledCount, _renderFrame)
+    if _cycle is None:
+      _frames=[newFrame(_ledCount) for _ in range(_frameCount)]
+      for _index, _frame in enumerate(_frames):
+        _renderFrame(_index, memoryview(_frame))
+      _frames=_frames.__getitem__
+    else:
+      _frames=_cycle.frame
+    self._animation=(_frames, len(_colors), 3 * self._parameterValues["iterations"], \
+                     1 / self._parameterValues["speed"], _ledCount)
+
+  def step(self, strip) -> float:
+    frames, colorCount, stepsPerColor, delay, ledCount=self._animation
+    _step=self._step % (colorCount * stepsPerColor)
+    writeFrame(strip, frames((_step // stepsPerColor) * 3 + _step % 3))
+    self._step=_step + 1
+    return delay
+
+
+class RainbowModule(ScheduledModule):
+  """
+  Behavior Module to draw a rainbow that fades across all the leds at once.
+  """
+  parameters={
+    "speed": {"type": "int", "default": 50, "min": 1, "max": 200,
+              "description": "Number of animation steps per second"}
+  }
+
+  def __init__(self, ledSettings: dict, name: str="Rainbow"):
+    """ Constructor """
+    self._step=0
+    super().__init__(name=name, ledSettings=ledSettings)
+
+  def wheelPositions(self, ledCount: int) -> list:
+    """ Return the position on the color wheel of each led in the first frame. """
+    return [i & 255 for i in range(ledCount)]
+
+  def compile(self):
+    """ Precompute the 256 frames of the rainbow into the animation cache.
+    Frame 'j' gives led 'i' the color at wheel position 'wheelPositions[i] + j', so each frame is the same
+    gather of indices out of the color wheel turned by 'j' positions.
+    """
+    _ledCount=self._ledSettings["ledCount"]
+    _positions=_gather(self.wheelPositions(_ledCount))
+
+    def _renderFrame(index: int, frame: memoryview):
+      frame[:]=array(LED_TYPECODE, _positions(_WHEEL[index:index + 256]))
+
+    _cycle=cache.get((self._name, _ledCount), 256, _ledCount, _renderFrame)
+    if _cycle is None:
+      # Too big for the cache.  Render each frame when it's due (still a single gather per frame):
+      _frame=memoryview(newFrame(_ledCount))
+
+      def _frames(index: int) -> memoryview:
+        _renderFrame(index, _frame)
+        return _frame
+    else:
+      _frames=_cycle.frame
+    self._animation=(_frames, 1 / self._parameterValues["speed"], _ledCount)
+
+  def step(self, strip) -> float:
+    frames, delay, ledCount=self._animation
+    self._step=(self._step + 1) & 255
+    writeFrame(strip, frames(self._step))
+    return delay
+
+
+class RainbowCycleModule(RainbowModule):
+  """
+  Behavior Module to draw a rainbow that uniformly distributes itself across all the leds.
+  """
+
+  def __init__(self, ledSettings: dict):
+    """ Constructor """
+    super().__init__(ledSettings=ledSettings, name="RainbowCycle")
+
+  def wheelPositions(self, ledCount: int) -> list:
+    """ Return the position on the color wheel of each led in the first frame. """
+    return [(i * 256 // ledCount) & 255 for i in range(ledCount)]
+
+
+class TheaterChaseRainbowModule(ScheduledModule):
+  """
+  Behavior Module for the rainbow movie theater light style chaser animation.
+  """
+  parameters={
+    "speed": {"type": "int", "default": 20, "min": 1, "max": 100,
+              "description": "Number of animation steps per second"}
+  }
+
+  def __init__(self, ledSettings: dict):
+    """ Constructor """
+    self._step=0
+    super().__init__(name="TheaterChaseRainbow", ledSettings=ledSettings)
+
+  def compile(self):
+    """ Precompute the 768 frames (256 wheel positions times 3 chaser positions) into the animation cache.
+    Like strandtest.py, the wheel turns over 255 positions here.  The leds that are off pick the 0 value that
+    is added behind the turned wheel.
+    """
+    _ledCount=self._ledSettings["ledCount"]
+    _wheel=array(LED_TYPECODE, _WHEEL[:255]) * 2
+    _off=array(LED_TYPECODE, [0])
+    _chasers=[_gather([(i - q) % 255 if i % 3 == q else 255 for i in range(_ledCount)]) for q in range(3)]
+
+    def _renderFrame(index: int, frame: memoryview):
+      _turn=(index // 3) % 255
+      frame[:]=array(LED_TYPECODE, _chasers[index % 3](_wheel[_turn:_turn + 255] + _off))
+
+    _cycle=cache.get((self._name, _ledCount), 768, _ledCount, _renderFrame)
+    if _cycle is None:
+      _frame=memoryview(newFrame(_ledCount))
+
+      def _frames(index: int) -> memoryview:
+        _renderFrame(index, _frame)
+        return _frame
+    else:
+      _frames=_cycle.frame
+    self._animation=(_frames, 1 / self._parameterValues["speed"], _ledCount)
+
+  def step(self, strip) -> float:
+    frames, delay, ledCount=self._animation
+    self._step=(self._step + 1) % 768
+    writeFrame(strip, frames(self._step))
+    return delay
+
+
+def _scaleColor(color: int, factor: float) -> int:
+  """ Return the color with each of its channels multiplied by a factor (0..1). """
+  return (int(((color >> 24) & 255) * factor) << 24) | (int(((color >> 16) & 255) * factor) << 16) | \
+         (int(((color >> 8) & 255) * factor) << 8) | int((color & 255) * factor)
+
+
+def _mixColors(color1: int, color2: int) -> int:
+  """ Return the brightest value of each channel of 2 colors (for hands that are on the same led). """
+  return max(color1 & 0xff000000, color2 & 0xff000000) | max(color1 & 0xff0000, color2 & 0xff0000) | \
+         max(color1 & 0xff00, color2 & 0xff00) | max(color1 & 0xff, color2 & 0xff)
+
+
+class ClockModule(ScheduledModule):
+  """
+  Behavior Module that shows the time on a ring of leds (like the neopixelclock.py example, on any number of leds):
+  1 led for the hours, 1 for the minutes and 1 for the seconds.
+
+  Instead of redrawing all the leds continuously, the clock works out when the next hand moves to another led and
+  sleeps until then.  Only the leds that changed are written.  With 'fade' on, the seconds hand fades from 1 led
+  into the next, redrawn when its brightness actually changes (at most 'fps' times per second).
+  """
+  parameters={
+    "palette": {"type": "palette",
+                "default": [[0, 200, 0, 0],      # hours
+                            [0, 0, 200, 0],      # minutes
+                            [255, 0, 0, 0]],     # seconds
+                "description": "Colors of the hours, minutes and seconds hands"},
+    "fade": {"type": "bool", "default": False,
+             "description": "Fade the seconds hand smoothly from 1 led into the next"},
+    "fps": {"type": "int", "default": 30, "min": 1, "max": 100,
+            "description": "Highest number of frames per second of the seconds fade"}
+  }
+  # The period of the hours, minutes and seconds hands in seconds:
+  PERIODS=(12 * 3600, 3600, 60)
+
+  def __init__(self, ledSettings: dict):
+    """ Constructor """
+    self._lit=set()             # the leds that are lit by the hands
+    super().__init__(name="Clock", ledSettings=ledSettings)
+
+  def compile(self):
+    """ Precompute the colors of the hands from the parameters. """
+    _colors=[Color(red=_red, green=_green, blue=_blue, white=_white) \
+               for _red, _green, _blue, _white in self._parameterValues["palette"]]
+    # Palettes with less than 3 colors reuse their colors for the next hands:
+    _hands=tuple((_colors[_index % len(_colors)], _period) for _index, _period in enumerate(self.PERIODS))
+    self._animation=(_hands, self._parameterValues["fade"], 1 / self._parameterValues["fps"], \
+                     self._ledSettings["ledCount"])
+
+  def On(self):
+    # Draw the whole clock the first time (a new FrameBuffer is all off and writes all the leds once):
+    self._buffer=None
+    self._lit=set()
+    super().On()
+
+  def step(self, strip) -> float:
+    hands, fade, minDelay, ledCount=self._animation
+    _now=time()
+    _local=localtime(_now)
+    # Seconds since midnight (local time):
+    _seconds=_local.tm_hour * 3600 + _local.tm_min * 60 + _local.tm_sec + _now % 1
+    _leds={}
+    _delay=None
+    for _index, (color, period) in enumerate(hands):
+      _position=(_seconds % period) * ledCount / period
+      _led=int(_position)
+      _slot=period / ledCount
+      # Seconds until this hand moves to the next led:
+      _next=(_led + 1 - _position) * _slot
+      if fade and _index == 2:
+        _fraction=_position - _led
+        _leds[_led]=_mixColors(_leds.get(_led, 0), _scaleColor(color, 1 - _fraction))
+        _leds[(_led + 1) % ledCount]=_mixColors(_leds.get((_led + 1) % ledCount, 0), _scaleColor(color, _fraction))
+        # The brightest channel of the fade changes 1 step every 'slot / brightest' seconds:
+        _brightest=max((color >> _shift) & 255 for _shift in (0, 8, 16, 24))
+        _next=min(_next, max(minDelay, _slot / max(1, _brightest)))
+      else:
+        _leds[_led]=_mixColors(_leds.get(_led, 0), color)
+      _delay=_next if _delay is None else min(_delay, _next)
+    if self._buffer is None or self._buffer.ledCount != ledCount:
+      self._buffer=FrameBuffer(ledCount)
+    for _led in self._lit - set(_leds):
+      self._buffer.setPixel(_led, 0)
+    for _led, _color in _leds.items():
+      self._buffer.setPixel(_led, _color)
+    self._lit=set(_leds)
+    # Only write the leds that changed:
+    self._buffer.flush(strip)
+    # Wake up just after the next change rather than just before it:
+    return _delay + 0.002
+
+
+#
+#----------------------------------
+#
+class AudioReactiveModule(BehaviorModule):
+  """
+  Behavior Module that makes the leds react to music.
+
+  The strip is split into 1 segment per frequency band (the lowest band at the start of the strip).  Each segment
+  lights up like the bar of a spectrum analyzer: the louder the band, the more leds of its segment are lit.
+  The audio comes from an ALSA capture device, a named pipe with raw PCM or a WAV file (see the audio_stream
+  module).  The behavior renders a frame for each new block of audio, so the frame rate follows the audio and the
+  latency from capture to light stays under 30ms.
+  """
+  parameters={
+    "source": {"type": "choice", "default": "alsa", "choices": ["alsa", "fifo", "wav"],
+               "description": "Where the audio comes from: an ALSA capture device, a named pipe or a WAV file"},
+    "input": {"type": "str", "default": "default",
+              "description": "The ALSA capture device, the named pipe or the WAV file"},
+    "rate": {"type": "int", "default": 44100, "min": 8000, "max": 96000,
+             "description": "Samples per second of the ALSA device or the named pipe (a WAV file has its own)"},
+    "bands": {"type": "int", "default": 16, "min": 1, "max": 64,
+              "description": "Number of frequency bands (each band gets its own segment of the strip)"},
+    "palette": {"type": "palette",
+                "default": [[128, 0,   0,   0],     # red (the lows)
+                            [128, 64,  0,   0],     # orange
+                            [128, 128, 0,   0],     # yellow
+                            [0,   128, 0,   0],     # green
+                            [0,   0,   128, 0],     # blue
+                            [64,  0,   64,  0]],    # purple (the highs)
+                "description": "Colors of the bands from the lowest to the highest frequencies"},
+    "range": {"type": "int", "default": 40, "min": 10, "max": 90,
+              "description": "Number of dB between a dark and a fully lit segment"},
+    "decay": {"type": "float", "default": 0.85, "min": 0, "max": 0.99,
+              "description": "Part of a segment that stays lit per frame when its band gets quieter"}
+  }
+  # Number of samples per FFT and per block (a new frame is rendered after each block):
+  WINDOW=1024
+  HOP=256
+
+  def __init__(self, ledSettings: dict):
+    """ Constructor """
+    super().__init__(name="AudioReactive", ledSettings=ledSettings)
+    self.log(f"behavior module '{self._name}' ledSettings: {self._ledSettings}", debug=True)
+    self._thread=None
+    self._latencies=[]          # seconds from capture to light of the frames since the light was turned on
+    self._dropped=0             # number of blocks that were skipped because the frames couldn't keep up
+    self.compile()
+
+  @property
+  def latencyStats(self) -> dict:
+    """ Return the number of frames, the number of dropped blocks and the latency from capture to light. """
+    _latencies=list(self._latencies)
+    if len(_latencies) == 0:
+      return {"frames": 0, "dropped": self._dropped}
+    return {"frames": len(_latencies),
+            "dropped": self._dropped,
+            "latency-ms": round(sum(_latencies) / len(_latencies) * 1000, 1),
+            "max-latency-ms": round(max(_latencies) * 1000, 1)
+           }
+
+  def compile(self):
+    """ Precompute the segments of the bands from the parameters.
+    Each segment keeps a lit and a dark frame of its own length, so rendering a band is 2 slice copies.
+    """
+    _ledCount=self._ledSettings["ledCount"]
+    _bands=min(self._parameterValues["bands"], _ledCount)
+    _colors=[Color(red=_red, green=_green, blue=_blue, white=_white) \
+               for _red, _green, _blue, _white in self._parameterValues["palette"]]
+    _segments=[]
+    for _band in range(_bands):
+      _start=_band * _ledCount // _bands
+      _length=(_band + 1) * _ledCount // _bands - _start
+      # Spread the palette over the bands:
+      _color=_colors[_band * len(_colors) // _bands]
+      _segments.append((_start, _length, array(LED_TYPECODE, [_color]) * _length, newFrame(_length)))
+    # The pipeline needs to be set up again when any of these change:
+    _pipeline=(self._parameterValues["source"], self._parameterValues["input"], self._parameterValues["rate"], \
+               _bands, self._parameterValues["range"])
+    self._animation=(_pipeline, tuple(_segments), self._parameterValues["decay"], _ledCount)
+
+  def _openStream(self, pipeline: tuple) -> tuple:
+    """ Return a started AudioStream and the SpectrumAnalyzer for its source. """
+    from audio_stream import AudioStream, AlsaSource, FifoSource, WavSource, SpectrumAnalyzer
+    _source, _input, _rate, _bands, _range=pipeline
+    if _source == "alsa":
+      source=AlsaSource(device=_input, rate=_rate)
+    elif _source == "fifo":
+      source=FifoSource(_input, rate=_rate)
+    else:
+      source=WavSource(_input)
+    stream=AudioStream(source, window=self.WINDOW, hop=self.HOP)
+    stream.debug=self._debug
+    stream.start()
+    return stream, SpectrumAnalyzer(source.rate, self.WINDOW, _bands, dynamicRange=_range)
+
+  def run(self):
+    self.log("starting the behavior in its own thread...", debug=True)
+    # Get the ledstrip from the strip manager (it's only set up the first time):
+    self._initStrip()
+    # The number of leds may have changed since the animation was compiled:
+    if self._animation[3] != self._ledSettings["ledCount"]:
+      self.compile()
+    strip=self._ledSettings["strip"]
+    frame=newFrame(self._ledSettings["ledCount"])
+    stream=None
+    pipeline=None
+    sequence=0
+    shown=None
+    self._latencies=[]
+    self._dropped=0
+    try:
+      # Keep looping in the thread until the user switches off the lights:
+      while self._ledSettings["lightState"]:
+        _pipeline, segments, decay, ledCount=self._animation
+        if _pipeline != pipeline or not stream.running:
+          # First time around, the source or the bands changed or the source ended:
+          if stream is not None:
+            stream.stop()
+            if _pipeline == pipeline:
+              # Don't keep restarting a source that fails right away:
+              sleep(1)
+          pipeline=_pipeline
+          stream, analyzer=self._openStream(pipeline)
+          sequence=0
+          shown=None
+        if len(frame) != ledCount:
+          frame=newFrame(ledCount)
+        # Wait for the next block of audio (a short timeout to notice that the light got turned off):
+        _block=stream.next(sequence, timeout=0.2)
+        if _block is None:
+          continue
+        if sequence > 0:
+          self._dropped+=_block[0] - sequence - 1
+        sequence, captured, samples=_block
+        levels=analyzer.levels(samples).tolist()
+        if shown is None or len(shown) != len(levels):
+          shown=levels
+        else:
+          # A band that gets quieter fades out instead of going dark at once:
+          shown=[max(_level, _shown * decay) for _level, _shown in zip(levels, shown)]
+        for (start, length, lit, dark), level in zip(segments, shown):
+          _lit=int(level * length)
+          frame[start:start + _lit]=lit[:_lit]
+          frame[start + _lit:start + length]=dark[:length - _lit]
+        writeFrame(strip, frame)
+        # Update the brightness of the leds and force the ledstrip to show the applied changes:
+        self._show(strip)
+        self._latencies.append(monotonic() - captured)
+        if len(self._latencies) > 1000:
+          del self._latencies[:500]
+    except Exception as exc:
+      self.log(f"the audio pipeline failed: {exc}")
+    finally:
+      if stream is not None:
+        stream.stop()
+    # The loop ended.
+    self.log(f"ending AudioReactive thread... {self.latencyStats}", debug=True)
+    # Turn the leds off:
+    writeFrame(self._ledSettings["strip"], newFrame(self._ledSettings["ledCount"]))
+    # Force the ledstrip to show the applied changes:
+    self._ledSettings["strip"].show()
+
+  def On(self):
+    self.log("turning the leds on...")
+    # The thread will loop for as long as the 'lightState' is true:
+    self._ledSettings["lightState"]=True
+    # Start the thread if not running yet:
+    if self._thread == None or not self._thread.is_alive():
+      self.log("Creating a new thread", debug=True)
+      self._thread=threading.Thread(target=self.run)
+      self._thread.start()
+
+  def Off(self):
+    self.log("turning the leds off...")
+    self._ledSettings["lightState"]=False
+
+
+#
+#----------------------------------
+#
+class StreamModule(BehaviorModule):
+  """
+  Behavior Module that shows the frames that lighting software streams over the network (E1.31/sACN or DDP).
+
+  The packets are received on the asyncio event loop of the pixel_stream module and assembled into frames in the
+  layout of the led buffer.  The thread of the behavior copies the newest complete frame into the strip and shows
+  it.  Frames that come in faster than the strip can show them are dropped (see pixel_stream.StreamFrame).
+  """
+  parameters={
+    "protocol": {"type": "choice", "default": "e131", "choices": ["e131", "ddp"],
+                 "description": "E1.31 (sACN) universes or DDP"},
+    "universe": {"type": "int", "default": 1, "min": 1, "max": 63999,
+                 "description": "The first E1.31 universe of the strip (the strip takes as many as it needs)"},
+    "port": {"type": "int", "default": 0, "min": 0, "max": 65535,
+             "description": "UDP port (0 for the port of the protocol: 5568 for E1.31 and 4048 for DDP)"},
+    "format": {"type": "choice", "default": "rgb", "choices": ["rgb", "rgbw"],
+               "description": "Channels per pixel in the stream"}
+  }
+
+  def __init__(self, ledSettings: dict):
+    """ Constructor """
+    super().__init__(name="Stream", ledSettings=ledSettings)
+    self.log(f"behavior module '{self._name}' ledSettings: {self._ledSettings}", debug=True)
+    self._thread=None
+    self._frame=None            # the StreamFrame that the packets are assembled in
+    self.compile()
+
+  @property
+  def streamStats(self) -> dict:
+    """ Return the number of packets and frames that were received and dropped (None if not streaming). """
+    _frame=self._frame
+    if _frame is None:
+      return None
+    return _frame.stats
+
+  def compile(self):
+    """ Precompute the settings of the stream from the parameters. """
+    _stream=(self._parameterValues["protocol"], self._parameterValues["universe"], \
+             self._parameterValues["port"] or None, len(self._parameterValues["format"]))
+    self._animation=(_stream, self._ledSettings["ledCount"])
+
+  def run(self):
+    self.log("starting the behavior in its own thread...", debug=True)
+    from pixel_stream import StreamFrame, receiver
+    # Get the ledstrip from the strip manager (it's only set up the first time):
+    self._initStrip()
+    # The number of leds may have changed since the animation was compiled:
+    if self._animation[1] != self._ledSettings["ledCount"]:
+      self.compile()
+    strip=self._ledSettings["strip"]
+    stream=None
+    frame=0
+    try:
+      # Keep looping in the thread until the user switches off the lights:
+      while self._ledSettings["lightState"]:
+        _stream, ledCount=self._animation
+        if _stream != stream:
+          # First time around or the parameters changed:
+          if self._frame is not None:
+            receiver.detach(self._frame)
+          stream=_stream
+          _protocol, _universe, _port, _channels=stream
+          _frame=StreamFrame(ledCount, protocol=_protocol, universe=_universe, channels=_channels)
+          receiver.attach(_frame, port=_port)
+          self._frame=_frame
+          frame=0
+        # Wait for the next frame (a short timeout to notice that the light got turned off):
+        _next=self._frame.next(frame, timeout=0.2)
+        if _next is None:
+          continue
+        frame, _leds=_next
+        writeFrame(strip, _leds)
+        # Update the brightness of the leds and force the ledstrip to show the applied changes:
+        self._show(strip)
+    except Exception as exc:
+      self.log(f"the stream failed: {exc}")
+    finally:
+      if self._frame is not None:
+        receiver.detach(self._frame)
+    # The loop ended.
+    self.log(f"ending Stream thread... {self.streamStats}", debug=True)
+    # Turn the leds off:
+    writeFrame(self._ledSettings["strip"], newFrame(self._ledSettings["ledCount"]))
+    # Force the ledstrip to show the applied changes:
+    self._ledSettings["strip"].show()
+
+  def On(self):
+    self.log("turning the leds on...")
+    # The thread will loop for as long as the 'lightState' is true:
+    self._ledSettings["lightState"]=True
+    # Start the thread if not running yet:
+    if self._thread == None or not self._thread.is_alive():
+      self.log("Creating a new thread", debug=True)
+      self._thread=threading.Thread(target=self.run)
+      self._thread.start()
+
+  def Off(self):
+    self.log("turning the leds off...")
+    self._ledSettings["lightState"]=False
@@ -22,5 +22,5 @@ class GPIO:
   def setwarnings(self):
     pass
 
-  def cleanup():
+  def cleanup(channel=None):
     pass
\ No newline at end of file
@@ -0,0 +1,241 @@
+"""
+This module contains the cache of precomputed animation cycles.
+
+Behaviors with periodic or deterministic animations (like the ChristmasModule chasing its colors over the strip)
+render their full cycle once into a contiguous block of memory.  The animation is then played back by picking
+the frame at an offset in that block, without computing anything per frame.
+
+Cycles that are bigger than 'mmapBytes' are stored in a memory-mapped temporary file instead of on the heap so
+that the kernel can page them out.  Both the in-memory and memory-mapped cycles have a size budget.  The least
+recently used cycles are dropped from the cache when a new cycle doesn't fit in its budget.
+
+Classes in this module:
+- 'AnimationCycle': the frames of 1 animation cycle;
+- 'AnimationCache': LRU cache of AnimationCycle objects, shared by all the lights in the app;
+
+This module requires these modules:
+- mmap, tempfile and threading modules from the Python standard library;
+- framebuffer module for the frame format;
+"""
+
+import mmap
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from framebuffer import LED_TYPECODE, LED_BYTES, newFrame
+
+
+class AnimationCycle:
+  """
+  Class that holds all the frames of 1 animation cycle in 1 contiguous block of memory.
+  """
+
+  def __init__(self, key, frameCount: int, ledCount: int, directory: str=None):
+    """ Constructor allocating the memory for the frames.
+
+    Arguments:
+      key: the (hashable) key under which the cycle is cached;
+      frameCount (int): the number of frames in the cycle;
+      ledCount (int): the number of leds in each frame;
+      directory (str): directory for the memory-mapped file (default=None -> store the frames in memory);
+    """
+    self._key=key
+    self._frameCount=frameCount
+    self._ledCount=ledCount
+    self._file=None
+    self._mmap=None
+    if directory is None:
+      self._buffer=newFrame(frameCount * ledCount)
+    else:
+      # The file gets deleted as soon as it's closed:
+      self._file=tempfile.TemporaryFile(dir=directory)
+      self._file.truncate(self.nbytes)
+      self._mmap=mmap.mmap(self._file.fileno(), self.nbytes)
+      self._buffer=self._mmap
+    self._view=memoryview(self._buffer).cast("B").cast(LED_TYPECODE)
+
+  def __del__(self):
+    """ Destructor releasing the memory-mapped file (if any). """
+    self.close()
+
+  @property
+  def key(self):
+    """ Return the key under which this cycle is cached. """
+    return self._key
+
+  @property
+  def frameCount(self) -> int:
+    """ Return the number of frames in the cycle. """
+    return self._frameCount
+
+  @property
+  def ledCount(self) -> int:
+    """ Return the number of leds in each frame. """
+    return self._ledCount
+
+  @property
+  def nbytes(self) -> int:
+    """ Return the size of the cycle in bytes. """
+    return self._frameCount * self._ledCount * LED_BYTES
+
+  @property
+  def isMapped(self) -> bool:
+    """ Return True if the frames are stored in a memory-mapped file. """
+    return self._mmap is not None
+
+  def frame(self, index: int) -> memoryview:
+    """ Return the frame at this index as a memoryview (no data gets copied). """
+    _start=index * self._ledCount
+    return self._view[_start:_start + self._ledCount]
+
+  def close(self):
+    """ Release the memory-mapped file (if any).  The cycle can no longer be used after this. """
+    if self._mmap is not None:
+      self._view.release()
+      try:
+        self._mmap.close()
+      except BufferError:
+        # Somebody still holds a frame of this cycle.  The memory gets released with the last frame.
+        pass
+      self._file.close()
+      self._mmap=None
+      self._file=None
+
+
+class AnimationCache:
+  """
+  Class for a least recently used (LRU) cache of animation cycles with a bounded size.
+  """
+
+  def __init__(self, maxBytes: int=2*1024*1024, mmapBytes: int=256*1024, maxFileBytes: int=32*1024*1024, \
+               directory: str=None):
+    """ Constructor.
+
+    Arguments:
+      maxBytes (int): budget for the cycles that are kept in memory (default=2MB);
+      mmapBytes (int): cycles bigger than this are stored in a memory-mapped file (default=256KB);
+      maxFileBytes (int): budget for the cycles that are stored in memory-mapped files (default=32MB);
+      directory (str): directory for the memory-mapped files (default=None -> system temp directory);
+    """
+    self._debug=False
+    self._maxBytes=maxBytes
+    self._mmapBytes=mmapBytes
+    self._maxFileBytes=maxFileBytes
+    self._directory=directory
+    self._cycles=OrderedDict()      # key -> AnimationCycle, least recently used first
+    self._lock=threading.Lock()     # behaviors of multiple lights use the cache from their own threads
+    self._hits=0
+    self._misses=0
+
+  @property
+  def debug(self) -> bool:
+    """ Return the debug-flag that is set for this cache. """
+    return self._debug
+
+  @debug.setter
+  def debug(self, flag: bool):
+    """ Set the debug level. """
+    self._debug=flag
+
+  @property
+  def maxBytes(self) -> int:
+    """ Return the budget in bytes for the cycles that are kept in memory. """
+    return self._maxBytes
+
+  @maxBytes.setter
+  def maxBytes(self, value: int):
+    """ Set the budget in bytes for the cycles that are kept in memory. """
+    if value < 0: raise Exception("The animation cache size can't be negative!")
+    self._maxBytes=value
+
+  @property
+  def maxFileBytes(self) -> int:
+    """ Return the budget in bytes for the cycles that are stored in memory-mapped files. """
+    return self._maxFileBytes
+
+  @maxFileBytes.setter
+  def maxFileBytes(self, value: int):
+    """ Set the budget in bytes for the cycles that are stored in memory-mapped files. """
+    if value < 0: raise Exception("The animation cache file size can't be negative!")
+    self._maxFileBytes=value
+
+  @property
+  def stats(self) -> dict:
+    """ Return statistics about the use of the cache. """
+    with self._lock:
+      return {"cycles": len(self._cycles),
+              "bytes": self._usedBytes(mapped=False),
+              "file-bytes": self._usedBytes(mapped=True),
+              "hits": self._hits,
+              "misses": self._misses
+             }
+
+  def log(self, *args, debug: bool=False):
+    """ Simple function to log messages to the console. """
+    _log=True
+    if debug and not self._debug:
+      _log=False
+    if _log:
+      # We don't want to log the message as a list between '()' if we only got 1 element in the argument list:
+      if len(args) == 1:
+        print(f"{type(self)}: {args[0]}")
+      else:
+        print(f"{type(self)}: {args}")
+      # We need to flush the stdout buffer in python for log statements to reach the Linux systemd journal:
+      sys.stdout.flush()
+
+  def _usedBytes(self, mapped: bool) -> int:
+    """ Return the number of bytes used by the in-memory or the memory-mapped cycles. """
+    return sum(_cycle.nbytes for _cycle in self._cycles.values() if _cycle.isMapped == mapped)
+
+  def get(self, key, frameCount: int, ledCount: int, renderFrame):
+    """ Return the cached animation cycle for this key, rendering it first if it's not in the cache.
+    Returns None if the cycle is too big for the cache.  The behavior then needs to render its frames itself.
+
+    Arguments:
+      key: hashable value that identifies the animation (behavior name, parameters, led count, ...);
+      frameCount (int): the number of frames in the cycle;
+      ledCount (int): the number of leds in each frame;
+      renderFrame: function(index, frame) that fills the frame (memoryview of 'ledCount' colors) at 'index';
+    """
+    with self._lock:
+      if key in self._cycles:
+        self._hits+=1
+        self._cycles.move_to_end(key)
+        return self._cycles[key]
+      self._misses+=1
+    _nbytes=frameCount * ledCount * LED_BYTES
+    _mapped=_nbytes > self._mmapBytes
+    _budget=self._maxFileBytes if _mapped else self._maxBytes
+    if _nbytes > _budget:
+      self.log(f"animation {key} ({_nbytes} bytes) is too big for the cache", debug=True)
+      return None
+    # Render outside of the lock so that other lights don't have to wait for this one:
+    self.log(f"rendering animation {key}: {frameCount} frames of {ledCount} leds", debug=True)
+    _directory=(self._directory or tempfile.gettempdir()) if _mapped else None
+    _cycle=AnimationCycle(key, frameCount, ledCount, directory=_directory)
+    for _index in range(frameCount):
+      renderFrame(_index, _cycle.frame(_index))
+    with self._lock:
+      # Another light may have rendered the same animation in the meantime:
+      if key in self._cycles:
+        return self._cycles[key]
+      # Make room by dropping the least recently used cycles of the same kind:
+      for _key in [_key for _key, _other in self._cycles.items() if _other.isMapped == _mapped]:
+        if self._usedBytes(mapped=_mapped) + _nbytes <= _budget:
+          break
+        self.log(f"evicting animation {_key}", debug=True)
+        # Don't close the cycle: a behavior may still be playing it.  It's released when no longer referenced.
+        del self._cycles[_key]
+      self._cycles[key]=_cycle
+    return _cycle
+
+  def clear(self):
+    """ Drop all the cycles from the cache. """
+    with self._lock:
+      self._cycles.clear()
+
+
+# The cache that is shared by all the lights in the app:
+cache=AnimationCache()
@@ -0,0 +1,395 @@
+"""
+This module contains the audio pipeline of the AudioReactive behavior: it captures audio and turns it into the
+levels of a number of frequency bands.
+
+The pipeline runs in 2 threads:
+- the capture thread of the AudioStream reads blocks of 'hop' samples from an audio source and keeps the last
+  'window' samples;
+- the thread of the behavior takes the newest window, computes its spectrum with a windowed FFT in the
+  SpectrumAnalyzer and renders a frame from the levels of the bands;
+The behavior always takes the newest window.  When a frame takes longer than a block to render, the blocks in
+between are skipped (and counted as dropped) instead of queued, so the lights never lag behind the music.
+The latency from capture to light is 1 block at most (256 samples is 5.8ms at 44.1kHz), plus the time to compute
+the spectrum and to show the frame (about 8ms for 250 RGBW leds).
+
+Audio sources:
+- 'AlsaSource': captures from an ALSA device through 'arecord' (from alsa-utils) with a small capture buffer;
+- 'FifoSource': reads raw 16-bit little-endian PCM from a named pipe, for instance:
+    mkfifo /tmp/audio.fifo
+    arecord -D hw:1 -t raw -f S16_LE -r 44100 -c 1 > /tmp/audio.fifo
+- 'WavSource': plays a WAV file at its real pace (or as fast as it can), to test and benchmark with;
+
+This module requires these modules:
+- NumPy for the FFT (imported the first time that a pipeline gets set up);
+- subprocess, threading and wave modules from the Python standard library;
+"""
+
+import subprocess
+import sys
+import threading
+import wave
+from time import monotonic, sleep
+
+# NumPy is imported the first time that it's needed (importing it takes a while on a Pi Zero):
+numpy=None
+
+
+def _numpy():
+  """ Return the NumPy module, importing it the first time. """
+  global numpy
+  if numpy is None:
+    try:
+      import numpy
+    except ImportError:
+      raise Exception("The audio pipeline needs NumPy (pip3 install numpy)!")
+  return numpy
+
+
+class PcmSource:
+  """
+  Template Class for the audio sources.  A source reads interleaved PCM samples and returns them as blocks of mono
+  samples between -1 and 1.
+  """
+  # NumPy data types of the sample widths:
+  DTYPES={1: "u1", 2: "<i2", 4: "<i4"}
+
+  def __init__(self, rate: int=44100, channels: int=1, sampleWidth: int=2):
+    """ Constructor.
+
+    Arguments:
+      rate (int): number of samples per second (default=44100);
+      channels (int): number of interleaved channels (default=1);
+      sampleWidth (int): bytes per sample: 1, 2 or 4 (default=2);
+    """
+    self._rate=rate
+    self._channels=channels
+    self._sampleWidth=sampleWidth
+    self._file=None
+
+  @property
+  def rate(self) -> int:
+    """ Return the number of samples per second. """
+    return self._rate
+
+  @property
+  def channels(self) -> int:
+    """ Return the number of channels. """
+    return self._channels
+
+  def open(self):
+    """ Start reading the audio. """
+    raise NotImplementedError
+
+  def close(self):
+    """ Stop reading the audio. """
+    if self._file is not None:
+      self._file.close()
+      self._file=None
+
+  def _readFrames(self, frames: int) -> bytes:
+    """ Return the bytes of the next number of frames (less at the end of the audio). """
+    _size=frames * self._channels * self._sampleWidth
+    _data=bytearray(_size)
+    _view=memoryview(_data)
+    _read=0
+    # Pipes return whatever they have, which may be less than a block:
+    while _read < _size:
+      _count=self._file.readinto(_view[_read:])
+      if not _count:
+        break
+      _read+=_count
+    _view.release()
+    return _data[:_read] if _read < _size else _data
+
+  def read(self, frames: int):
+    """ Return the next block of samples as a NumPy array of mono samples between -1 and 1 (None at the end).
+
+    Arguments:
+      frames (int): the number of samples per channel in the block;
+    """
+    np=_numpy()
+    if not self._sampleWidth in self.DTYPES: raise Exception(f"Samples of {self._sampleWidth} bytes aren't supported!")
+    _data=self._readFrames(frames)
+    if len(_data) < frames * self._channels * self._sampleWidth:
+      return None
+    _samples=np.frombuffer(_data, dtype=self.DTYPES[self._sampleWidth]).astype(np.float32)
+    if self._sampleWidth == 1:
+      # 8-bit samples are unsigned:
+      _samples-=128
+    if self._channels > 1:
+      _samples=_samples.reshape(-1, self._channels).mean(axis=1)
+    return _samples * (1 / (1 << (8 * self._sampleWidth - 1)))
+
+
+class AlsaSource(PcmSource):
+  """
+  Class that captures audio from an ALSA device through 'arecord'.
+  """
+
+  def __init__(self, device: str="default", rate: int=44100, channels: int=1, bufferTime: float=0.02):
+    """ Constructor.
+
+    Arguments:
+      device (str): the ALSA capture device ('arecord -L' lists them; default=default);
+      rate (int): number of samples per second (default=44100);
+      channels (int): number of channels (default=1);
+      bufferTime (float): seconds of audio that ALSA buffers (this adds to the latency; default=0.02);
+    """
+    super().__init__(rate=rate, channels=channels, sampleWidth=2)
+    self._device=device
+    self._bufferTime=bufferTime
+    self._process=None
+
+  def open(self):
+    # A small buffer with 4 periods hands the audio over in small chunks as soon as it's captured:
+    _command=["arecord", "-q", "-D", self._device, "-t", "raw", "-f", "S16_LE", "-r", str(self._rate), \
+              "-c", str(self._channels), f"--buffer-time={int(self._bufferTime * 1000000)}", \
+              f"--period-time={int(self._bufferTime * 250000)}"]
+    try:
+      self._process=subprocess.Popen(_command, stdout=subprocess.PIPE, bufsize=0)
+    except OSError as exc:
+      raise Exception(f"Can't start 'arecord' (sudo apt install alsa-utils): {exc}")
+    self._file=self._process.stdout
+
+  def close(self):
+    if self._process is not None:
+      self._process.terminate()
+      self._process.wait()
+      self._process=None
+    super().close()
+
+
+class FifoSource(PcmSource):
+  """
+  Class that reads raw 16-bit little-endian PCM from a named pipe (or a file).
+  """
+
+  def __init__(self, path: str, rate: int=44100, channels: int=1):
+    """ Constructor.
+
+    Arguments:
+      path (str): the named pipe;
+      rate (int): number of samples per second (default=44100);
+      channels (int): number of channels (default=1);
+    """
+    super().__init__(rate=rate, channels=channels, sampleWidth=2)
+    self._path=path
+
+  def open(self):
+    # Unbuffered, so that a block is handed over as soon as the writer wrote it:
+    self._file=open(self._path, "rb", buffering=0)
+
+
+class WavSource(PcmSource):
+  """
+  Class that plays a WAV file as if it was being captured.
+  """
+
+  def __init__(self, path: str, realtime: bool=True, loop: bool=True):
+    """ Constructor.
+
+    Arguments:
+      path (str): the WAV file;
+      realtime (bool): hand over each block when it would have been captured (default=True);
+      loop (bool): start over at the end of the file (default=True);
+    """
+    super().__init__()
+    self._path=path
+    self._realtime=realtime
+    self._loop=loop
+    self._start=0
+    self._frames=0              # number of frames handed over since the source was opened
+
+  def open(self):
+    self._file=wave.open(self._path, "rb")
+    self._rate=self._file.getframerate()
+    self._channels=self._file.getnchannels()
+    self._sampleWidth=self._file.getsampwidth()
+    self._start=monotonic()
+    self._frames=0
+
+  def _readFrames(self, frames: int) -> bytes:
+    _data=self._file.readframes(frames)
+    _size=frames * self._channels * self._sampleWidth
+    if len(_data) < _size and self._loop:
+      self._file.rewind()
+      _data+=self._file.readframes(frames - len(_data) // (self._channels * self._sampleWidth))
+    self._frames+=frames
+    if self._realtime:
+      # Wait until the last sample of the block would have been captured:
+      _wait=self._start + self._frames / self._rate - monotonic()
+      if _wait > 0:
+        sleep(_wait)
+    return _data
+
+
+class SpectrumAnalyzer:
+  """
+  Class that computes the levels of a number of frequency bands from a window of samples.
+
+  The bands are spread logarithmically between 'minFrequency' and 'maxFrequency', like the ear hears them.  The
+  level of a band is its loudness in dB scaled between 0 and 1 over 'dynamicRange' dB below the loudest band.
+  The loudest band sets the top of the range and that top comes down slowly when the music gets quieter (an
+  automatic gain), so quiet music still moves the lights.
+  """
+  # dB that the top of the range comes down per block when the music gets quieter:
+  PEAK_DECAY=0.05
+  # The top of the range never gets lower than this (in dB of a full scale sine), so noise stays dark:
+  MIN_PEAK=-50
+
+  def __init__(self, rate: int, window: int, bands: int, minFrequency: float=40, maxFrequency: float=16000, \
+               dynamicRange: float=40):
+    """ Constructor.
+
+    Arguments:
+      rate (int): number of samples per second;
+      window (int): number of samples per FFT;
+      bands (int): number of frequency bands;
+      minFrequency (float): the lowest frequency in Hz (default=40);
+      maxFrequency (float): the highest frequency in Hz (default=16000; at most half the rate);
+      dynamicRange (float): the number of dB between a band with level 0 and 1 (default=40);
+    """
+    np=_numpy()
+    if not (bands > 0): raise Exception("The spectrum needs at least 1 band!")
+    # Scale the Hann window so that a full scale sine has a magnitude of 1 (0 dB):
+    self._window=np.hanning(window).astype(np.float32)
+    self._window*=2 / self._window.sum()
+    # The first FFT bin of each band (bin 0 is the DC offset):
+    _binWidth=rate / window
+    _edges=[]
+    for _frequency in np.geomspace(minFrequency, min(maxFrequency, rate / 2), bands + 1):
+      _edges.append(max(int(round(_frequency / _binWidth)), _edges[-1] + 1 if len(_edges) > 0 else 1))
+    if _edges[-1] > window // 2 + 1:
+      raise Exception(f"{bands} bands need a window of more than {window} samples!")
+    self._starts=np.array(_edges[:-1])
+    self._end=_edges[-1]
+    self._counts=np.diff(_edges).astype(np.float32)
+    self._dynamicRange=dynamicRange
+    self._peak=self.MIN_PEAK
+
+  def levels(self, samples):
+    """ Return a NumPy array with the level of each band between 0 and 1. """
+    np=numpy
+    _magnitudes=np.abs(np.fft.rfft(samples * self._window))[:self._end]
+    # The average magnitude of the bins in each band, in dB:
+    _bands=20 * np.log10(np.add.reduceat(_magnitudes, self._starts) / self._counts + 1e-9)
+    self._peak=max(float(_bands.max()), self._peak - self.PEAK_DECAY, self.MIN_PEAK)
+    return np.clip((_bands - (self._peak - self._dynamicRange)) / self._dynamicRange, 0, 1)
+
+
+class AudioStream:
+  """
+  Class that captures blocks of audio in its own thread and keeps the newest window of samples.
+  """
+
+  def __init__(self, source: PcmSource, window: int=1024, hop: int=256):
+    """ Constructor.
+
+    Arguments:
+      source (PcmSource): the audio source;
+      window (int): number of samples in a window (default=1024);
+      hop (int): number of samples per block: a new window is ready after each block (default=256);
+    """
+    if not (0 < hop <= window): raise Exception("The hop of an audio stream needs to be between 1 and the window size!")
+    self._debug=False
+    self._source=source
+    self._window=window
+    self._hop=hop
+    self._samples=None
+    self._sequence=0            # number of blocks captured
+    self._captured=0            # time.monotonic() time at which the newest block was captured
+    self._running=False
+    self._condition=threading.Condition()
+    self._thread=None
+
+  @property
+  def debug(self) -> bool:
+    """ Return the debug-flag that is set for the stream. """
+    return self._debug
+
+  @debug.setter
+  def debug(self, flag: bool):
+    """ Set the debug level. """
+    self._debug=flag
+
+  @property
+  def source(self) -> PcmSource:
+    """ Return the audio source. """
+    return self._source
+
+  @property
+  def running(self) -> bool:
+    """ Return True while the stream is capturing audio. """
+    return self._running
+
+  def log(self, *args, debug: bool=False):
+    """ Simple function to log messages to the console. """
+    _log=True
+    if debug and not self._debug:
+      _log=False
+    if _log:
+      # We don't want to log the message as a list between '()' if we only got 1 element in the argument list:
+      if len(args) == 1:
+        print(f"{type(self)}: {args[0]}")
+      else:
+        print(f"{type(self)}: {args}")
+      # We need to flush the stdout buffer in python for log statements to reach the Linux systemd journal:
+      sys.stdout.flush()
+
+  def start(self):
+    """ Open the source and start capturing in a new thread.  Raises an exception if the source can't be opened. """
+    np=_numpy()
+    self._source.open()
+    self._samples=np.zeros(self._window, dtype=np.float32)
+    self._sequence=0
+    self._running=True
+    self._thread=threading.Thread(target=self._run, name="AudioStream", daemon=True)
+    self._thread.start()
+
+  def stop(self):
+    """ Stop capturing.  The capture thread ends after the block that it's reading. """
+    with self._condition:
+      self._running=False
+      self._condition.notify_all()
+    if self._thread is not None and self._thread is not threading.current_thread():
+      self._thread.join(1)
+
+  def _run(self):
+    """ Capture blocks until the stream gets stopped or the source ends. """
+    _hop=self._hop
+    try:
+      while self._running:
+        _block=self._source.read(_hop)
+        if _block is None:
+          self.log("the audio source ended")
+          break
+        _captured=monotonic()
+        with self._condition:
+          # Shift the window 1 block:
+          self._samples[:-_hop]=self._samples[_hop:]
+          self._samples[-_hop:]=_block
+          self._sequence+=1
+          self._captured=_captured
+          self._condition.notify_all()
+    except Exception as exc:
+      self.log(f"capturing audio failed: {exc}")
+    finally:
+      self._source.close()
+      with self._condition:
+        self._running=False
+        self._condition.notify_all()
+
+  def next(self, sequence: int, timeout: float=None) -> tuple:
+    """ Wait for a block newer than 'sequence' and return (sequence, capture time, copy of the window).
+    Returns None if there's no newer block before the timeout or if the stream stopped.
+
+    Arguments:
+      sequence (int): the sequence number of the last block that the caller got (0 for none);
+      timeout (float): maximum number of seconds to wait (default=None -> wait for as long as it takes);
+    """
+    with self._condition:
+      if not self._condition.wait_for(lambda: self._sequence > sequence or not self._running, timeout):
+        return None
+      if self._sequence <= sequence:
+        return None
+      return (self._sequence, self._captured, self._samples.copy())
@@ -0,0 +1,234 @@
+"""
+This module contains the registry of the behavior modules that can be selected for a light.
+
+Behaviors are registered by reference (a 'module:Class' string, a plugin file or an entry point) and their class
+is looked up the first time it's needed.  The built-in behaviors all live in the BehaviorModules module, so they
+get imported together as soon as a light needs the 'Default' behavior.  Plugin files and packages are only
+imported when one of their behaviors is selected or their schema is asked for (schemas() imports them all).
+
+Behaviors are discovered from 3 places:
+- the built-in behaviors in the BehaviorModules module;
+- python files in the 'plugins' directory next to this module.  Each class in those files that derives from
+  a BehaviorModule is registered under its 'behaviorName' class attribute or its class name without
+  the 'Module' suffix ('SparkleModule' -> 'Sparkle').  The files are parsed but not imported until the
+  behavior is selected;
+- python packages that advertise classes through the 'ledstrips.behaviors' entry point group;
+
+This module requires these modules:
+- ast and importlib modules from the Python standard library;
+"""
+
+import ast
+import importlib
+import importlib.util
+import os
+import sys
+
+
+class BehaviorRegistry:
+  """
+  Class that maps behavior names to the classes that implement them.
+  """
+  ENTRY_POINT_GROUP="ledstrips.behaviors"
+  DEFAULT_BEHAVIOR="Default"
+
+  def __init__(self, pluginsDirectory: str=None):
+    """ Constructor registering the built-in behaviors.
+
+    Arguments:
+      pluginsDirectory (str): directory to scan for behavior plugins (default=None -> no plugins).
+    """
+    self._debug=False
+    self._pluginsDirectory=pluginsDirectory
+    self._discovered=False
+    # name -> (kind, target, attribute) reference to the class that implements the behavior:
+    #   ("module", "<module name>", "<class name>")
+    #   ("file", "<path to python file>", "<class name>")
+    #   ("entrypoint", <importlib.metadata.EntryPoint>, None)
+    self._references={}
+    # name -> class for the behaviors that have been imported already:
+    self._classes={}
+    # The behaviors that come with this app:
+    self.register("Default", "BehaviorModules:DefaultModule")
+    self.register("Christmas", "BehaviorModules:ChristmasModule")
+    self.register("Fluid", "BehaviorModules:FluidModule")
+    self.register("Playback", "BehaviorModules:PlaybackModule")
+    self.register("ColorWipe", "BehaviorModules:ColorWipeModule")
+    self.register("TheaterChase", "BehaviorModules:TheaterChaseModule")
+    self.register("Rainbow", "BehaviorModules:RainbowModule")
+    self.register("RainbowCycle", "BehaviorModules:RainbowCycleModule")
+    self.register("TheaterChaseRainbow", "BehaviorModules:TheaterChaseRainbowModule")
+    self.register("Clock", "BehaviorModules:ClockModule")
+    self.register("AudioReactive", "BehaviorModules:AudioReactiveModule")
+    self.register("Stream", "BehaviorModules:StreamModule")
+
+  @property
+  def debug(self) -> bool:
+    """ Return the debug-flag that is set for this registry. """
+    return self._debug
+
+  @debug.setter
+  def debug(self, flag: bool):
+    """ Set the debug level. """
+    self._debug=flag
+
+  @property
+  def pluginsDirectory(self) -> str:
+    """ Return the directory that is scanned for behavior plugins. """
+    return self._pluginsDirectory
+
+  @pluginsDirectory.setter
+  def pluginsDirectory(self, value: str):
+    """ Set the directory that is scanned for behavior plugins.  It gets rescanned on the next lookup. """
+    self._pluginsDirectory=value
+    self._discovered=False
+
+  @property
+  def names(self) -> list:
+    """ Return the names of all the behaviors that can be selected (without importing them). """
+    self.discover()
+    return list(self._references.keys())
+
+  def log(self, *args, debug: bool=False):
+    """ Simple function to log messages to the console. """
+    _log=True
+    if debug and not self._debug:
+      _log=False
+    if _log:
+      # We don't want to log the message as a list between '()' if we only got 1 element in the argument list:
+      if len(args) == 1:
+        print(f"{type(self)}: {args[0]}")
+      else:
+        print(f"{type(self)}: {args}")
+      # We need to flush the stdout buffer in python for log statements to reach the Linux systemd journal:
+      sys.stdout.flush()
+
+  def register(self, name: str, reference):
+    """ Register a behavior.
+
+    Arguments:
+      name (str):  the name under which the behavior can be selected;
+      reference:   either a 'module:Class' string, or the class itself;
+    """
+    if isinstance(reference, str):
+      _module, _, _class=reference.partition(":")
+      if _class == "": raise Exception(f"Behavior reference '{reference}' needs to be formatted as 'module:Class'!")
+      self._references[name]=("module", _module, _class)
+      self._classes.pop(name, None)
+    else:
+      self._references[name]=("class", reference, None)
+      self._classes[name]=reference
+
+  def isKnown(self, name: str) -> bool:
+    """ Return True if a behavior with this name has been registered. """
+    # Don't scan for plugins (or installed packages) for the behaviors that we already know about:
+    if name in self._references:
+      return True
+    self.discover()
+    return name in self._references
+
+  def isLoaded(self, name: str) -> bool:
+    """ Return True if the class of this behavior has been imported already. """
+    return name in self._classes
+
+  def discover(self):
+    """ Find the behavior plugins (only once).  Nothing gets imported here. """
+    if self._discovered:
+      return
+    self._discovered=True
+    self._discoverPluginFiles()
+    self._discoverEntryPoints()
+
+  def _discoverPluginFiles(self):
+    """ Parse the python files in the plugins directory and register the behavior classes in them. """
+    if self._pluginsDirectory is None or not os.path.isdir(self._pluginsDirectory):
+      return
+    for _fileName in sorted(os.listdir(self._pluginsDirectory)):
+      if not _fileName.endswith(".py") or _fileName.startswith("_"):
+        continue
+      _path=os.path.join(self._pluginsDirectory, _fileName)
+      try:
+        with open(_path, "r") as stream:
+          _tree=ast.parse(stream.read(), filename=_path)
+      except (OSError, SyntaxError) as exc:
+        self.log(f"skipping plugin file '{_path}': {exc}")
+        continue
+      for _node in _tree.body:
+        if not isinstance(_node, ast.ClassDef):
+          continue
+        # Only pick up classes that derive from one of the behavior modules:
+        # (base classes show up as 'Name' nodes or as 'Attribute' nodes for 'BehaviorModules.DefaultModule')
+        _bases=[getattr(_base, "attr", getattr(_base, "id", "")) for _base in _node.bases]
+        if not any(_base.endswith("Module") for _base in _bases):
+          continue
+        _name=self._behaviorName(_node)
+        self.log(f"found behavior '{_name}' in plugin file '{_path}'", debug=True)
+        self._references[_name]=("file", _path, _node.name)
+
+  def _behaviorName(self, node: ast.ClassDef) -> str:
+    """ Return the behavior name of a parsed class: its 'behaviorName' attribute or its name without 'Module'. """
+    for _statement in node.body:
+      if isinstance(_statement, ast.Assign):
+        for _target in _statement.targets:
+          if isinstance(_target, ast.Name) and _target.id == "behaviorName":
+            # Python 3.7 parses string literals into 'Str' nodes ('s') instead of 'Constant' nodes ('value'):
+            return str(getattr(_statement.value, "value", getattr(_statement.value, "s", node.name)))
+    if node.name.endswith("Module") and len(node.name) > len("Module"):
+      return node.name[:-len("Module")]
+    return node.name
+
+  def _discoverEntryPoints(self):
+    """ Register the behaviors that installed packages advertise through entry points. """
+    try:
+      from importlib.metadata import entry_points
+    except ImportError:
+      # Python 3.7 (Raspbian Buster) doesn't have importlib.metadata.  No entry points then.
+      return
+    _entryPoints=entry_points()
+    if hasattr(_entryPoints, "select"):
+      _entryPoints=_entryPoints.select(group=self.ENTRY_POINT_GROUP)
+    else:
+      _entryPoints=_entryPoints.get(self.ENTRY_POINT_GROUP, [])
+    for _entryPoint in _entryPoints:
+      self.log(f"found behavior '{_entryPoint.name}' in entry point '{_entryPoint.value}'", debug=True)
+      self._references[_entryPoint.name]=("entrypoint", _entryPoint, None)
+
+  def behaviorClass(self, name: str):
+    """ Return the class that implements the behavior, importing its module if that wasn't done yet. """
+    if name in self._classes:
+      return self._classes[name]
+    if not self.isKnown(name): raise Exception(f"Unknown behavior '{name}'!")
+    _kind, _target, _attribute=self._references[name]
+    self.log(f"loading behavior '{name}' ({_kind}: {_target})", debug=True)
+    if _kind == "module":
+      _class=getattr(importlib.import_module(_target), _attribute)
+    elif _kind == "file":
+      _spec=importlib.util.spec_from_file_location(f"ledstrips_plugin_{name}", _target)
+      _module=importlib.util.module_from_spec(_spec)
+      _spec.loader.exec_module(_module)
+      _class=getattr(_module, _attribute)
+    else:
+      _class=_target.load()
+    self._classes[name]=_class
+    return _class
+
+  def create(self, name: str, ledSettings: dict):
+    """ Construct a new instance of the behavior for a light. """
+    return self.behaviorClass(name)(ledSettings)
+
+  def schema(self, name: str) -> dict:
+    """ Return the description and parameters of a behavior (this imports the behavior). """
+    _class=self.behaviorClass(name)
+    _doc=(_class.__doc__ or "").strip()
+    return {"name": name,
+            "description": _doc.splitlines()[0] if _doc else "",
+            "parameters": getattr(_class, "parameters", {})
+           }
+
+  def schemas(self) -> list:
+    """ Return the schemas of all the known behaviors (this imports all the plugins). """
+    return [self.schema(_name) for _name in self.names]
+
+
+# The registry that is shared by all the lights in the app:
+registry=BehaviorRegistry(pluginsDirectory=os.path.join(os.path.dirname(os.path.abspath(__file__)), "plugins"))
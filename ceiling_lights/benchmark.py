@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+#***********************************************************************************************************#
+# Benchmarks for the ceiling lights app.                                                                    #
+#                                                                                                           #
+# Run these on the Raspberry PI itself (the numbers on a desktop machine say very little about a Pi Zero).  #
+# On a host without the Raspberry PI libraries, the mocks in this directory are used instead.               #
+#                                                                                                           #
+# Benchmarks:                                                                                               #
+#   startup: start lights.py a number of times and report how long it takes before the switches respond     #
+#            and before the REST API server is up.  The first run starts without a cached config;            #
+#   config:  time to import yaml, to parse and validate the config-file and to load it from its cache;      #
+#   swap:    time to switch a light that is on between behaviors and the number of times that the ledstrip  #
+#            hardware was set up while doing that (should be 1);                                            #
+#   scan:    time to scan a number of switches through the switch bank (1 register read) and pin by pin;    #
+#   effects: frame rate of the strandtest effects at their highest speed, next to the time that            #
+#            strandtest.py needs to compute 1 rainbowCycle frame with wheel() per led;                      #
+#   clock:   frames and CPU time of the Clock behavior, with and without the seconds fade;                  #
+#   sparse:  1 random led per frame (like SK6812_fun.py): writing the whole frame versus writing only the   #
+#            changed leds through a FrameBuffer;                                                            #
+#   audio:   time to compute the spectrum of a block and the latency from capture to light of the          #
+#            AudioReactive behavior, playing a WAV file as if it was captured (needs NumPy);                #
+#   stream:  frames per second and packet loss of the Stream behavior, with a local generator that streams  #
+#            E1.31 universes or DDP packets to it;                                                          #
+#                                                                                                           #
+# Examples:                                                                                                 #
+#   ./benchmark.py startup                                                                                  #
+#   ./benchmark.py startup --config lights_loft.yaml --runs 10                                              #
+#   ./benchmark.py config --runs 100                                                                        #
+#   ./benchmark.py swap --leds 300 --runs 50                                                                #
+#   ./benchmark.py scan --switches 8                                                                        #
+#   ./benchmark.py effects --leds 250                                                                       #
+#   ./benchmark.py clock --leds 12 --seconds 30                                                             #
+#   ./benchmark.py sparse --leds 250 --frames 10000                                                         #
+#   ./benchmark.py audio --wav recording.wav --leds 250 --seconds 10                                        #
+#   ./benchmark.py stream --protocol e131 --leds 250 --fps 200 --seconds 10                                 #
+#***********************************************************************************************************#
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+# The directory of the app (lights.py changes into it when it starts):
+APP_DIRECTORY=os.path.dirname(os.path.abspath(__file__))
+
+
+def _percentile(values: list, percent: float) -> float:
+  """ Return the value at the percentile of a list of values. """
+  _values=sorted(values)
+  return _values[min(len(_values) - 1, int(round(percent / 100 * (len(_values) - 1))))]
+
+
+def report(name: str, values: list, unit: str="ms"):
+  """ Print the statistics of a list of measurements. """
+  if len(values) == 0:
+    print(f"{name}: no measurements")
+    return
+  print(f"{name}: n={len(values)} min={min(values):.1f}{unit} median={_percentile(values, 50):.1f}{unit} " \
+        f"p95={_percentile(values, 95):.1f}{unit} max={max(values):.1f}{unit}")
+
+
+def startupRun(config: str, timeout: float) -> dict:
+  """ Start lights.py once and return the number of milliseconds until the switches were ready and until the
+  API server was started (None for the events that didn't happen before the timeout; -1 if there's no API server).
+  """
+  _times={"switches": None, "api": None}
+  _env=dict(os.environ, LIGHTS_CONFIG=config, PYTHONUNBUFFERED="1")
+  _start=time.monotonic()
+  _process=subprocess.Popen([sys.executable, os.path.join(APP_DIRECTORY, "lights.py")], env=_env, \
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+  _done=threading.Event()
+
+  def _read():
+    for _line in _process.stdout:
+      _elapsed=(time.monotonic() - _start) * 1000
+      if "switches ready" in _line and _times["switches"] is None:
+        _times["switches"]=_elapsed
+      elif "REST API server started" in _line and _times["api"] is None:
+        _times["api"]=_elapsed
+      elif "there's no config for an API server" in _line or "can't start the REST API server" in _line:
+        _times["api"]=-1
+      if _times["switches"] is not None and _times["api"] is not None:
+        _done.set()
+    _done.set()
+
+  threading.Thread(target=_read, daemon=True).start()
+  _done.wait(timeout)
+  # Stop the app like systemd does:
+  _process.send_signal(signal.SIGTERM)
+  try:
+    _process.wait(10)
+  except subprocess.TimeoutExpired:
+    _process.kill()
+    _process.wait()
+  return _times
+
+
+def benchmarkStartup(args):
+  """ Measure the time to the first switch response over a number of starts of the app. """
+  from config_cache import cachePath
+  _cache=cachePath(os.path.join(APP_DIRECTORY, args.config))
+  _switches=[]
+  _api=[]
+  for _run in range(args.runs):
+    if _run == 0 and os.path.exists(_cache):
+      # The first start parses the yaml config-file:
+      os.remove(_cache)
+    _times=startupRun(args.config, args.timeout)
+    print(f"run {_run + 1}: switches ready after {_times['switches']} ms; API server after {_times['api']} ms" \
+          + (" (no config cache)" if _run == 0 else ""))
+    if _times["switches"] is not None:
+      _switches.append(_times["switches"])
+    if _times["api"] is not None and _times["api"] >= 0:
+      _api.append(_times["api"])
+  report("time to first switch response", _switches)
+  report("time to API server", _api)
+
+
+def benchmarkConfig(args):
+  """ Compare parsing the yaml config-file with loading its validated config from the cache. """
+  from config_cache import loadConfig, parseConfig, cachePath
+  _path=os.path.join(APP_DIRECTORY, args.config)
+  _start=time.perf_counter()
+  import yaml
+  print(f"import yaml: {(time.perf_counter() - _start) * 1000:.1f}ms (C parser available: {hasattr(yaml, 'CSafeLoader')})")
+  with open(_path, "rb") as _file:
+    _content=_file.read()
+  _parse=[]
+  for _run in range(args.runs):
+    _start=time.perf_counter()
+    parseConfig(_content, args.config)
+    _parse.append((time.perf_counter() - _start) * 1000)
+  report("parse and validate", _parse)
+  # Make sure there's an up to date cache and then time loading it:
+  loadConfig(_path)
+  _load=[]
+  for _run in range(args.runs):
+    _start=time.perf_counter()
+    loadConfig(_path)
+    _load.append((time.perf_counter() - _start) * 1000)
+  report(f"load from cache ({os.path.basename(cachePath(_path))})", _load)
+
+
+def benchmarkSwap(args):
+  """ Measure how long it takes to switch a light that is on from 1 behavior to another. """
+  from ledstrip import Light
+  from strip_manager import strips
+  light=Light(args.name)
+  light.debug=False
+  light.ledCount=args.leds
+  light.stripGpioPin=args.gpio_pin
+  light.begin()
+  light.On()
+  _behaviors=args.behaviors.split(",")
+  _swaps=[]
+  for _run in range(args.runs):
+    for _behavior in _behaviors:
+      _start=time.perf_counter()
+      light.behaviorModuleName=_behavior
+      _swaps.append((time.perf_counter() - _start) * 1000)
+      # Give the animation thread of the behavior some time to render its first frames:
+      time.sleep(args.dwell)
+  light.Off()
+  light.releaseStrip()
+  report(f"behavior swap ({' -> '.join(_behaviors)})", _swaps)
+  _stats=strips.stats
+  print(f"ledstrip set up {_stats['initializations']} time(s) and released {_stats['releases']} time(s) for {len(_swaps)} swaps")
+
+
+def benchmarkScan(args):
+  """ Compare scanning the switches through the switch bank with reading them pin by pin. """
+  from ledstrip import Switch
+  from switch_bank import SwitchBank
+  _switches=[]
+  for _index in range(args.switches):
+    _switch=Switch(f"Switch {_index}")
+    _switch.debug=False
+    _switch.gpioPin=2 + _index % 25
+    _switch.init()
+    _switches.append(_switch)
+  bank=SwitchBank(args.gpiomem)
+  bank.open()
+
+  def _scan(levels) -> float:
+    _start=time.perf_counter()
+    for _run in range(args.runs):
+      for _switch in _switches:
+        _switch.hasChanged(levels())
+    return (time.perf_counter() - _start) * 1000000 / args.runs
+
+  _scans={"pin by pin": _scan(lambda: None)}
+  if bank.mapped:
+    _scans["switch bank"]=_scan(bank.read)
+  else:
+    print(f"{args.gpiomem} is not available: only scanning pin by pin")
+  for _name, _microseconds in _scans.items():
+    print(f"{_name}: {_microseconds:.1f}us per scan of {args.switches} switches (max {1000000 / _microseconds:.0f} scans per second)")
+  bank.close()
+
+
+def benchmarkEffects(args):
+  """ Measure the frame rate of the scheduled strandtest effects at their highest speed. """
+  from ledstrip import Light
+  from behavior_registry import registry
+  from frame_scheduler import scheduler
+  from BehaviorModules import wheel
+  # What strandtest.py does for each frame of rainbowCycle:
+  _frames=[]
+  for _step in range(256):
+    _start=time.perf_counter()
+    [wheel((int(i * 256 / args.leds) + _step) & 255) for i in range(args.leds)]
+    _frames.append((time.perf_counter() - _start) * 1000)
+  report(f"strandtest rainbowCycle: wheel() per led ({args.leds} leds, without setPixelColor)", _frames)
+  light=Light(args.name)
+  light.debug=False
+  light.ledCount=args.leds
+  light.begin()
+  for _behavior in args.behaviors.split(","):
+    _start=time.perf_counter()
+    light.behaviorModuleName=_behavior
+    _speed=registry.behaviorClass(_behavior).parameters["speed"]["max"]
+    light.behaviorParameters={"speed": _speed}
+    _compile=(time.perf_counter() - _start) * 1000
+    _before=scheduler.stats
+    light.On()
+    time.sleep(args.seconds)
+    _after=scheduler.stats
+    light.Off()
+    _fps=(_after["frames"] - _before["frames"]) / args.seconds
+    print(f"{_behavior}: {_fps:.0f} frames per second (asked for {_speed}); " \
+          f"{_after['late'] - _before['late']} late; selecting and compiling took {_compile:.1f}ms")
+  light.releaseStrip()
+
+
+def benchmarkClock(args):
+  """ Measure the number of frames and the CPU time that the Clock behavior takes. """
+  from ledstrip import Light
+  from frame_scheduler import scheduler
+  light=Light(args.name)
+  light.debug=False
+  light.ledCount=args.leds
+  light.begin()
+  light.behaviorModuleName="Clock"
+  for _fade in (False, True):
+    light.behaviorParameters={"fade": _fade}
+    _frames=scheduler.stats["frames"]
+    _cpu=time.process_time()
+    light.On()
+    time.sleep(args.seconds)
+    light.Off()
+    _cpu=time.process_time() - _cpu
+    print(f"clock on {args.leds} leds (fade: {_fade}): {scheduler.stats['frames'] - _frames} frames in {args.seconds}s; " \
+          f"CPU {_cpu * 1000:.1f}ms ({_cpu / args.seconds * 100:.2f}%)")
+  light.releaseStrip()
+
+
+def benchmarkSparse(args):
+  """ Compare writing whole frames with writing only the changed leds for an effect that changes 1 led per frame. """
+  import random
+  from rpi_ws281x import PixelStrip, Color
+  from framebuffer import FrameBuffer, newFrame, writeFrame
+  strip=PixelStrip(args.leds, args.gpio_pin)
+  strip.begin()
+  _changes=[(random.randrange(args.leds), Color(random.randrange(256), random.randrange(256), random.randrange(256))) \
+            for _ in range(args.frames)]
+  # The whole frame every time:
+  _frame=newFrame(args.leds)
+  _start=time.perf_counter()
+  for _led, _color in _changes:
+    _frame[_led]=_color
+    writeFrame(strip, _frame)
+  _full=(time.perf_counter() - _start) * 1000000 / args.frames
+  print(f"whole frame: {_full:.1f}us per frame; {args.leds} leds written per frame")
+  # Only the changed leds:
+  frame=FrameBuffer(args.leds)
+  frame.flush(strip)
+  _start=time.perf_counter()
+  for _led, _color in _changes:
+    frame.setPixel(_led, _color)
+    frame.flush(strip)
+  _sparse=(time.perf_counter() - _start) * 1000000 / args.frames
+  _stats=frame.stats
+  print(f"changed leds: {_sparse:.1f}us per frame; {(_stats['pixels'] - args.leds) / args.frames:.2f} leds written per frame")
+  strip._cleanup()
+
+
+def _testRecording(path: str, seconds: float, rate: int=44100):
+  """ Write a WAV file with a beat, a tone that sweeps up and some noise, to use when there's no recording. """
+  import math
+  import random
+  import wave
+  from array import array
+  _samples=array("h")
+  for _index in range(int(seconds * rate)):
+    _time=_index / rate
+    # A 60Hz kick twice per second, a tone sweeping from 100Hz to 8kHz every 4 seconds and some hiss:
+    _kick=math.exp(-(_time % 0.5) * 20) * math.sin(2 * math.pi * 60 * _time)
+    _sweep=0.3 * math.sin(2 * math.pi * 100 * ((80 ** ((_time % 4) / 4) - 1) / math.log(80) * 4))
+    _samples.append(int((0.5 * _kick + _sweep + random.uniform(-0.02, 0.02)) * 32767 * 0.8))
+  with wave.open(path, "wb") as _file:
+    _file.setnchannels(1)
+    _file.setsampwidth(2)
+    _file.setframerate(rate)
+    _file.writeframes(_samples.tobytes())
+
+
+def benchmarkAudio(args):
+  """ Measure the time to analyze a block of audio and the latency from capture to light of AudioReactive. """
+  import tempfile
+  import numpy
+  from ledstrip import Light
+  from audio_stream import WavSource, SpectrumAnalyzer
+  from BehaviorModules import AudioReactiveModule
+  _wav=args.wav
+  if _wav is None:
+    _wav=os.path.join(tempfile.mkdtemp(), "test.wav")
+    _testRecording(_wav, 10)
+    print(f"no recording given: using a generated test file ({_wav})")
+  # The spectrum of each block of the file, as fast as it goes:
+  source=WavSource(_wav, realtime=False, loop=False)
+  source.open()
+  analyzer=SpectrumAnalyzer(source.rate, AudioReactiveModule.WINDOW, args.bands)
+  _hop=AudioReactiveModule.HOP
+  _window=numpy.zeros(AudioReactiveModule.WINDOW, dtype=numpy.float32)
+  _times=[]
+  while True:
+    _block=source.read(_hop)
+    if _block is None:
+      break
+    _start=time.perf_counter()
+    # What the stream and the behavior do per block: shift the window and compute its spectrum:
+    _window[:-_hop]=_window[_hop:]
+    _window[-_hop:]=_block
+    analyzer.levels(_window.copy())
+    _times.append((time.perf_counter() - _start) * 1000000)
+  source.close()
+  report(f"spectrum of a block ({AudioReactiveModule.WINDOW} samples, {args.bands} bands)", _times, unit="us")
+  print(f"1 block is {AudioReactiveModule.HOP / source.rate * 1000:.1f}ms of audio at {source.rate}Hz")
+  # The whole pipeline, with the file played at its real pace:
+  light=Light(args.name)
+  light.debug=False
+  light.ledCount=args.leds
+  light.begin()
+  light.behaviorModuleName="AudioReactive"
+  light.behaviorParameters={"source": "wav", "input": _wav, "bands": args.bands}
+  _cpu=time.process_time()
+  light.On()
+  time.sleep(args.seconds)
+  _module=light._behaviorModule
+  _stats=_module.latencyStats
+  light.Off()
+  _module.join(2)
+  _cpu=time.process_time() - _cpu
+  print(f"AudioReactive on {args.leds} leds: {_stats['frames'] / args.seconds:.0f} frames per second; " \
+        f"{_stats['dropped']} blocks dropped; CPU {_cpu / args.seconds * 100:.1f}%")
+  report("latency from capture to light", [_latency * 1000 for _latency in _module._latencies])
+  light.releaseStrip()
+
+
+def benchmarkStream(args):
+  """ Stream frames to the Stream behavior over UDP and measure the frames that got shown and the packet loss. """
+  import socket
+  from ledstrip import Light
+  from pixel_stream import e131Packet, ddpPacket, E131_CHANNELS, DDP_CHANNELS, E131_PORT, DDP_PORT
+  _channels=len(args.format)
+  _port=args.port or (E131_PORT if args.protocol == "e131" else DDP_PORT)
+  # The packets of 32 frames of a moving gradient:
+  _frames=[]
+  for _step in range(32):
+    _data=bytes((_led * 8 + _step * 8 + _channel * 85) & 255 for _led in range(args.leds) for _channel in range(_channels))
+    _packets=[]
+    if args.protocol == "e131":
+      _size=E131_CHANNELS // _channels * _channels
+      for _universe, _offset in enumerate(range(0, len(_data), _size)):
+        _packets.append((1 + _universe, _data[_offset:_offset + _size]))
+    else:
+      for _offset in range(0, len(_data), DDP_CHANNELS):
+        _packets.append((_offset, _data[_offset:_offset + DDP_CHANNELS]))
+    _frames.append(_packets)
+  light=Light(args.name)
+  light.debug=False
+  light.ledCount=args.leds
+  light.begin()
+  light.behaviorModuleName="Stream"
+  light.behaviorParameters={"protocol": args.protocol, "port": args.port, "format": args.format}
+  light.On()
+  _module=light._behaviorModule
+  while _module.streamStats is None:
+    time.sleep(0.01)
+  _socket=socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+  _sent=0
+  _sequence=0
+  _start=time.perf_counter()
+  _frameCount=int(args.fps * args.seconds)
+  for _frame in range(_frameCount):
+    # Send the frames at a fixed pace:
+    _wait=_start + _frame / args.fps - time.perf_counter()
+    if _wait > 0:
+      time.sleep(_wait)
+    _packets=_frames[_frame % len(_frames)]
+    for _index, (_address, _data) in enumerate(_packets):
+      if args.protocol == "e131":
+        _packet=e131Packet(_address, _sequence, _data)
+      else:
+        _packet=ddpPacket(_address, _data, _sequence, push=_index == len(_packets) - 1)
+      _socket.sendto(_packet, ("127.0.0.1", _port))
+      _sent+=1
+    _sequence+=1
+  _elapsed=time.perf_counter() - _start
+  time.sleep(0.2)
+  _stats=_module.streamStats
+  light.Off()
+  _module.join(2)
+  _socket.close()
+  _shown=_stats["frames"] - _stats["dropped-frames"]
+  print(f"sent {_frameCount} frames of {args.leds} leds ({_sent} {args.protocol} packets) at {_frameCount / _elapsed:.0f} fps")
+  print(f"received {_stats['packets']} packets ({(1 - _stats['packets'] / _sent) * 100:.2f}% lost); " \
+        f"{_stats['frames']} frames complete; {_shown} shown ({_shown / _elapsed:.0f} fps); " \
+        f"{_stats['dropped-frames']} dropped as late; {_stats['late-packets']} late packets")
+  light.releaseStrip()
+
+
+#--------------------------------------------------#
+# The app starts here...
+#--------------------------------------------------#
+if __name__ == '__main__':
+  parser=argparse.ArgumentParser(description="Benchmarks for the ceiling lights app.")
+  benchmarks=parser.add_subparsers(dest="benchmark")
+  startup=benchmarks.add_parser("startup", help="time to the first switch response after starting lights.py")
+  startup.add_argument('--config', action='store', default='lights.yaml', help='config-file (default: lights.yaml)')
+  startup.add_argument('--runs', action='store', type=int, default=5, help='number of starts (default: 5)')
+  startup.add_argument('--timeout', action='store', type=float, default=60, help='seconds to wait per start (default: 60)')
+  startup.set_defaults(function=benchmarkStartup)
+  config=benchmarks.add_parser("config", help="time to parse the config-file versus loading it from its cache")
+  config.add_argument('--config', action='store', default='lights.yaml', help='config-file (default: lights.yaml)')
+  config.add_argument('--runs', action='store', type=int, default=100, help='number of runs (default: 100)')
+  config.set_defaults(function=benchmarkConfig)
+  swap=benchmarks.add_parser("swap", help="time to switch a light between behaviors without setting up the ledstrip again")
+  swap.add_argument('--name', action='store', default='Benchmark', help='name of the light (default: Benchmark)')
+  swap.add_argument('--leds', action='store', type=int, default=300, help='number of leds (default: 300)')
+  swap.add_argument('--gpio-pin', action='store', type=int, default=18, help='GPIO pin of the ledstrip (default: 18)')
+  swap.add_argument('--behaviors', action='store', default='Default,Christmas,Fluid', \
+                    help='comma separated behaviors to cycle through (default: Default,Christmas,Fluid)')
+  swap.add_argument('--runs', action='store', type=int, default=20, help='number of cycles (default: 20)')
+  swap.add_argument('--dwell', action='store', type=float, default=0.05, help='seconds to stay on each behavior (default: 0.05)')
+  swap.set_defaults(function=benchmarkSwap)
+  scan=benchmarks.add_parser("scan", help="time to scan the switches through the switch bank versus pin by pin")
+  scan.add_argument('--switches', action='store', type=int, default=4, help='number of switches (default: 4)')
+  scan.add_argument('--gpiomem', action='store', default='/dev/gpiomem', help='GPIO device (default: /dev/gpiomem)')
+  scan.add_argument('--runs', action='store', type=int, default=10000, help='number of scans (default: 10000)')
+  scan.set_defaults(function=benchmarkScan)
+  effects=benchmarks.add_parser("effects", help="frame rate of the strandtest effects at their highest speed")
+  effects.add_argument('--name', action='store', default='Benchmark', help='name of the light (default: Benchmark)')
+  effects.add_argument('--leds', action='store', type=int, default=250, help='number of leds (default: 250)')
+  effects.add_argument('--behaviors', action='store', default='ColorWipe,TheaterChase,Rainbow,RainbowCycle,TheaterChaseRainbow', \
+                       help='comma separated behaviors (default: all the strandtest effects)')
+  effects.add_argument('--seconds', action='store', type=float, default=2, help='seconds per behavior (default: 2)')
+  effects.set_defaults(function=benchmarkEffects)
+  clock=benchmarks.add_parser("clock", help="frames and CPU time of the Clock behavior")
+  clock.add_argument('--name', action='store', default='Benchmark', help='name of the light (default: Benchmark)')
+  clock.add_argument('--leds', action='store', type=int, default=12, help='number of leds (default: 12)')
+  clock.add_argument('--seconds', action='store', type=float, default=10, help='seconds per run (default: 10)')
+  clock.set_defaults(function=benchmarkClock)
+  sparse=benchmarks.add_parser("sparse", help="writing whole frames versus only the changed leds")
+  sparse.add_argument('--leds', action='store', type=int, default=250, help='number of leds (default: 250)')
+  sparse.add_argument('--gpio-pin', action='store', type=int, default=18, help='GPIO pin of the ledstrip (default: 18)')
+  sparse.add_argument('--frames', action='store', type=int, default=10000, help='number of frames (default: 10000)')
+  sparse.set_defaults(function=benchmarkSparse)
+  audio=benchmarks.add_parser("audio", help="spectrum time and capture to light latency of the AudioReactive behavior")
+  audio.add_argument('--name', action='store', default='Benchmark', help='name of the light (default: Benchmark)')
+  audio.add_argument('--wav', action='store', default=None, help='recording to play (default: a generated test file)')
+  audio.add_argument('--leds', action='store', type=int, default=250, help='number of leds (default: 250)')
+  audio.add_argument('--bands', action='store', type=int, default=16, help='number of frequency bands (default: 16)')
+  audio.add_argument('--seconds', action='store', type=float, default=10, help='seconds to play (default: 10)')
+  audio.set_defaults(function=benchmarkAudio)
+  stream=benchmarks.add_parser("stream", help="frames per second and packet loss of the Stream behavior")
+  stream.add_argument('--name', action='store', default='Benchmark', help='name of the light (default: Benchmark)')
+  stream.add_argument('--protocol', action='store', default='e131', choices=['e131', 'ddp'], help='protocol (default: e131)')
+  stream.add_argument('--port', action='store', type=int, default=0, help='UDP port (default: the port of the protocol)')
+  stream.add_argument('--format', action='store', default='rgb', choices=['rgb', 'rgbw'], help='channels per pixel (default: rgb)')
+  stream.add_argument('--leds', action='store', type=int, default=250, help='number of leds (default: 250)')
+  stream.add_argument('--fps', action='store', type=float, default=200, help='frames per second to send (default: 200)')
+  stream.add_argument('--seconds', action='store', type=float, default=10, help='seconds to stream (default: 10)')
+  stream.set_defaults(function=benchmarkStream)
+  args=parser.parse_args()
+  if args.benchmark is None:
+    parser.print_help()
+    sys.exit(1)
+  sys.path.insert(0, APP_DIRECTORY)
+  args.function(args)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+#***********************************************************************************************************#
+# Offline compiler for led effects.                                                                         #
+#                                                                                                           #
+# Converts an image, an animated GIF or a scripted effect into a frame sequence file (see frame_sequence.py)#
+# that the 'Playback' behavior can play on a ledstrip.  Run this on a desktop machine rather than on the    #
+# Raspberry PI and copy the result into the 'sequences' directory next to lights.py.                        #
+#                                                                                                           #
+# - still images are played 1 column at a time (light painting), with the image scaled to the led count;    #
+# - animated GIFs are played 1 GIF frame at a time, with each frame scaled down to 1 row of leds;           #
+# - scripts are python files with a 'frames(ledCount, fps)' function that yields frames (lists of Color()   #
+#   values);                                                                                                #
+#                                                                                                           #
+# Images need the Pillow module (pip install pillow).                                                       #
+#                                                                                                           #
+# Examples:                                                                                                 #
+#   ./compile_effect.py --image flag.png --led-count 250 --fps 30 -o sequences/flag.seq                     #
+#   ./compile_effect.py --script fire.py --led-count 250 --fps 50 --format grbw -o sequences/fire.seq       #
+#***********************************************************************************************************#
+from frame_sequence import FrameSequenceWriter, FORMATS
+import importlib.util
+import argparse
+import sys
+import time
+
+
+def rgbToFrame(rgb: bytes) -> bytearray:
+  """ Convert packed RGB bytes (as returned by Pillow) into the bytes of a frame of Color() values. """
+  # Color() values in little-endian memory are ordered: blue, green, red, white
+  _frame=bytearray(len(rgb) // 3 * 4)
+  _frame[2::4]=rgb[0::3]          # red
+  _frame[1::4]=rgb[1::3]          # green
+  _frame[0::4]=rgb[2::3]          # blue
+  return _frame
+
+
+def imageFrames(path: str, ledCount: int):
+  """ Yield the frames of an image file: the GIF frames of an animation or the columns of a still image. """
+  try:
+    from PIL import Image
+  except ImportError:
+    print("The Pillow module is needed to compile images: pip install pillow")
+    sys.exit(1)
+  # Pillow moved its constants into enums in v9.1:
+  _resampling=getattr(Image, "Resampling", Image)
+  _transpose=getattr(Image, "Transpose", Image)
+  img=Image.open(path)
+  if getattr(img, "is_animated", False):
+    for _index in range(img.n_frames):
+      img.seek(_index)
+      yield rgbToFrame(img.convert("RGB").resize((ledCount, 1), _resampling.LANCZOS).tobytes())
+  else:
+    img=img.convert("RGB")
+    _width=max(1, round(img.size[0] * ledCount / img.size[1]))
+    img=img.resize((_width, ledCount), _resampling.LANCZOS)
+    # Swap rows and columns so that each column of the image is 1 row of pixels in the buffer:
+    _rows=img.transpose(_transpose.TRANSPOSE).tobytes()
+    _rowSize=ledCount * 3
+    for _index in range(_width):
+      yield rgbToFrame(_rows[_index * _rowSize:(_index + 1) * _rowSize])
+
+
+def scriptFrames(path: str, ledCount: int, fps: float):
+  """ Yield the frames of a scripted effect. """
+  _spec=importlib.util.spec_from_file_location("effect", path)
+  _module=importlib.util.module_from_spec(_spec)
+  _spec.loader.exec_module(_module)
+  yield from _module.frames(ledCount, fps)
+
+
+#--------------------------------------------------#
+# The app starts here...
+#--------------------------------------------------#
+if __name__ == '__main__':
+  parser=argparse.ArgumentParser(description="Compile an effect into a frame sequence file for the 'Playback' behavior.")
+  source=parser.add_mutually_exclusive_group(required=True)
+  source.add_argument('--image', action='store', help='image or animated GIF to compile')
+  source.add_argument('--script', action='store', help="python file with a 'frames(ledCount, fps)' generator")
+  parser.add_argument('--led-count', action='store', type=int, required=True, help='number of leds on the strip')
+  parser.add_argument('--fps', action='store', type=float, default=25, help='frames per second (default: 25)')
+  parser.add_argument('--format', action='store', choices=FORMATS.keys(), default='color32', help='frame format (default: color32)')
+  parser.add_argument('-o', '--output', action='store', required=True, help='frame sequence file to write')
+  args=parser.parse_args()
+
+  _start=time.time()
+  if args.image:
+    frames=imageFrames(args.image, args.led_count)
+  else:
+    frames=scriptFrames(args.script, args.led_count, args.fps)
+  with FrameSequenceWriter(args.output, args.led_count, args.fps, FORMATS[args.format]) as writer:
+    for frame in frames:
+      writer.write(frame)
+  print(f"{args.output}: {writer.frameCount} frames of {args.led_count} leds at {args.fps} fps " \
+        f"({writer.frameCount / args.fps:.1f} seconds) compiled in {time.time() - _start:.2f} seconds")
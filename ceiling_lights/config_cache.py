@@ -0,0 +1,349 @@
+"""
+This module contains the loader of the yaml config-file with a cache of the parsed and validated config.
+
+Importing PyYAML and parsing the config-file with its pure-python parser takes a good part of a second on a
+Raspberry PI Zero, while the wall switches are dead.  The config is therefore parsed and validated against the
+full schema once, and the result (with the defaults filled in) is pickled into a cache file next to the
+config-file ('lights.yaml' -> '.lights.yaml.cache').  The next start loads the cache instead:
+- if the modification time and size of the config-file didn't change, the cache is used right away;
+- otherwise the cache is still used if the SHA-256 hash of the file's content didn't change (a 'touch' or a
+  copy of the same file);
+The yaml module is only imported when the config-file really needs to be parsed.
+
+All the problems in a config-file are reported at once in a ConfigError, with the path to each bad value:
+  lights.yaml: lights[0] (Loft): 'gpio_pin' needs to be an integer between 2 and 26, not 40
+
+This module requires these modules:
+- hashlib, os and pickle modules from the Python standard library;
+- yaml module (only when the config-file needs to be parsed);
+- the behavior registry to check the behaviors and their parameters (also only when the config-file is parsed);
+"""
+
+import hashlib
+import os
+import pickle
+
+# Bump this when the format of the cache or the schema changes, so that old cache files get ignored:
+CACHE_VERSION=8
+
+
+class ConfigError(Exception):
+  """
+  Exception for a config-file that doesn't match the schema.  The 'errors' attribute has the list of all the problems.
+  """
+
+  def __init__(self, path: str, errors: list):
+    self.path=path
+    self.errors=errors
+    super().__init__(f"{path} has {len(errors)} error(s):\n  " + "\n  ".join(errors))
+
+
+def cachePath(path: str) -> str:
+  """ Return the path of the cache file for a config-file. """
+  _directory, _fileName=os.path.split(path)
+  return os.path.join(_directory, f".{_fileName}.cache")
+
+
+def _fileKey(path: str) -> tuple:
+  """ Return the key that tells if a config-file changed: its modification time and size. """
+  _stat=os.stat(path)
+  return (CACHE_VERSION, _stat.st_mtime_ns, _stat.st_size)
+
+
+def _fileHash(content: bytes) -> str:
+  """ Return the hash of the content of a config-file. """
+  return hashlib.sha256(content).hexdigest()
+
+
+def loadConfig(path: str) -> dict:
+  """ Return the validated config from a yaml config-file, from its cache if the file didn't change since it was
+  cached.  Raises a ConfigError if the config-file doesn't match the schema.
+  """
+  _key=_fileKey(path)
+  _cached=None
+  try:
+    with open(cachePath(path), "rb") as _file:
+      _cached=pickle.load(_file)
+    _cachedKey, _cachedHash, _config=_cached
+    if _cachedKey == _key:
+      return _config
+  except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError):
+    # No cache (yet) or a damaged one.  Parse the config-file then.
+    _cached=None
+  with open(path, "rb") as _file:
+    _content=_file.read()
+  _hash=_fileHash(_content)
+  if _cached is not None and _cached[1] == _hash and _cached[0][0] == CACHE_VERSION:
+    # The file was touched or copied but its content is the same:
+    saveCache(path, _key, _hash, _cached[2])
+    return _cached[2]
+  _config=parseConfig(_content, path)
+  saveCache(path, _key, _hash, _config)
+  return _config
+
+
+def parseConfig(content: bytes, path: str="config") -> dict:
+  """ Parse and validate the content of a yaml config-file.  Raises a ConfigError if it doesn't match the schema. """
+  import yaml
+  try:
+    # Use the C parser of libyaml when PyYAML was built with it (a lot faster than the pure-python parser):
+    _config=yaml.load(content, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
+  except yaml.YAMLError as exc:
+    raise ConfigError(path, [f"invalid yaml: {exc}"])
+  return validateConfig(_config, path)
+
+
+def saveCache(path: str, key: tuple, hash: str, config: dict):
+  """ Write the validated config into the cache file.  The cache is optional, so errors are ignored. """
+  _cachePath=cachePath(path)
+  _tmp=f"{_cachePath}.tmp"
+  try:
+    with open(_tmp, "wb") as _file:
+      pickle.dump((key, hash, config), _file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(_tmp, _cachePath)
+  except OSError:
+    pass
+
+
+#
+#----------------------------------
+# Schema
+#----------------------------------
+#
+
+class _Checker:
+  """
+  Helper that validates values, fills in the defaults and collects the errors with the path to each value.
+  """
+
+  def __init__(self):
+    self.errors=[]
+
+  def error(self, where: str, message: str):
+    self.errors.append(f"{where}: {message}" if where else message)
+
+  def section(self, value, where: str, keys: dict, required: bool=True) -> dict:
+    """ Check a mapping against its known keys: {key: (required, default)}.  Returns a copy with the defaults. """
+    if value is None and not required:
+      return None
+    if not isinstance(value, dict):
+      self.error(where, "needs to be a mapping")
+      return {}
+    _result={}
+    for _key in value:
+      if not _key in keys:
+        self.error(where, f"unknown setting '{_key}' (expecting one of: {', '.join(keys)})")
+    for _key, (_required, _default) in keys.items():
+      if _key in value and value[_key] is not None:
+        _result[_key]=value[_key]
+      elif _required:
+        self.error(where, f"'{_key}' is missing")
+      else:
+        _result[_key]=_default
+    return _result
+
+  def integer(self, section: dict, key: str, where: str, minimum: int=None, maximum: int=None):
+    """ Check that a setting is an integer within a range (None is allowed for optional settings). """
+    _value=section.get(key)
+    if _value is None:
+      return
+    if isinstance(_value, bool) or not isinstance(_value, int) or \
+       (minimum is not None and _value < minimum) or (maximum is not None and _value > maximum):
+      self.error(where, f"'{key}' needs to be an integer{self._range(minimum, maximum)}, not {_value!r}")
+
+  def number(self, section: dict, key: str, where: str, minimum: float=None, exclusive: bool=False):
+    """ Check that a setting is a number of at least (or more than) 'minimum'. """
+    _value=section.get(key)
+    if _value is None:
+      return
+    if isinstance(_value, bool) or not isinstance(_value, (int, float)) or \
+       (minimum is not None and (_value <= minimum if exclusive else _value < minimum)):
+      _range="" if minimum is None else f" {'more than' if exclusive else 'of at least'} {minimum}"
+      self.error(where, f"'{key}' needs to be a number{_range}, not {_value!r}")
+
+  def string(self, section: dict, key: str, where: str):
+    """ Check that a setting is a non-empty string. """
+    _value=section.get(key)
+    if _value is not None and (not isinstance(_value, str) or _value == ""):
+      self.error(where, f"'{key}' needs to be a non-empty string, not {_value!r}")
+
+  def boolean(self, section: dict, key: str, where: str):
+    """ Check that a setting is true or false. """
+    _value=section.get(key)
+    if _value is not None and not isinstance(_value, bool):
+      self.error(where, f"'{key}' needs to be true or false, not {_value!r}")
+
+  def items(self, section: dict, key: str, where: str) -> list:
+    """ Check that a setting is a list (None counts as an empty list). """
+    _value=section.get(key)
+    if _value is None:
+      section[key]=[]
+      return []
+    if not isinstance(_value, list):
+      self.error(where, f"'{key}' needs to be a list")
+      section[key]=[]
+      return []
+    return _value
+
+  @staticmethod
+  def _range(minimum, maximum) -> str:
+    if minimum is not None and maximum is not None:
+      return f" between {minimum} and {maximum}"
+    if minimum is not None:
+      return f" of at least {minimum}"
+    return ""
+
+
+def _checkBehavior(check: _Checker, light: dict, where: str):
+  """ Check that the behavior of a light is known and that its parameters match the schema of that behavior.
+  This imports the behavior, but only when the config-file gets parsed (not when the cache is used).
+  """
+  _name=light.get("behavior_module")
+  _parameters=light.get("behavior_parameters")
+  if not isinstance(_name, str) or not (_parameters is None or isinstance(_parameters, dict)):
+    # Already reported.
+    return
+  from behavior_registry import registry
+  if not registry.isKnown(_name):
+    check.error(where, f"'behavior_module' {_name!r} is not a known behavior ({', '.join(registry.names)})")
+    return
+  try:
+    registry.behaviorClass(_name).validateParameters(_parameters, _name)
+  except Exception as exc:
+    check.error(where, f"'behavior_parameters': {exc}")
+
+
+def validateConfig(config, path: str="config") -> dict:
+  """ Validate the parsed content of a config-file and return it with the defaults filled in.
+  Raises a ConfigError with all the problems if it doesn't match the schema.
+  """
+  _check=_Checker()
+  _config=_check.section(config, "", {"apiserver": (False, None),
+                                      "animation_cache": (False, None),
+                                      "state": (False, None),
+                                      "switch_scan": (False, None),
+                                      "lights": (True, None),
+                                      "scenes": (False, None)})
+  if _check.errors:
+    raise ConfigError(path, _check.errors)
+  # API server:
+  _apiServer=_check.section(_config["apiserver"], "apiserver", \
+                            {"name": (True, None), "port": (True, None), "advertise": (False, True)}, required=False)
+  if _apiServer is not None:
+    _check.string(_apiServer, "name", "apiserver")
+    _check.integer(_apiServer, "port", "apiserver", 1, 65535)
+    _check.boolean(_apiServer, "advertise", "apiserver")
+  _config["apiserver"]=_apiServer
+  # Animation cache:
+  _cache=_check.section(_config["animation_cache"], "animation_cache", \
+                        {"max_kilobytes": (False, None), "max_file_kilobytes": (False, None)}, required=False)
+  if _cache is not None:
+    _check.integer(_cache, "max_kilobytes", "animation_cache", 0)
+    _check.integer(_cache, "max_file_kilobytes", "animation_cache", 0)
+    # Only keep the settings that were set (the cache has its own defaults):
+    _cache={_key: _value for _key, _value in _cache.items() if _value is not None}
+  _config["animation_cache"]=_cache
+  # State store:
+  _state=_check.section(_config["state"], "state", {"file": (False, "lights.state"), \
+                                                    "fsync_seconds": (False, 5), \
+                                                    "restore_after_power_loss": (False, False)}, required=False)
+  if _state is not None:
+    _check.string(_state, "file", "state")
+    _check.number(_state, "fsync_seconds", "state", 0, exclusive=True)
+    _check.boolean(_state, "restore_after_power_loss", "state")
+  _config["state"]=_state
+  # Switch scanning:
+  _scan=_check.section(_config["switch_scan"], "switch_scan", {"hz": (False, 50), \
+                                                               "gpiomem": (False, "/dev/gpiomem")}, required=False)
+  if _scan is None:
+    _scan={"hz": 50, "gpiomem": "/dev/gpiomem"}
+  _check.number(_scan, "hz", "switch_scan", 0, exclusive=True)
+  _check.string(_scan, "gpiomem", "switch_scan")
+  _config["switch_scan"]=_scan
+  # Lights and their switches:
+  _lights=[]
+  _names=set()
+  _pins={}              # GPIO pin -> where it's used
+  for _index, _light in enumerate(_check.items(_config, "lights", "")):
+    _where=f"lights[{_index}]" + (f" ({_light.get('name')})" if isinstance(_light, dict) and _light.get("name") else "")
+    _light=_check.section(_light, _where, {"name": (True, None),
+                                           "gpio_pin": (True, None),
+                                           "led_count": (True, None),
+                                           "brightness": (True, None),
+                                           "behavior_module": (False, "Default"),
+                                           "behavior_parameters": (False, None),
+                                           "max_milliamps": (False, None),
+                                           "milliamps_per_channel": (False, None),
+                                           "switches": (False, None),
+                                           "switch_mode": (False, "toggle"),
+                                           "gestures": (False, False),
+                                           "gesture_window": (False, 0.6),
+                                           "gesture_behaviors": (False, None)})
+    _check.string(_light, "name", _where)
+    if _light.get("name") in _names:
+      _check.error(_where, f"there's more than 1 light with the name '{_light['name']}'")
+    _names.add(_light.get("name"))
+    _check.integer(_light, "gpio_pin", _where, 2, 26)
+    _check.integer(_light, "led_count", _where, 1)
+    _check.integer(_light, "brightness", _where, 1, 255)
+    _check.string(_light, "behavior_module", _where)
+    if _light.get("behavior_parameters") is not None and not isinstance(_light["behavior_parameters"], dict):
+      _check.error(_where, "'behavior_parameters' needs to be a mapping")
+    _checkBehavior(_check, _light, _where)
+    _check.number(_light, "max_milliamps", _where, 0, exclusive=True)
+    _channels=_check.section(_light.get("milliamps_per_channel"), _where + " milliamps_per_channel", \
+                             {"red": (False, None), "green": (False, None), "blue": (False, None), "white": (False, None)}, \
+                             required=False)
+    if _channels is not None:
+      for _channel in ("red", "green", "blue", "white"):
+        _check.number(_channels, _channel, _where + " milliamps_per_channel", 0)
+      _light["milliamps_per_channel"]={_key: _value for _key, _value in _channels.items() if _value is not None}
+    if not _light.get("switch_mode") in ("toggle", "xor", "master", "momentary"):
+      _check.error(_where, f"'switch_mode' needs to be toggle, xor, master or momentary, not {_light.get('switch_mode')!r}")
+    _check.boolean(_light, "gestures", _where)
+    _check.number(_light, "gesture_window", _where, 0, exclusive=True)
+    _behaviors=_light.get("gesture_behaviors")
+    if _behaviors is not None and (not isinstance(_behaviors, list) or len(_behaviors) == 0 or \
+                                   not all(isinstance(_name, str) and _name for _name in _behaviors)):
+      _check.error(_where, "'gesture_behaviors' needs to be a list of behavior names")
+    _usePin(_check, _pins, _light.get("gpio_pin"), _where)
+    _switches=[]
+    _switchNames=set()
+    for _switchIndex, _switch in enumerate(_check.items(_light, "switches", _where)):
+      _switchWhere=f"{_where} switches[{_switchIndex}]" + \
+                   (f" ({_switch.get('name')})" if isinstance(_switch, dict) and _switch.get("name") else "")
+      _switch=_check.section(_switch, _switchWhere, {"name": (True, None), "gpio_pin": (True, None)})
+      _check.string(_switch, "name", _switchWhere)
+      if _switch.get("name") in _switchNames:
+        _check.error(_switchWhere, f"there's more than 1 switch with the name '{_switch['name']}' on this light")
+      _switchNames.add(_switch.get("name"))
+      _check.integer(_switch, "gpio_pin", _switchWhere, 2, 26)
+      _usePin(_check, _pins, _switch.get("gpio_pin"), _switchWhere)
+      _switches.append(_switch)
+    _light["switches"]=_switches
+    _lights.append(_light)
+  if len(_lights) == 0 and not _check.errors:
+    _check.error("lights", "needs at least 1 light")
+  _config["lights"]=_lights
+  # Scenes (their lights are validated against the Light objects when the scenes are loaded):
+  _scenes=[]
+  for _index, _scene in enumerate(_check.items(_config, "scenes", "")):
+    _where=f"scenes[{_index}]"
+    _scene=_check.section(_scene, _where, {"name": (True, None), "lights": (True, None)})
+    _check.string(_scene, "name", _where)
+    _check.items(_scene, "lights", _where)
+    _scenes.append(_scene)
+  _config["scenes"]=_scenes
+  if _check.errors:
+    raise ConfigError(path, _check.errors)
+  return _config
+
+
+def _usePin(check: _Checker, pins: dict, pin, where: str):
+  """ Register the use of a GPIO pin and report it if it's already used by another light or switch. """
+  if not isinstance(pin, int):
+    return
+  if pin in pins:
+    check.error(where, f"GPIO pin {pin} is already used by {pins[pin]}")
+  else:
+    pins[pin]=where
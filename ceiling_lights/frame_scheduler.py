@@ -0,0 +1,154 @@
+"""
+This module contains the frame scheduler that drives the animations of the scheduled behavior modules.
+
+The Christmas, Fluid and Playback behaviors each run their animation loop in their own thread, which sleeps
+between frames.  The scheduled behaviors (see BehaviorModules.ScheduledModule) don't have a thread: they tell
+the scheduler when they want to render their next frame and 1 scheduler thread renders the frames of all the
+lights when they're due.  Turning such a light on or off never blocks and never starts or stops a thread.
+
+A behavior that is scheduled implements:
+  renderFrame() -> float: render and show the next frame and return the number of seconds until the frame after
+                          that (or None to stop being scheduled);
+
+Frames are scheduled at a fixed pace: a frame that took long to render doesn't delay the frames after it,
+unless the behavior falls behind, in which case the next frame is rendered right away (and counted as late).
+
+This module requires these modules:
+- heapq and threading modules from the Python standard library;
+"""
+
+import heapq
+import sys
+import threading
+from time import monotonic
+
+
+class FrameScheduler:
+  """
+  Class that renders the frames of the scheduled behaviors from a single thread.
+  """
+
+  def __init__(self):
+    """ Constructor. """
+    self._debug=False
+    self._queue=[]                # heap of (due time, sequence number, generation, behavior)
+    self._active={}               # behavior -> generation of its current schedule
+    self._generation=0
+    self._sequence=0              # keeps the heap from comparing behaviors when 2 frames are due at the same time
+    self._current=None            # the behavior that is rendering a frame right now
+    self._condition=threading.Condition()
+    self._thread=None
+    self._frames=0                # number of frames rendered
+    self._late=0                  # number of frames that were rendered later than they were due
+
+  @property
+  def debug(self) -> bool:
+    """ Return the debug-flag that is set for the scheduler. """
+    return self._debug
+
+  @debug.setter
+  def debug(self, flag: bool):
+    """ Set the debug level. """
+    self._debug=flag
+
+  @property
+  def stats(self) -> dict:
+    """ Return the number of scheduled behaviors and the number of frames that were rendered (and late). """
+    with self._condition:
+      return {"behaviors": len(self._active), "frames": self._frames, "late": self._late}
+
+  def log(self, *args, debug: bool=False):
+    """ Simple function to log messages to the console. """
+    _log=True
+    if debug and not self._debug:
+      _log=False
+    if _log:
+      # We don't want to log the message as a list between '()' if we only got 1 element in the argument list:
+      if len(args) == 1:
+        print(f"{type(self)}: {args[0]}")
+      else:
+        print(f"{type(self)}: {args}")
+      # We need to flush the stdout buffer in python for log statements to reach the Linux systemd journal:
+      sys.stdout.flush()
+
+  def isScheduled(self, behavior) -> bool:
+    """ Return True if the behavior is scheduled. """
+    with self._condition:
+      return behavior in self._active
+
+  def start(self, behavior, delay: float=0):
+    """ Schedule the first frame of a behavior (nothing changes if the behavior is scheduled already).
+
+    Arguments:
+      behavior: object with a renderFrame() method (see the module documentation);
+      delay (float): seconds until the first frame (default=0);
+    """
+    with self._condition:
+      if behavior in self._active:
+        return
+      self._generation+=1
+      self._active[behavior]=self._generation
+      self._push(monotonic() + delay, self._generation, behavior)
+      if self._thread is None:
+        self._thread=threading.Thread(target=self._run, name="FrameScheduler", daemon=True)
+        self._thread.start()
+      self._condition.notify()
+
+  def stop(self, behavior):
+    """ Stop rendering the frames of a behavior.  Waits for the frame that is being rendered (if any) to finish,
+    so the behavior can clean up the strip when this returns.
+    """
+    with self._condition:
+      self._active.pop(behavior, None)
+      while self._current is behavior and threading.current_thread() is not self._thread:
+        self._condition.wait()
+
+  def _push(self, due: float, generation: int, behavior):
+    """ Add a frame to the queue (the lock needs to be held). """
+    self._sequence+=1
+    heapq.heappush(self._queue, (due, self._sequence, generation, behavior))
+
+  def _run(self):
+    """ Render the frames when they're due and sleep until the next one otherwise. """
+    while True:
+      with self._condition:
+        while True:
+          if len(self._queue) == 0:
+            self._condition.wait()
+            continue
+          _due, _, _generation, behavior=self._queue[0]
+          if self._active.get(behavior) != _generation:
+            # The behavior was stopped (and maybe started again) since this frame was scheduled:
+            heapq.heappop(self._queue)
+            continue
+          _wait=_due - monotonic()
+          if _wait > 0:
+            # A behavior that starts in the meantime may need a frame before this one:
+            self._condition.wait(_wait)
+            continue
+          heapq.heappop(self._queue)
+          self._current=behavior
+          break
+      try:
+        _delay=behavior.renderFrame()
+      except Exception as exc:
+        self.log(f"{behavior} failed to render a frame: {exc}")
+        _delay=None
+      with self._condition:
+        self._current=None
+        self._frames+=1
+        if _delay is not None and self._active.get(behavior) == _generation:
+          _next=_due + _delay
+          _now=monotonic()
+          if _next < _now:
+            # Don't try to catch up by rushing through the next frames:
+            self._late+=1
+            _next=_now
+          self._push(_next, _generation, behavior)
+        elif self._active.get(behavior) == _generation:
+          del self._active[behavior]
+        self._condition.notify_all()
+
+
+# The scheduler that drives all the scheduled behaviors of the app:
+scheduler=FrameScheduler()
@@ -0,0 +1,208 @@
+"""
+This module contains the binary file format for precompiled sequences of led frames.
+
+Effects that are too expensive to compute on the Raspberry PI (images, animated GIFs, scripted effects) are
+compiled offline into a frame sequence file with the compile_effect.py tool.  The PlaybackModule behavior
+memory-maps the file and copies the frames straight into the strip's buffer, so even sequences of several
+minutes play with a constant (and small) amount of memory.
+
+File layout (all values little-endian):
+  header (32 bytes):
+    magic        4 bytes   b"LEDS"
+    version      uint8     1
+    format       uint8     FORMAT_COLOR32 (0) or FORMAT_GRBW (1)
+    reserved     uint16
+    ledCount     uint32    number of leds in each frame
+    frameCount   uint32    number of frames in the file
+    fps          float32   frames per second to play the sequence at
+    reserved     12 bytes
+  frames:
+    frameCount * ledCount * 4 bytes
+    - FORMAT_COLOR32: 1 uint32 per led, the value of the rpi_ws281x Color() function (white, red, green, blue);
+    - FORMAT_GRBW: 4 bytes per led in the order that SK6812 GRBW strips receive them (green, red, blue, white);
+
+Classes in this module:
+- 'FrameSequenceWriter': write a frame sequence file;
+- 'FrameSequence': memory-mapped reader of a frame sequence file;
+
+This module requires these modules:
+- mmap and struct modules from the Python standard library;
+- framebuffer module for the frame format;
+"""
+
+import mmap
+import struct
+from framebuffer import LED_TYPECODE, LED_BYTES, newFrame
+
+MAGIC=b"LEDS"
+VERSION=1
+FORMAT_COLOR32=0
+FORMAT_GRBW=1
+FORMATS={"color32": FORMAT_COLOR32, "grbw": FORMAT_GRBW}
+# magic, version, format, reserved, ledCount, frameCount, fps, 12 reserved bytes:
+HEADER=struct.Struct("<4sBBHIIf12x")
+
+
+class FrameSequenceWriter:
+  """
+  Class to write frames into a new frame sequence file.
+  Use it as a context manager or call close() to write the final frame count into the header.
+  """
+
+  def __init__(self, path: str, ledCount: int, fps: float, format: int=FORMAT_COLOR32):
+    """ Constructor creating the file.
+
+    Arguments:
+      path (str): the file to create (an existing file gets overwritten);
+      ledCount (int): the number of leds in each frame;
+      fps (float): the number of frames per second to play the sequence at;
+      format (int): FORMAT_COLOR32 (default) or FORMAT_GRBW;
+    """
+    if not (ledCount > 0): raise Exception("A frame sequence needs at least 1 LED!")
+    if not (fps > 0): raise Exception("A frame sequence needs a positive frame rate!")
+    if not format in FORMATS.values(): raise Exception(f"Unknown frame sequence format {format}!")
+    if struct.pack("=I", 1) != struct.pack("<I", 1):
+      raise Exception("Frame sequences can only be written on a platform with little-endian 32-bit ints!")
+    self._path=path
+    self._ledCount=ledCount
+    self._fps=fps
+    self._format=format
+    self._frameCount=0
+    self._file=open(path, "wb")
+    self._file.write(HEADER.pack(MAGIC, VERSION, format, 0, ledCount, 0, fps))
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+  @property
+  def frameCount(self) -> int:
+    """ Return the number of frames written so far. """
+    return self._frameCount
+
+  def write(self, frame):
+    """ Append a frame of 'ledCount' colors.
+    The frame is a list or array of rpi_ws281x Color() values, or the bytes of such an array.
+    """
+    _frame=newFrame(0)
+    if isinstance(frame, (bytes, bytearray, memoryview)):
+      _frame.frombytes(frame)
+    else:
+      _frame.extend(frame)
+    if len(_frame) != self._ledCount: raise Exception(f"A frame needs {self._ledCount} leds, not {len(_frame)}!")
+    if self._format == FORMAT_GRBW:
+      _frame=colorToGRBW(_frame)
+    self._file.write(_frame)
+    self._frameCount+=1
+
+  def close(self):
+    """ Write the frame count into the header and close the file. """
+    if self._file is None:
+      return
+    self._file.seek(0)
+    self._file.write(HEADER.pack(MAGIC, VERSION, self._format, 0, self._ledCount, self._frameCount, self._fps))
+    self._file.close()
+    self._file=None
+
+
+class FrameSequence:
+  """
+  Class to read the frames from a frame sequence file through a memory map.
+  Only the frames that are played are paged into memory (and can be paged out again by the kernel).
+  """
+
+  def __init__(self, path: str):
+    """ Constructor opening and memory-mapping the file.
+
+    Arguments:
+      path (str): the frame sequence file to open;
+    """
+    self._path=path
+    self._mmap=None
+    with open(path, "rb") as _file:
+      _header=_file.read(HEADER.size)
+      if len(_header) < HEADER.size: raise Exception(f"'{path}' is not a frame sequence file!")
+      _magic, _version, self._format, _, self._ledCount, self._frameCount, self._fps=HEADER.unpack(_header)
+      if _magic != MAGIC: raise Exception(f"'{path}' is not a frame sequence file!")
+      if _version != VERSION: raise Exception(f"'{path}' has unsupported frame sequence version {_version}!")
+      if not self._format in FORMATS.values(): raise Exception(f"'{path}' has unknown frame format {self._format}!")
+      _size=HEADER.size + self._frameCount * self._ledCount * LED_BYTES
+      # Copy-on-write mapping: the frames are writable buffers (which lets us memmove them into the strip
+      # without an extra copy) but nothing ever gets written back to the SD card:
+      self._mmap=mmap.mmap(_file.fileno(), _size, access=mmap.ACCESS_COPY)
+    self._frames=memoryview(self._mmap)[HEADER.size:]
+    if self._format == FORMAT_COLOR32:
+      self._frames=self._frames.cast(LED_TYPECODE)
+    else:
+      # GRBW frames are converted into this buffer while playing:
+      self._scratch=newFrame(self._ledCount)
+
+  def __del__(self):
+    """ Destructor releasing the memory map. """
+    self.close()
+
+  @property
+  def path(self) -> str:
+    """ Return the path of the frame sequence file. """
+    return self._path
+
+  @property
+  def ledCount(self) -> int:
+    """ Return the number of leds in each frame. """
+    return self._ledCount
+
+  @property
+  def frameCount(self) -> int:
+    """ Return the number of frames in the sequence. """
+    return self._frameCount
+
+  @property
+  def fps(self) -> float:
+    """ Return the number of frames per second to play the sequence at. """
+    return self._fps
+
+  def frame(self, index: int) -> memoryview:
+    """ Return the frame at this index as a memoryview of rpi_ws281x Color() values.
+    COLOR32 frames point straight into the memory map.  GRBW frames are converted into a buffer that gets
+    reused for the next frame.
+    """
+    if self._format == FORMAT_COLOR32:
+      _start=index * self._ledCount
+      return self._frames[_start:_start + self._ledCount]
+    _start=index * self._ledCount * LED_BYTES
+    grbwToColor(self._frames[_start:_start + self._ledCount * LED_BYTES], self._scratch)
+    return memoryview(self._scratch)
+
+  def close(self):
+    """ Release the memory map.  The sequence can no longer be used after this. """
+    if self._mmap is not None:
+      self._frames.release()
+      try:
+        self._mmap.close()
+      except BufferError:
+        # Somebody still holds a frame of this sequence.  The memory gets released with the last frame.
+        pass
+      self._mmap=None
+
+
+def colorToGRBW(frame) -> bytearray:
+  """ Return the frame of Color() values as packed GRBW bytes. """
+  # Color() values in little-endian memory are ordered: blue, green, red, white
+  _source=memoryview(frame).cast("B")
+  _target=bytearray(len(_source))
+  _target[0::4]=_source[1::4]     # green
+  _target[1::4]=_source[2::4]     # red
+  _target[2::4]=_source[0::4]     # blue
+  _target[3::4]=_source[3::4]     # white
+  return _target
+
+
+def grbwToColor(source, frame):
+  """ Convert packed GRBW bytes into the frame of Color() values (without allocating memory). """
+  _target=memoryview(frame).cast("B")
+  _target[1::4]=source[0::4]      # green
+  _target[2::4]=source[1::4]      # red
+  _target[0::4]=source[2::4]      # blue
+  _target[3::4]=source[3::4]      # white
@@ -0,0 +1,232 @@
+"""
+This module contains helpers to move whole frames of LED colors into the buffer of a ledstrip.
+
+A frame is a contiguous block of unsigned 32-bit color values (one per led, as generated by the
+rpi_ws281x Color() function), typically an 'array' or a memoryview on an array or a memory-mapped file.
+
+The rpi_ws281x PixelStrip class only lets us set the color of 1 led at a time, which costs a Python
+call and a SWIG call per led.  When running on the Raspberry PI with the real library, writeFrame() copies
+the whole frame straight into the led buffer of the strip's channel with a single memmove() instead.
+
+Frames of packed RGB or RGBW bytes (from the network or the API) are copied into the layout of the led buffer
+by copyPixels() and writePixels(), with 1 strided memoryview copy per color channel instead of a Color() per led.
+
+Effects that only change a few leds per frame use a FrameBuffer: it keeps a copy of the frame, remembers
+which leds changed and only writes the spans of changed leds into the strip's buffer, so a frame costs
+O(changed leds) instead of O(leds on the strip).
+
+This module requires these modules:
+- ctypes and array modules from the Python standard library;
+- ws module from the rpi_ws281x module (optional, for the fast path);
+"""
+
+import ctypes
+import sys
+from array import array
+from rpi_ws281x import ws
+
+# Type code of unsigned 32-bit integers in the array module (the size of a ws2811_led_t):
+LED_TYPECODE="I" if array("I").itemsize == 4 else "L"
+LED_BYTES=4
+# The offsets of the blue, green, red and white bytes in a led (a 32-bit 0xWWRRGGBB value in the native byte order):
+_BLUE, _GREEN, _RED, _WHITE=(0, 1, 2, 3) if sys.byteorder == "little" else (3, 2, 1, 0)
+
+
+def newFrame(ledCount: int, color: int=0) -> array:
+  """ Return a new frame for 'ledCount' leds, all set to the same color (default=0 -> off). """
+  return array(LED_TYPECODE, [color]) * ledCount
+
+
+def ledBufferAddress(strip) -> int:
+  """ Return the memory address of the led buffer of the strip's channel or None if we can't get to it.
+  This is only possible with the real rpi_ws281x library after the strip has been initialized (begin()).
+  """
+  _channel=getattr(strip, "_channel", None)
+  if _channel is None or not hasattr(ws, "ws2811_channel_t_leds_get"):
+    return None
+  # SWIG pointer objects convert to the address that they point to:
+  _address=int(ws.ws2811_channel_t_leds_get(_channel))
+  if _address == 0:
+    return None
+  return _address
+
+
+def readFrame(strip) -> memoryview:
+  """ Return the current content of the strip's led buffer as a memoryview of unsigned 32-bit color values.
+  With the real rpi_ws281x library this is a view straight on the buffer (nothing gets copied), so it's only
+  valid until the strip gets cleaned up.
+  """
+  _count=strip.numPixels()
+  _address=ledBufferAddress(strip)
+  if _address is not None:
+    return memoryview((ctypes.c_char * (_count * LED_BYTES)).from_address(_address)).cast("B").cast(LED_TYPECODE)
+  # Slow path: get the colors 1 led at a time (mock library or uninitialized strip):
+  return memoryview(array(LED_TYPECODE, [strip.getPixelColor(i) for i in range(_count)]))
+
+
+def writeFrame(strip, frame, start: int=0):
+  """ Copy a frame of colors into the led buffer of the strip, starting at led 'start'.
+  Leds that don't fit on the strip are ignored.  Call strip.show() to send the buffer to the leds.
+
+  Arguments:
+    strip: the rpi_ws281x PixelStrip object;
+    frame: array or memoryview of unsigned 32-bit color values;
+    start (int): index of the first led on the strip to write to (default=0);
+  """
+  _view=memoryview(frame)
+  _count=min(len(_view), strip.numPixels() - start)
+  if _count <= 0:
+    return
+  if _count < len(_view):
+    _view=_view[:_count]
+  _address=ledBufferAddress(strip)
+  if _address is not None:
+    # Fast path: copy the whole frame at once.
+    # Read-only buffers (like frames in a read-only memory-mapped file) need to be copied into a bytes object first:
+    if _view.readonly:
+      _source=_view.tobytes()
+    else:
+      _source=(ctypes.c_char * _view.nbytes).from_buffer(_view)
+    ctypes.memmove(_address + start * LED_BYTES, _source, _view.nbytes)
+  else:
+    # Slow path: set 1 led at a time (mock library or uninitialized strip):
+    for i in range(_count):
+      strip.setPixelColor(start + i, _view[i])
+
+
+def copyPixels(frame, data, channels: int=3, start: int=0) -> int:
+  """ Copy packed pixels into a frame, starting at led 'start', and return the number of leds that were copied.
+  Pixels that don't fit in the frame are ignored.  RGB pixels turn the white led off.
+
+  Arguments:
+    frame: writable array, bytearray or memoryview of the frame (in the layout of the led buffer);
+    data: bytes-like object with 3 (red, green, blue) or 4 (red, green, blue, white) bytes per pixel;
+    channels (int): the number of bytes per pixel: 3 or 4 (default=3);
+    start (int): index of the first led in the frame to copy to (default=0);
+  """
+  if not channels in (3, 4): raise Exception("A pixel needs 3 (RGB) or 4 (RGBW) channels!")
+  _frame=memoryview(frame).cast("B")
+  _data=memoryview(data).cast("B")
+  _count=min(len(_data) // channels, len(_frame) // LED_BYTES - start)
+  if _count <= 0:
+    return 0
+  _start=start * LED_BYTES
+  _end=_start + _count * LED_BYTES
+  _data=_data[:_count * channels]
+  _frame[_start + _RED:_end:LED_BYTES]=_data[0::channels]
+  _frame[_start + _GREEN:_end:LED_BYTES]=_data[1::channels]
+  _frame[_start + _BLUE:_end:LED_BYTES]=_data[2::channels]
+  _frame[_start + _WHITE:_end:LED_BYTES]=_data[3::channels] if channels == 4 else bytes(_count)
+  return _count
+
+
+def writePixels(strip, data, channels: int=3, start: int=0):
+  """ Copy packed pixels into the led buffer of the strip, starting at led 'start'.
+  Leds that don't fit on the strip are ignored.  Call strip.show() to send the buffer to the leds.
+
+  Arguments:
+    strip: the rpi_ws281x PixelStrip object;
+    data: bytes-like object with 3 (red, green, blue) or 4 (red, green, blue, white) bytes per pixel;
+    channels (int): the number of bytes per pixel: 3 or 4 (default=3);
+    start (int): index of the first led on the strip to write to (default=0);
+  """
+  if ledBufferAddress(strip) is not None:
+    # Fast path: copy the pixels straight into the led buffer:
+    copyPixels(readFrame(strip), data, channels, start)
+    return
+  # Slow path (mock library or uninitialized strip):
+  _frame=newFrame(max(0, min(len(data) // channels, strip.numPixels() - start)))
+  copyPixels(_frame, data, channels)
+  writeFrame(strip, _frame, start)
+
+
+class FrameBuffer:
+  """
+  Class for a frame that remembers which leds changed since it was last written into a strip.
+  """
+  # Spans of changed leds that are this close together are written as 1 span (1 memmove instead of 2):
+  MERGE_GAP=8
+
+  def __init__(self, ledCount: int):
+    """ Constructor.  All the leds are off and changed (the first flush() writes the whole frame).
+
+    Arguments:
+      ledCount (int): the number of leds in the frame;
+    """
+    self._frame=newFrame(ledCount)
+    self._view=memoryview(self._frame)
+    self._dirty=set()             # leds that changed since the last flush()
+    self._all=True                # all the leds need to be written
+    self._frames=0                # number of flushes that wrote anything
+    self._pixels=0                # number of leds written
+    self._lastPixels=0            # number of leds written by the last flush
+
+  @property
+  def ledCount(self) -> int:
+    """ Return the number of leds in the frame. """
+    return len(self._frame)
+
+  @property
+  def stats(self) -> dict:
+    """ Return the number of frames and leds that were written, and the leds written per frame. """
+    return {"frames": self._frames,
+            "pixels": self._pixels,
+            "lastFrame": self._lastPixels,
+            "pixelsPerFrame": self._pixels / self._frames if self._frames > 0 else 0
+           }
+
+  def getPixel(self, index: int) -> int:
+    """ Return the color of a led. """
+    return self._frame[index]
+
+  def setPixel(self, index: int, color: int):
+    """ Set the color of a led.  It's only marked as changed if the color is different. """
+    if self._frame[index] != color:
+      self._frame[index]=color
+      self._dirty.add(index)
+
+  def write(self, frame, start: int=0):
+    """ Copy a frame (or part of it) into the buffer and mark the leds as changed.
+
+    Arguments:
+      frame: array or memoryview of unsigned 32-bit color values;
+      start (int): index of the first led to write to (default=0);
+    """
+    _view=memoryview(frame)[:max(0, len(self._frame) - start)]
+    self._view[start:start + len(_view)]=_view
+    if start == 0 and len(_view) == len(self._frame):
+      self._all=True
+    else:
+      self._dirty.update(range(start, start + len(_view)))
+
+  def invalidate(self):
+    """ Mark all the leds as changed (when something else wrote into the strip's buffer). """
+    self._all=True
+
+  def spans(self) -> list:
+    """ Return the changed leds as a sorted list of (start, end) spans. """
+    if self._all:
+      return [(0, len(self._frame))]
+    _spans=[]
+    for _index in sorted(self._dirty):
+      if len(_spans) > 0 and _index - _spans[-1][1] <= self.MERGE_GAP:
+        _spans[-1][1]=_index + 1
+      else:
+        _spans.append([_index, _index + 1])
+    return [(_start, _end) for _start, _end in _spans]
+
+  def flush(self, strip) -> int:
+    """ Write the spans of changed leds into the strip's buffer and return the number of leds written.
+    Call strip.show() to send the buffer to the leds.
+    """
+    _written=0
+    for _start, _end in self.spans():
+      writeFrame(strip, self._view[_start:_end], _start)
+      _written+=_end - _start
+    self._dirty.clear()
+    self._all=False
+    self._lastPixels=_written
+    if _written > 0:
+      self._frames+=1
+      self._pixels+=_written
+    return _written
@@ -0,0 +1,205 @@
+"""
+This module contains the gesture recognizer for the wall switches.
+
+A wall switch only has 2 positions but it can still do more than turning a light on and off.  The flips of the
+switches of a light are counted while they follow each other within a short window (600 ms by default):
+- the 1st flip is a normal flip (toggle the light);
+- a 2nd flip within the window is a 'double flip' (cycle through the scenes or behaviors of the light);
+- every further flip within the window is part of a 'back and forth' (dim the light a step);
+The gesture of a flip is known the moment the flip is seen.  A normal flip is never held back to find out if a
+2nd flip follows, so the gestures don't slow down the common case.
+
+The window is closed by a timer on a timer wheel instead of a sleeping thread per switch.  The wheel's thread
+only wakes up on the ticks of the wheel while there are timers on it and sleeps until the next timer gets
+scheduled otherwise.
+
+Classes in this module:
+- 'TimerWheel': a hashed timer wheel that calls a function when a timer expires;
+- 'GestureRecognizer': counts the flips of the switches of 1 light and names the gesture of each flip;
+
+This module requires these modules:
+- threading module for the thread of the timer wheel;
+"""
+
+import sys
+import threading
+from math import ceil
+from time import monotonic
+
+# The gestures:
+FLIP="flip"
+DOUBLE_FLIP="double flip"
+BACK_AND_FORTH="back and forth"
+
+
+class TimerWheel:
+  """
+  Class for a hashed timer wheel: timers are kept in the slot of the tick that they expire on, so scheduling and
+  cancelling a timer doesn't depend on the number of timers on the wheel.
+  """
+
+  def __init__(self, tick: float=0.01, slots: int=128):
+    """ Constructor.
+
+    Arguments:
+      tick (float): the resolution of the wheel in seconds (default=0.01);
+      slots (int): the number of slots on the wheel (default=128);
+    """
+    if not (tick > 0): raise Exception("The tick of a timer wheel needs to be more than 0 seconds!")
+    if not (slots > 0): raise Exception("A timer wheel needs at least 1 slot!")
+    self._debug=False
+    self._tick=tick
+    self._slots=[[] for _ in range(slots)]
+    self._timers=0                # number of timers on the wheel
+    self._start=monotonic()
+    self._current=0               # the last tick that was processed
+    self._condition=threading.Condition()
+    self._thread=None
+
+  @property
+  def debug(self) -> bool:
+    """ Return the debug-flag that is set for the wheel. """
+    return self._debug
+
+  @debug.setter
+  def debug(self, flag: bool):
+    """ Set the debug level. """
+    self._debug=flag
+
+  def log(self, *args, debug: bool=False):
+    """ Simple function to log messages to the console. """
+    _log=True
+    if debug and not self._debug:
+      _log=False
+    if _log:
+      # We don't want to log the message as a list between '()' if we only got 1 element in the argument list:
+      if len(args) == 1:
+        print(f"{type(self)}: {args[0]}")
+      else:
+        print(f"{type(self)}: {args}")
+      # We need to flush the stdout buffer in python for log statements to reach the Linux systemd journal:
+      sys.stdout.flush()
+
+  def _now(self) -> int:
+    """ Return the current tick. """
+    return int((monotonic() - self._start) / self._tick)
+
+  def schedule(self, delay: float, callback) -> list:
+    """ Call a function after a delay (rounded up to the next tick) and return the timer to cancel it with.
+    The function is called from the thread of the wheel and should not take long.
+
+    Arguments:
+      delay (float): seconds from now;
+      callback: function without arguments;
+    """
+    with self._condition:
+      if self._timers == 0:
+        # The wheel was idle.  Don't catch up on the ticks that went by while there was nothing to do:
+        self._current=self._now()
+      _timer=[self._now() + max(1, ceil(delay / self._tick)), callback]
+      self._slots[_timer[0] % len(self._slots)].append(_timer)
+      self._timers+=1
+      if self._thread is None:
+        self._thread=threading.Thread(target=self._run, name="TimerWheel", daemon=True)
+        self._thread.start()
+      self._condition.notify()
+    return _timer
+
+  def cancel(self, timer: list):
+    """ Cancel a timer that hasn't expired yet (cancelling an expired timer does nothing). """
+    with self._condition:
+      _slot=self._slots[timer[0] % len(self._slots)]
+      if timer in _slot:
+        _slot.remove(timer)
+        self._timers-=1
+
+  def _run(self):
+    """ Process the ticks of the wheel while there are timers and wait for a new timer otherwise. """
+    while True:
+      _expired=[]
+      with self._condition:
+        while self._timers == 0:
+          self._condition.wait()
+        _now=self._now()
+        while self._current < _now and len(_expired) < self._timers:
+          self._current+=1
+          _slot=self._slots[self._current % len(self._slots)]
+          if len(_slot) > 0:
+            # The slot also holds the timers of later turns of the wheel:
+            _expired.extend([_timer for _timer in _slot if _timer[0] <= self._current])
+            _slot[:]=[_timer for _timer in _slot if _timer[0] > self._current]
+        self._timers-=len(_expired)
+        if self._current < _now:
+          # Nothing left on the wheel.  Skip the remaining ticks:
+          self._current=_now
+        if len(_expired) == 0:
+          self._condition.wait(self._start + (self._current + 1) * self._tick - monotonic())
+      for _timer in _expired:
+        try:
+          _timer[1]()
+        except Exception as exc:
+          self.log(f"timer failed: {exc}")
+
+
+# The timer wheel that is shared by all the gesture recognizers of the app:
+wheel=TimerWheel()
+
+
+class GestureRecognizer:
+  """
+  Class that counts the flips of the switches of a light and names the gesture of each flip.
+  """
+
+  def __init__(self, window: float=0.6, timers: TimerWheel=None):
+    """ Constructor.
+
+    Arguments:
+      window (float): the maximum number of seconds between 2 flips of the same gesture (default=0.6);
+      timers (TimerWheel): the timer wheel that closes the window (default=the shared wheel of this module);
+    """
+    if not (window > 0): raise Exception("The gesture window needs to be more than 0 seconds!")
+    self._window=window
+    self._timers=timers if timers is not None else wheel
+    self._flips=0                 # the number of flips in the current gesture
+    self._timer=None              # the timer that ends the current gesture
+    self._lock=threading.Lock()
+
+  @property
+  def window(self) -> float:
+    """ Return the maximum number of seconds between 2 flips of the same gesture. """
+    return self._window
+
+  @window.setter
+  def window(self, value: float):
+    """ Set the maximum number of seconds between 2 flips of the same gesture. """
+    if not (value > 0): raise Exception("The gesture window needs to be more than 0 seconds!")
+    self._window=value
+
+  def flip(self, timestamp: float=None) -> str:
+    """ Register a flip of a switch and return its gesture (FLIP, DOUBLE_FLIP or BACK_AND_FORTH).
+
+    Arguments:
+      timestamp (float): the time.monotonic() time of the flip (default=now);
+    """
+    if timestamp is None:
+      timestamp=monotonic()
+    with self._lock:
+      if self._timer is not None:
+        self._timers.cancel(self._timer)
+      self._flips+=1
+      _flips=self._flips
+      # The window starts at the flip itself, not at the moment that we got to see it:
+      self._timer=self._timers.schedule(self._window - (monotonic() - timestamp), lambda: self._end(_flips))
+    if _flips == 1:
+      return FLIP
+    if _flips == 2:
+      return DOUBLE_FLIP
+    return BACK_AND_FORTH
+
+  def _end(self, flips: int):
+    """ The window after the last flip closed.  The next flip starts a new gesture. """
+    with self._lock:
+      # Another flip may have come in while the timer of the previous one was expiring:
+      if self._flips == flips:
+        self._flips=0
+        self._timer=None
@@ -7,12 +7,16 @@ This module contains the classes for both the 'Light' and 'Switch' objects:
 
 This module requires these modules:
 - Raspberry PI GPIO class from the RPi module;
+- the behavior registry to look up (and import) the behavior modules;
+- the strip manager that owns the ledstrips;
 """
 
-import BehaviorModules
+from behavior_registry import registry
+from power_limiter import PowerLimiter
+from strip_manager import strips
 import sys
 from RPi import GPIO
-from time import sleep
+from time import monotonic
 
 
 class Light:
@@ -21,6 +25,8 @@ class Light:
   Data going through that I/O port and power supplied externally (because it's too much for the PI
   to power them if there are too many).
   """
+  # The ways that the switches of a light can control it (see switchMode):
+  SWITCH_MODES=("toggle", "xor", "master", "momentary")
 
   def __init__(self, name: str):
     """ Constructor, initializing members with default values. """
@@ -41,10 +47,18 @@ class Light:
       "ledChannel": 0,
       "stripGpioPin": 18,                  # RaspberryPI GPIO pin that is used to drive the LED strip;
       "strip": None,                       # Instance of the rpi_ws281x LED strip;
+      "powerLimiter": None,                # Optional PowerLimiter keeping the strip within its power budget;
+      "holdShow": False,                   # Keep new frames in the buffer until releaseShow() (batch updates);
+      "pendingShow": False,                # A new frame is waiting in the buffer to be shown;
       "lightState": False                  # Is the light "off" (false) or "on" (true);
     }
     self._behaviorModuleName="Default"     # Name of the module that has the code to turn the leds on/off
-    self._behaviorModule=BehaviorModules.DefaultModule(self._ledSettings)  # The actual BehaviorModule object
+    self._behaviorModules={}               # Cache of the BehaviorModule objects that were constructed for this light
+    self._behaviorModule=self._getBehaviorModule(self._behaviorModuleName)  # The actual BehaviorModule object
+    self._stateStore=None                  # Optional StateStore to save the state of the light in
+    self._gestures=None                    # Optional GestureRecognizer for the flips of the switches
+    self._switchMode="toggle"              # How the switches control the light (see switchMode)
+    self._switchOffset=False               # xor mode: the light state when an even number of switches is on
 
   def __del__(self):
     """ Destructor will turn off this light. """
@@ -143,6 +157,70 @@ class Light:
     if not ((value >= 2) and (value <= 26)): raise Exception("The RPi GPIO port needs to be between 2 and 26!")
     self._ledSettings["stripGpioPin"]=value
 
+  @property
+  def maxMilliamps(self) -> float:
+    """ Return the power budget of the LED strip in milliamps (None if there's no limit). """
+    if self._ledSettings["powerLimiter"] is None:
+      return None
+    return self._ledSettings["powerLimiter"].maxMilliamps
+
+  @maxMilliamps.setter
+  def maxMilliamps(self, value: float):
+    """ Set the power budget of the LED strip in milliamps.  The brightness gets lowered to stay within the budget.
+    Set to None to remove the limit.
+    """
+    if value is None:
+      self._ledSettings["powerLimiter"]=None
+    elif self._ledSettings["powerLimiter"] is None:
+      self._ledSettings["powerLimiter"]=PowerLimiter(value)
+    else:
+      self._ledSettings["powerLimiter"].maxMilliamps=value
+
+  @property
+  def powerLimiter(self) -> PowerLimiter:
+    """ Return the PowerLimiter of this light (None if there's no power budget). """
+    return self._ledSettings["powerLimiter"]
+
+  @property
+  def settings(self) -> dict:
+    """ Return the current settings of the light in the format of an update (see validateUpdate()). """
+    return {"state": self.state,
+            "brightness": self.ledBrightness,
+            "color": {
+              "red": self.redRGB,
+              "green": self.greenRGB,
+              "blue": self.blueRGB,
+              "white": self.whiteRGB
+            },
+            "behavior": self._behaviorModuleName,
+            "parameters": self.behaviorParameters
+           }
+
+  @property
+  def stateStore(self):
+    """ Return the StateStore that the state of this light is saved in (None if it's not saved). """
+    return self._stateStore
+
+  @stateStore.setter
+  def stateStore(self, store):
+    """ Set the StateStore to save the state of this light in after every change (None to stop saving). """
+    self._stateStore=store
+
+  @property
+  def gestures(self):
+    """ Return the GestureRecognizer for the flips of the switches of this light (None if gestures are off). """
+    return self._gestures
+
+  @gestures.setter
+  def gestures(self, recognizer):
+    """ Set the GestureRecognizer for the flips of the switches of this light (None to turn gestures off). """
+    self._gestures=recognizer
+
+  def _stateChanged(self):
+    """ Let the StateStore (if any) know that the light changed. """
+    if self._stateStore is not None:
+      self._stateStore.changed(self)
+
   @property
   def state(self) -> bool:
     """ Show if the light is currently on or off.  "True" means "On" and "False" means "Off". """
@@ -161,11 +239,9 @@ class Light:
   @property
   def behaviorModuleName(self):
     """ Return the name of the behavior module to run. """
-# ToDo: this method is for some dark reason not getting called and we're always getting the ledstrip name as response!!!
-#    return self._behaviorModuleName
-    return self._behaviorModule.name
+    return self._behaviorModuleName
   
-  @name.setter
+  @behaviorModuleName.setter
   def behaviorModuleName(self, value: str):
     """ Set the name for the behavior module to run. """
     # Do not change anything if the same behavior is selected.
@@ -177,18 +253,15 @@ class Light:
         self.Off()
       else:
         _ledsWereOn=False
-      # Probably not necessary to explicitly remove it, but we're dealing with hardware and need
-      # to make sure the object's finalizer is called and all hardware resources are released:
-      self._behaviorModule=None
-      # Now set the new behavior:
-      if value == "Christmas":
-#        self._behaviorModule=BehaviorModules.FluidModule(self._ledSettings)
-        self._behaviorModule=BehaviorModules.ChristmasModule(self._ledSettings)
-      elif value == "Fluid":
-        self._behaviorModule=BehaviorModules.FluidModule(self._ledSettings)
-      else:
-        # Set the default On/Off behavior:
-        self._behaviorModule=BehaviorModules.DefaultModule(self._ledSettings)
+      # The behaviors share the light's strip.  Let the animation thread of the current behavior finish its last
+      # frame so that it doesn't keep drawing once the new behavior turns the light on again:
+      self._behaviorModule.join(timeout=2)
+      # Now set the new behavior.
+      # Unknown behaviors fall back to the default On/Off behavior:
+      if not registry.isKnown(value):
+        self.log(f"Unknown behavior '{value}'!  Using '{registry.DEFAULT_BEHAVIOR}' instead.")
+        value=registry.DEFAULT_BEHAVIOR
+      self._behaviorModule=self._getBehaviorModule(value)
       self._behaviorModule.debug=self._debug
       self._behaviorModuleName=self._behaviorModule.name
       self.log(f"Behavior Module Name = {self._behaviorModuleName}", debug=True)
@@ -196,11 +269,79 @@ class Light:
       if _ledsWereOn:
         self.On()
 
+  @property
+  def behaviorParameters(self) -> dict:
+    """ Return the parameter values of the behavior module that is currently selected. """
+    return self._behaviorModule.parameterValues
+
+  @behaviorParameters.setter
+  def behaviorParameters(self, values: dict):
+    """ Set (some of) the parameters of the behavior module that is currently selected.
+    The behavior precompiles its animation with the new values, so a running animation picks them up right away.
+    """
+    self._behaviorModule.setParameters(values)
+
+  def _getBehaviorModule(self, name: str):
+    """ Return this light's instance of a behavior module, constructing it the first time it gets selected. """
+    if name not in self._behaviorModules:
+      # The registry only imports the module's code the first time any light selects the behavior:
+      self._behaviorModules[name]=registry.create(name, self._ledSettings)
+    return self._behaviorModules[name]
+
   @property
   def switches(self) -> list:
     """ Return a list of 0 or more Switch objects that have been mapped to this light. """
     return self._switches
 
+  @property
+  def switchMode(self) -> str:
+    """ Return how the switches control the light (see the setter). """
+    return self._switchMode
+
+  @switchMode.setter
+  def switchMode(self, value: str):
+    """ Set how the switches control the light:
+      "toggle":    every flip of any switch toggles the light (the default);
+      "xor":       3-way (and 4-way) wiring: the light follows the parity of the switch levels (on when an odd
+                   number of switches is on).  A change through the API becomes the new starting point;
+      "master":    the light follows the 1st switch.  The other switches toggle the light while the 1st is on;
+      "momentary": push buttons: pressing a button toggles the light and releasing it does nothing;
+    """
+    if not value in self.SWITCH_MODES: raise Exception(f"The switch mode needs to be 1 of {', '.join(self.SWITCH_MODES)}!")
+    self._switchMode=value
+
+  def switchState(self, flipped: list) -> bool:
+    """ Return the state that the light needs to be in after some of its switches flipped in the same scan.
+    All the switches are evaluated from the levels of that scan (see Switch.level), so switches that flip during
+    the same scan are handled together.
+
+    Arguments:
+      flipped (list): the Switch objects that flipped during the scan;
+    """
+    _state=self.state
+    if self._switchMode == "xor":
+      _parity=False
+      for switch in self._switches:
+        _parity^=switch.level
+      # Every flipped switch changed the parity once:
+      _previous=_parity ^ (len(flipped) % 2 == 1)
+      if _previous ^ self._switchOffset != _state:
+        # The light was changed through the API (or this is the 1st scan).  Continue from the current state:
+        self._switchOffset=_previous ^ _state
+      return _parity ^ self._switchOffset
+    if self._switchMode == "master":
+      _master=self._switches[0]
+      if _master in flipped:
+        return _master.level
+      if not _master.level:
+        return False
+      return _state ^ (len(flipped) % 2 == 1)
+    if self._switchMode == "momentary":
+      _presses=[switch for switch in flipped if switch.level]
+      return _state ^ (len(_presses) % 2 == 1)
+    # "toggle":
+    return _state ^ (len(flipped) % 2 == 1)
+
   def addSwitch(self, switch):
     """ Add a new Switch object that can control this light. """
     self._switches.append(switch)
@@ -224,17 +365,180 @@ class Light:
       # We need to flush the stdout buffer in python for log statements to reach the Linux systemd journal:
       sys.stdout.flush()
 
+  @staticmethod
+  def _checkRange(name: str, value, minimum: int, maximum: int) -> int:
+    """ Return the value as an integer or raise an exception if it's not a number between minimum and maximum. """
+    try:
+      value=int(value)
+    except (TypeError, ValueError):
+      raise Exception(f"The {name} value needs to be a number!")
+    if not ((value >= minimum) and (value <= maximum)): raise Exception(f"The {name} value needs to be between {minimum} and {maximum}!")
+    return value
+
+  @staticmethod
+  def _checkBool(name: str, value) -> bool:
+    """ Return the value as a boolean or raise an exception if it's not a boolean (or 0/1 or a string like 'off').
+    Truthiness is no good here: the string "false" would turn a light on.
+    """
+    if isinstance(value, bool):
+      return value
+    if isinstance(value, int) and value in (0, 1):
+      return value == 1
+    if isinstance(value, str):
+      if value.lower() in ("true", "yes", "y", "on", "1"):
+        return True
+      if value.lower() in ("false", "no", "n", "off", "0"):
+        return False
+    raise Exception(f"The {name} value needs to be true or false!")
+
+  def validateUpdate(self, update: dict) -> dict:
+    """ Validate an update for this light (as received through the API) without changing anything.
+    Returns the settings to pass to applyUpdate() or raises an exception if any of the values is invalid.
+    Values that are missing from the update are left unchanged.
+
+    Arguments:
+      update (dict): {
+                       "state": true,               # optional: turn the light on (true) or off (false);
+                       "toggle": false,             # optional: toggle the light on or off (if there's no "state");
+                       "behavior": "Christmas",
+                       "parameters": {"speed": 20},
+                       "brightness": 50,
+                       "color": {"red": 125, "green": 54, "blue": 34, "white": 128}
+                     }
+    """
+    _settings={}
+    if update.get("brightness") is not None:
+      _settings["ledBrightness"]=self._checkRange("brightness", update["brightness"], 1, 255)
+    _color=update.get("color") or {}
+    for _key, _setting in (("red", "redRGB"), ("green", "greenRGB"), ("blue", "blueRGB"), ("white", "whiteRGB")):
+      if _color.get(_key) is not None:
+        _settings[_setting]=self._checkRange(f"{_key} RGB", _color[_key], 0, 255)
+    if update.get("behavior") is not None:
+      if not registry.isKnown(update["behavior"]): raise Exception(f"Unknown behavior '{update['behavior']}'!")
+      _settings["behaviorModuleName"]=update["behavior"]
+    if update.get("parameters"):
+      _behavior=_settings.get("behaviorModuleName", self._behaviorModuleName)
+      _settings["behaviorParameters"]=registry.behaviorClass(_behavior).validateParameters(update["parameters"], _behavior)
+    if update.get("state") is not None:
+      _settings["state"]=self._checkBool("state", update["state"])
+    _settings["toggle"]=self._checkBool("toggle", update["toggle"]) if update.get("toggle") is not None else False
+    return _settings
+
+  def applyUpdate(self, settings: dict):
+    """ Apply the settings that were returned by validateUpdate().
+    The light is turned on or off if the settings have a state, toggled if requested, and otherwise turned on
+    (or cycled if it's on already) to apply the new values.
+    """
+    # The behavior needs to be set before its parameters:
+    for _setting in ("ledBrightness", "redRGB", "greenRGB", "blueRGB", "whiteRGB", "behaviorModuleName", "behaviorParameters"):
+      if _setting in settings:
+        setattr(self, _setting, settings[_setting])
+    if settings.get("state") is False:
+      self.Off()
+    elif settings.get("state") is None and settings.get("toggle"):
+      self.Toggle()
+    else:
+      self.Update()
+
+  def begin(self):
+    """ Initialize the ledstrip now instead of the first time that the light gets turned on. """
+    self._getBehaviorModule(registry.DEFAULT_BEHAVIOR)._initStrip()
+
+  def releaseStrip(self):
+    """ Turn the light off and release its ledstrip (DMA channel and GPIO pin). """
+    if self.state:
+      self.Off()
+    # The animation thread may still be writing its last frame into the strip:
+    self._behaviorModule.join(timeout=2)
+    if self._ledSettings["strip"] is not None:
+      strips.release(self._ledSettings["stripGpioPin"], self._ledSettings["ledChannel"])
+      self._ledSettings["strip"]=None
+
+  def reconfigureStrip(self, ledCount: int, gpioPin: int):
+    """ Change the hardware settings of the ledstrip.
+    The strip (its DMA channel and GPIO pin) is only released and set up again if the settings actually change.
+    The light is turned off while that happens and turned on again if it was on.
+    """
+    if ledCount == self.ledCount and gpioPin == self.stripGpioPin:
+      return
+    self.log(f"reconfiguring the strip: {ledCount} leds on GPIO pin {gpioPin}")
+    _ledsWereOn=self.state
+    self.releaseStrip()
+    self.ledCount=ledCount
+    self.stripGpioPin=gpioPin
+    # The precompiled animations depend on the number of leds:
+    for _module in self._behaviorModules.values():
+      _module.compile()
+    self.begin()
+    if _ledsWereOn:
+      self.On()
+
+  def applyScene(self, settings: dict, frame=None):
+    """ Apply the settings of a scene (see the scenes module).
+    Scenes with the Default behavior come with a pre-rendered frame that is copied straight into the strip's
+    buffer instead of being rendered again.  Scenes with other behaviors are applied like any other update.
+    """
+    if frame is None:
+      self.applyUpdate(settings)
+      return
+    # Stop a running animation before switching to the Default behavior (which doesn't render anything while off):
+    if self._behaviorModuleName != registry.DEFAULT_BEHAVIOR and self.state:
+      self.Off()
+    self.behaviorModuleName=registry.DEFAULT_BEHAVIOR
+    for _setting in ("ledBrightness", "redRGB", "greenRGB", "blueRGB", "whiteRGB"):
+      if _setting in settings:
+        setattr(self, _setting, settings[_setting])
+    self._behaviorModule.showFrame(frame, state=settings.get("state", True))
+    self._stateChanged()
+
+  def showPixels(self, data, channels: int=3):
+    """ Show a raw frame of pixels that was pushed to the light (see the '/light/<name>/frame' endpoint).
+    A running animation is stopped first.  The frame stays on the strip until the light gets another update.
+
+    Arguments:
+      data: bytes-like object with 3 (red, green, blue) or 4 (red, green, blue, white) bytes for each led;
+      channels (int): the number of bytes per led: 3 or 4 (default=3);
+    """
+    if not channels in (3, 4): raise Exception("A frame needs 3 (RGB) or 4 (RGBW) bytes per led!")
+    _size=self._ledSettings["ledCount"] * channels
+    if len(data) != _size:
+      raise Exception(f"A frame of {channels} bytes per led for {self._ledSettings['ledCount']} leds needs " \
+                      f"{_size} bytes, not {len(data)}!")
+    if self._behaviorModuleName != registry.DEFAULT_BEHAVIOR:
+      # Stop a running animation before switching to the Default behavior:
+      if self.state:
+        self.Off()
+      self.behaviorModuleName=registry.DEFAULT_BEHAVIOR
+    _wasOn=self.state
+    self._behaviorModule.showPixels(data, channels)
+    # Streams of frames only need to be saved when the light comes on:
+    if not _wasOn:
+      self._stateChanged()
+
+  def holdShow(self):
+    """ Keep the frames of this light in the strip's buffer instead of showing them, until releaseShow(). """
+    self._ledSettings["holdShow"]=True
+
+  def releaseShow(self):
+    """ Show the last frame that was held back by holdShow() (if any) and go back to showing frames right away. """
+    self._ledSettings["holdShow"]=False
+    if self._ledSettings["pendingShow"] and self._ledSettings["strip"] is not None:
+      self._ledSettings["pendingShow"]=False
+      self._ledSettings["strip"].show()
+
   def On(self):
     """ Turn the leds on. """
     self.log("On()")
     self.log(self._ledSettings, debug=True)
     self._behaviorModule.On()
+    self._stateChanged()
 
   def Off(self):
     """ Turn the leds off. """
     self.log("Off()")
     self.log(self._ledSettings, debug=True)
     self._behaviorModule.Off()
+    self._stateChanged()
 
   def Toggle(self):
     """ Toggle the light on or off. """
@@ -256,6 +560,37 @@ class Light:
       self.On()
 
 
+#
+#----------------------------------
+#
+class RenderTick:
+  """
+  Context manager to change a group of lights in the same frame:
+    with RenderTick(lights):
+      for light in lights:
+        light.applyUpdate(...)
+  The lights keep their new frames in their buffers until the end of the 'with' block.  The frames of all
+  the lights are then sent to their strips back-to-back.
+  """
+
+  def __init__(self, lights: list):
+    """ Constructor.
+
+    Arguments:
+      lights (list): the Light objects that change together;
+    """
+    self._lights=lights
+
+  def __enter__(self):
+    for _light in self._lights:
+      _light.holdShow()
+    return self
+
+  def __exit__(self, *args):
+    for _light in self._lights:
+      _light.releaseShow()
+
+
 #
 #----------------------------------
 #
@@ -274,6 +609,9 @@ class Switch:
     self._name=name
     self._gpioPin=0
     self._debug=True
+    self._debounce=0.1            # Number of seconds that a new level needs to hold before it counts as a flip
+    self._pendingSince=None       # When we first saw the level that is different from the state (or None)
+    self._flippedAt=None          # When the last flip happened (time.monotonic())
 
   def __del__(self):
     """ Destructor to release and clean up GPIO resources. """
@@ -282,8 +620,28 @@ class Switch:
   @property
   def state(self) -> bool:
     """ Return the actual current state of the switch from the Raspberry PI GPIO port. """
-    self._state=GPIO.input(self._gpioPin)
-    return self._state
+    return GPIO.input(self._gpioPin)
+
+  @property
+  def level(self) -> bool:
+    """ Return the (debounced) level of the switch as of the last scan (see hasChanged()). """
+    return bool(self._state)
+
+  @property
+  def debounce(self) -> float:
+    """ Return the number of seconds that a new level needs to hold before it counts as a flip. """
+    return self._debounce
+
+  @debounce.setter
+  def debounce(self, value: float):
+    """ Set the number of seconds that a new level needs to hold before it counts as a flip. """
+    if not (value >= 0): raise Exception("The debounce time of a switch can't be negative!")
+    self._debounce=value
+
+  @property
+  def flippedAt(self) -> float:
+    """ Return the time.monotonic() time of the last flip of the switch (None if it didn't flip yet). """
+    return self._flippedAt
 
   @property
   def name(self) -> str:
@@ -335,30 +693,51 @@ class Switch:
       # We need to flush the stdout buffer in python for log statements to reach the Linux systemd journal:
       sys.stdout.flush()
 
-  def hasChanged(self) -> bool:
-    """ Method to detect if the state of the switch has changed since last time we checked. """
-    oldState=self._state
-    ret=False
-    if oldState != self.state:
-      # Turns out we sometimes get false positives for some reason.
-      # It looks like voltage sometimes drops below the threshold value on longer wires from the
-      # RPi to the physical switch, triggering a false positive.  The RPi thinks the switch got triggered
-      # and then switches the light on or off.  It sees the correct state again during the next loop
-      # half a second later and then turns the light on or off again.
-      # The best fix would be to use better quality wires and better pull up resitors but the cheapest
-      # and easiest solution is to have the RPi check the status again after a short time and only decide
-      # if both checks come back with the same result.
-      sleep(0.1)
-      if oldState != self.state:
-        self.log("switch flipped", debug=True)
-        ret=True
-    return ret
+  def hasChanged(self, levels: int=None) -> bool:
+    """ Method to detect if the state of the switch has changed since last time we checked.
+
+    Arguments:
+      levels (int): the levels of GPIO pins 0-31 as a bit mask, read once for all the switches by the
+                    switch_bank module (default=None -> read the GPIO pin of this switch);
+    """
+    _level=self.state if levels is None else (levels >> self._gpioPin) & 1
+    if _level == self._state:
+      self._pendingSince=None
+      return False
+    # Turns out we sometimes get false positives for some reason.
+    # It looks like voltage sometimes drops below the threshold value on longer wires from the
+    # RPi to the physical switch, triggering a false positive.  The RPi thinks the switch got triggered
+    # and then switches the light on or off.  It sees the correct state again during the next loop
+    # half a second later and then turns the light on or off again.
+    # The best fix would be to use better quality wires and better pull up resitors but the cheapest
+    # and easiest solution is to only accept the new level once it held for the debounce time.
+    # We don't sleep on it: the level is checked again during the next scans, which keeps the other
+    # switches responsive.
+    _now=monotonic()
+    if self._pendingSince is None:
+      self._pendingSince=_now
+    if _now - self._pendingSince < self._debounce:
+      return False
+    self._state=_level
+    self._flippedAt=self._pendingSince
+    self._pendingSince=None
+    self.log("switch flipped", debug=True)
+    return True
 
   def init(self):
     """ Method to initialize the Raspberry PI hardware at GPIO level. """
     self.log("init hardware", debug=True)
     GPIO.setmode(GPIO.BCM)
     GPIO.setup(self._gpioPin, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
+    # Start from the level that the switch is in now.  Otherwise a switch that is on when the app starts would count
+    # as a flip during the first scan and toggle the light that was just restored:
+    self._state=self.state
+    self._pendingSince=None
+
+  def release(self):
+    """ Release the GPIO pin of this switch (when the switch is removed or moved to another pin). """
+    self.log("release hardware", debug=True)
+    GPIO.cleanup(self._gpioPin)
 
   def cleanUp():
     """ Static method to cleanup the GPIO ports that this app used on the RPi. """
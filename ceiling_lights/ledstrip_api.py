@@ -9,13 +9,18 @@ Classes in this module:
 - 'RESTEndpointView': a REST webservice endpoint url and a reference to the code that should get executed at
    that endpoint;
 
+The server advertises itself on the local network through mDNS/DNS-SD (service type '_ledstrips._tcp'), so that
+the mobile apps find it without a hard-coded IP address.
+
 This module requires these modules:
 - FLask and Response classes from the flask module;
 - threading module;
+- zeroconf module (optional, to advertise the server through mDNS: pip3 install zeroconf);
 """
 
 from flask import Flask, request, Response, render_template
 from flask.views import MethodView
+import socket
 import threading
 
 # Flask API and config keys:
@@ -28,6 +33,8 @@ class RESTserver:
 
   The web server is run in a separate thread to avoid it from blocking the main application thread.
   """
+  # The DNS-SD service type that the server is advertised as:
+  SERVICE_TYPE="_ledstrips._tcp.local."
 
   def __init__(self, name: str):
     """ Basic constructor for a new Light REST web server. """
@@ -38,10 +45,21 @@ class RESTserver:
     self._server=None
     self._serverThread=None
     self._hasEndpoints=False
+    self._advertise=True
+    self._serviceProperties={}
+    self._zeroconf=None
+    self._serviceInfo=None
 
   def __del__(self):
     """ Destructor will turn off the web server. """
     print("destroying API server: "+self._name)
+    if not self._zeroconf == None:
+      try:
+        self._zeroconf.unregister_service(self._serviceInfo)
+        self._zeroconf.close()
+      except Exception as exc:
+        # The event loop of zeroconf may be gone already when the app exits:
+        print(("Can't unregister the REST server from the network: {}").format(exc))
     if not self._server == None:
 # TODO: Need a clean way to stop the server like this:
 #       https://stackoverflow.com/questions/15562446/how-to-stop-flask-application-without-using-ctrl-c
@@ -75,13 +93,38 @@ class RESTserver:
     if value < 1 or value > 65535: raise Exception("The server port should be between 1 and 65535!")
     self._serverPort=value
   
+  @property
+  def advertise(self) -> bool:
+    """ Return True if the server gets advertised on the local network through mDNS when it starts (default). """
+    return self._advertise
+
+  @advertise.setter
+  def advertise(self, flag: bool):
+    """ Set the flag to advertise the server through mDNS. """
+    self._advertise=flag
+
+  @property
+  def serviceProperties(self) -> dict:
+    """ Return the extra properties that go in the TXT record of the mDNS service (like the names of the lights). """
+    return self._serviceProperties
+
+  @serviceProperties.setter
+  def serviceProperties(self, properties: dict):
+    """ Set the extra properties for the TXT record of the mDNS service (announced again if it's advertised already). """
+    _properties=dict(properties or {})
+    if _properties == self._serviceProperties:
+      return
+    self._serviceProperties=_properties
+    if not self._zeroconf == None:
+      threading.Thread(name=("{}_mDNS").format(self._name), target=self._update, daemon=True).start()
+
   def initialize(self):
     """ Initialize the RESTful web server and set the /light end point. """
     print(("initializing REST server {} on port {}").format(self._name, self._serverPort))
     self._server=Flask(self._name)
 
   def add_endpoint(self, endpoint=None, endpoint_name=None, allowedMethods=None, \
-                   getHandler=None, postHandler=None, htmlTemplateFile=None, htmlTemplateData=None):
+                   getHandler=None, postHandler=None, putHandler=None, htmlTemplateFile=None, htmlTemplateData=None):
     """ Add a url endpoint handler to the REST server.
     Arguments:
       endpoint: url endpoint (ex: `/`; `/light`);
@@ -90,6 +133,7 @@ class RESTserver:
                       This needs to be a tuple of strings.  Ex.: ['GET', 'POST',]
       getHandler: callback function to execute when the endpoint is triggered with the GET operation;
       postHandler: callback function to execute when the endpoint is triggered with the POST operation;
+      putHandler: callback function to execute when the endpoint is triggered with the PUT operation;
       htmlTemplateFile: optional HTML template file to render at this endpoint;
       htmlTemplateData: optional dictionary of data for the HTML template renderer to use;
     """
@@ -102,6 +146,7 @@ class RESTserver:
                               view_func=RESTEndpointView.as_view(("api_{}").format(endpoint_name), \
                                                                  getHandler=getHandler, \
                                                                  postHandler=postHandler, \
+                                                                 putHandler=putHandler, \
                                                                  htmlTemplateFile=htmlTemplateFile, \
                                                                  htmlTemplateData=htmlTemplateData, \
                                                                  debug=self._debug), \
@@ -140,6 +185,67 @@ class RESTserver:
                                    kwargs={'host': '0.0.0.0', 'port': self._serverPort})
     _serverThread.setDaemon(True)
     _serverThread.start()
+    if self._advertise:
+      # Announcing the service takes a second or 2 (mDNS probes the network first), so do it in the background:
+      threading.Thread(name=("{}_mDNS").format(self._name), target=self._register, daemon=True).start()
+
+  def _register(self):
+    """ Advertise the server on the local network through mDNS. """
+    try:
+      from zeroconf import Zeroconf, ServiceInfo
+      # ifaddr comes with zeroconf:
+      import ifaddr
+    except ImportError:
+      print("Not advertising the REST server on the network!  Install the zeroconf module to do that: pip3 install zeroconf")
+      return
+    try:
+      _host=socket.gethostname().split(".")[0]
+      # All the IPv4 addresses of the Raspberry PI, except for the loopback address:
+      _addresses=[_ip.ip for _adapter in ifaddr.get_adapters() for _ip in _adapter.ips \
+                  if isinstance(_ip.ip, str) and not _ip.ip.startswith("127.")]
+      _properties=self._txtProperties()
+      # The instance name needs to be unique on the network, so add the host name to it:
+      _info=ServiceInfo(self.SERVICE_TYPE, \
+                        ("{} on {}.{}").format(self._name, _host, self.SERVICE_TYPE), \
+                        port=self._serverPort, \
+                        properties=_properties, \
+                        server=("{}.local.").format(_host), \
+                        parsed_addresses=_addresses)
+      _zeroconf=Zeroconf()
+      _zeroconf.register_service(_info, allow_name_change=True)
+      self._serviceInfo=_info
+      self._zeroconf=_zeroconf
+      print(("REST server {} advertised as '{}' on {}").format(self._name, _info.name, ", ".join(_addresses)))
+    except Exception as exc:
+      # The server works without it.  The apps just need to know its address:
+      print(("Can't advertise the REST server on the network: {}").format(exc))
+      return
+    # The properties may have changed while the service was being registered:
+    if _properties != self._txtProperties():
+      self._update()
+
+  def _txtProperties(self) -> dict:
+    """ Return the properties for the TXT record of the mDNS service. """
+    _properties={"name": self._name, "path": "/lights"}
+    _properties.update(self._serviceProperties)
+    return _properties
+
+  def _update(self):
+    """ Announce the new properties of the advertised server on the local network. """
+    try:
+      from zeroconf import ServiceInfo
+      # Same service name and addresses as the registered service, only the TXT record changes:
+      _info=ServiceInfo(self.SERVICE_TYPE, \
+                        self._serviceInfo.name, \
+                        port=self._serverPort, \
+                        properties=self._txtProperties(), \
+                        server=self._serviceInfo.server, \
+                        parsed_addresses=self._serviceInfo.parsed_addresses())
+      self._zeroconf.update_service(_info)
+      self._serviceInfo=_info
+      print(("REST server {} announced again with {}").format(self._name, self._serviceProperties))
+    except Exception as exc:
+      print(("Can't update the REST server on the network: {}").format(exc))
 
 
 #
@@ -164,16 +270,19 @@ class RESTEndpointView(MethodView):
 #      return req(*args, **kwargs)
 #    return decorator
 
-  def __init__(self, getHandler=None, postHandler=None, htmlTemplateFile=None, htmlTemplateData=None, debug=False):
+  def __init__(self, getHandler=None, postHandler=None, putHandler=None, htmlTemplateFile=None, htmlTemplateData=None, \
+               debug=False):
     """ Store the function to execute when the endpoint gets triggered.
     Arguments:
       getHandler: callback function to execute when the GET operation is called (optional);
       postHandler: callback function to execute when the POST operation is called (optional);
+      putHandler: callback function to execute when the PUT operation is called (optional);
       htmlTemplateFile: HTML template file to render (optional);
       htmlTemplateData: data for the template to render (optional);
     """
     self._getHandler=getHandler
     self._postHandler=postHandler
+    self._putHandler=putHandler
     self._htmlTemplateFile=htmlTemplateFile
     self._htmlTemplateData=htmlTemplateData
     self._debug=debug
@@ -191,7 +300,8 @@ class RESTEndpointView(MethodView):
     print(("-> Number of arguments in call: {}").format(len(request.args)))
     for arg in request.args:
       print(("  request arg -> '{}': '{}'").format(arg, request.args[arg]))
-    if len(request.data) > 0:
+    # PUT bodies are raw frames that the handler reads from the request stream (reading them here would consume them):
+    if request.method != "PUT" and len(request.data) > 0:
       print("-> Body:")
       print(request.data)
     print(("-> Header count: {}").format(len(request.headers)))
@@ -233,3 +343,17 @@ class RESTEndpointView(MethodView):
       html=("<h1>Oops!  Nothing to render to HTML!</h1>")
     # Create a new flask.Response object and return that:
     return Response(html, status=200, headers={"content-type": "application/json"})
+
+  def put(self, **path_vars):
+    """ PUT request.  **path_vars is an optional dictionary with key/values from the url """
+    if self._debug:
+      print("in MyMethodView:PUT")
+      self.log(path_vars)
+    html=None
+    if callable(self._putHandler):
+      # Execute  the handler function if one was provided:
+      html=self._putHandler(path_vars, request)
+    if html is None:
+      html=("<h1>Oops!  Nothing to render to HTML!</h1>")
+    # Create a new flask.Response object and return that:
+    return Response(html, status=200, headers={"content-type": "application/json"})
@@ -9,16 +9,25 @@
 # and suffering from quite a significant voltage drop)                                                      #
 # Light switch 2 connected to pin 18 (GPIO 24) and pin 17 (3v3) to give it power through a 12kOhm resistor  #
 #***********************************************************************************************************#
-from ledstrip import Light, Switch
-from ledstrip_api import RESTserver
-from BehaviorModules import BehaviorModule
+# Only import what the switches need to come up.  Flask (for the REST API server) and the scenes are imported in
+# the background once the switches are running (see startServices()), which takes seconds on a Pi Zero:
+from time import monotonic
+STARTED=monotonic()
+from ledstrip import Light, Switch, RenderTick
+from state_store import StateStore
+from config_cache import loadConfig, ConfigError
+from behavior_registry import registry
+from animation_cache import cache
+from strip_manager import strips
+from frame_scheduler import scheduler
+from gestures import GestureRecognizer, FLIP, DOUBLE_FLIP, BACK_AND_FORTH
+from switch_bank import SwitchBank
 from time import sleep
-from flask import request
-import yaml
 import sys
 import os
 import threading
 import json
+import signal
 
 # See if the DEBUG environment variable was set (false by default):
 DEBUG=os.getenv('DEBUG', False)
@@ -26,6 +35,15 @@ if type(DEBUG) == str:
   DEBUG=DEBUG.lower() in ('true', 'yes', 'y', '1')
 #ToDo: remove Temp override
 DEBUG=True
+# The config-file can be overridden through the LIGHTS_CONFIG environment variable (lights.yaml by default):
+CONFIG_FILE=os.getenv('LIGHTS_CONFIG', 'lights.yaml')
+# Number of seconds between 2 checks of the config-file (the switches are scanned at 'switch_scan: hz'):
+CONFIG_CHECK_SECONDS=0.5
+# The brightness steps of the 'back and forth' gesture (from bright to dim and then back to bright):
+DIM_LEVELS=[255, 191, 127, 63, 31, 15]
+# The behaviors that a double flip cycles through when the light isn't in any scene and has no 'gesture_behaviors' in
+# the config (Stream, AudioReactive and Playback are left out: they show nothing without an input source or a file):
+GESTURE_BEHAVIORS=["Default", "Christmas", "Fluid", "ColorWipe", "TheaterChase", "Rainbow", "RainbowCycle", "TheaterChaseRainbow", "Clock"]
 
 def log(*args, debug: bool=False):
   """ Simple function to log messages to the console. """
@@ -57,6 +75,11 @@ def apiGETHome(path_vars, request) -> str:
   return html
 
 
+def handleSIGTERM(signum, frame):
+  """ systemd stops the service with SIGTERM.  Handle it like Ctrl-C so that we shut down cleanly. """
+  raise KeyboardInterrupt()
+
+
 #def apiGETLights(host_url, uri, path_vars, parms) -> str:
 def apiGETLights(path_vars, request) -> str:
   """ Callback function for the GET operation at the '/lights' endpoint.
@@ -111,7 +134,13 @@ def apiGETLight(path_vars, request) -> str:
         "white": 1
       },
       "brightness": 255,
-      "behavior": "Default"
+      "behavior": "Default",
+      "parameters": {},
+      "power": {                      (only if the light has a 'max_milliamps' budget)
+        "milliamps": 2410,
+        "max-milliamps": 4000,
+        "limited-frames": 0
+      }
     },
     "switches": [
       {
@@ -140,27 +169,10 @@ def apiGETLight(path_vars, request) -> str:
   _self=request.host_url+request.full_path.strip("/").strip("?")
   _returnValue["self"]=_self
   # Go find the light:
-  _found=False
-  for light in lights:
-    if light.name == light_name:
-      _found=True
-      break
-  if _found:
+  light=findLight(light_name)
+  if light is not None:
     # We found the light.  Generate the payload to send back with the light's details:
-# ToDo: for some reason light.behaviorModuleName is always returning the ledstrip name instead of the behavior!!!
-    _returnValue["light"]={"name": light.name,
-                           "uri": request.host_url+f"light/{light.name}",
-                           "state": light.state,
-                           "led-count": light.ledCount,
-                           "color": {
-                             "red": light.redRGB,
-                             "green": light.greenRGB,
-                             "blue": light.blueRGB,
-                             "white": light.whiteRGB
-                           },
-                           "brightness": light.ledBrightness,
-                           "behavior": light._behaviorModule.name
-                          }
+    _returnValue["light"]=lightDetails(light, request)
     _switches=[]
     for switch in light.switches:
       _switches.append({"name": switch.name,
@@ -168,7 +180,7 @@ def apiGETLight(path_vars, request) -> str:
                         "state": switch._state
                        })
     _returnValue["switches"]=_switches
-    _returnValue["behaviors"]=BehaviorModule.knownBehaviors
+    _returnValue["behaviors"]=registry.names
   else:
     # We can't find this light!  Oops...
     _errors=[]
@@ -177,6 +189,35 @@ def apiGETLight(path_vars, request) -> str:
   return json.dumps(_returnValue)
 
 
+def findLight(light_name: str):
+  """ Return the Light object with this name or None if there's no such light. """
+  for light in lights:
+    if light.name == light_name:
+      return light
+  return None
+
+
+def lightDetails(light, request) -> dict:
+  """ Return the details of a light as they are returned by the API. """
+  _details={"name": light.name,
+            "uri": request.host_url+f"light/{light.name}",
+            "state": light.state,
+            "led-count": light.ledCount,
+            "color": {
+              "red": light.redRGB,
+              "green": light.greenRGB,
+              "blue": light.blueRGB,
+              "white": light.whiteRGB
+            },
+            "brightness": light.ledBrightness,
+            "behavior": light._behaviorModule.name,
+            "parameters": light.behaviorParameters
+           }
+  if light.powerLimiter is not None:
+    _details["power"]=light.powerLimiter.stats
+  return _details
+
+
 #def apiPOSTLight(host_url, uri, path_vars, parms) -> str:
 def apiPOSTLight(path_vars, request) -> str:
   """ Callback function for the POST operation at the '/light/<light_name>' endpoint.
@@ -192,10 +233,19 @@ def apiPOSTLight(path_vars, request) -> str:
       "green": 54,
       "blue": 34,
       "white": 128
+    },
+    "parameters": {
+      "speed": 20,
+      "direction": "backward"
     }
   }
+  All the fields are optional.  Values that are missing are left unchanged.  An optional "state" (true/false)
+  turns the light on or off instead of toggling it.
+  The optional "parameters" are applied to the behavior (after switching to it if the behavior changes).
+  Nothing gets changed if any of the values is invalid.
   """
   log(f"apiPOSTLight: {request.full_path}")
+  light_name=None
   for path_var in path_vars:
     log(f"apiPOSTLight: path variable = '{path_var}': '{path_vars[path_var]}'", debug=True)
     if path_var == "light_name":
@@ -204,76 +254,32 @@ def apiPOSTLight(path_vars, request) -> str:
     log(f"apiPOSTLight: argument = '{arg}': '{request.args[arg]}'", debug=True)
   # We're going to assume that we receive a JSON data payload if we receive anything.
   # We just ignore everything if it's not JSON.
-  if request.is_json:
-    log(f"apiPOSTLight: JSON payload -> {request.json}", debug=True)
   # We're also very flexible in the payload structure!  We try to parse some fields and don't care too much
   # if we don't find values in the spots that we expect them.
   # If we don't find any usefull data, then we just toggle the ledstrip on or off.
-  _action=request.json.get("action")
-  _toggle=request.json.get("toggle")
-  _brightness=request.json.get("brightness")
-  _redRGB=request.json.get("color").get("red")
-  _greenRGB=request.json.get("color").get("green")
-  _blueRGB=request.json.get("color").get("blue")
-  _whiteRGB=request.json.get("color").get("white")
-  _behaviorModuleName=request.json.get("behavior")
-  _ledCount=request.json.get("led-count")
+  _payload={}
+  if request.is_json:
+    log(f"apiPOSTLight: JSON payload -> {request.json}", debug=True)
+    if isinstance(request.json, dict):
+      _payload=request.json
+# ToDo: we probably don't want to override the ledCount for the strip ... or do we?
+#  _ledCount=_payload.get("led-count")
   _returnValue={}
   # Remove leading or trailing slashes and questionmarks.
   # In real life, this is removing the leading slash and trailing questionmark
   _self=request.host_url+request.full_path.strip("/").strip("?")
   _returnValue["self"]=_self
   # Go find the light:
-  _found=False
-  for light in lights:
-    if light.name == light_name:
-      _found=True
-      break
-  if _found:
-    # We found the light.  Generate the payload to send back with the light's details:
-# ToDo: we probably don't want to override the ledCount for the strip ... or do we?
-#    light.ledCount=_ledCount
-    light.ledBrightness=_brightness
-    light.redRGB=_redRGB
-    light.greenRGB=_greenRGB
-    light.blueRGB=_blueRGB
-    light.whiteRGB=_whiteRGB
-#    if light.behaviorModuleName != _behaviorModuleName:
-#      # The behavior is changing.  Swap them out:
-#      light.behaviorModuleName=_behaviorModuleName
-#    else:
-#      # Do not toggle the leds if the behavior is changing!
-#      if _toggle:
-#        # The user requests to toggle the light on or off:
-#        light.Toggle()
-#      else:
-#        # The user changed values and we need to update the leds:
-#        light.Update()
-    light.behaviorModuleName=_behaviorModuleName
-    if _toggle:
-      # The user requests to toggle the light on or off:
-      light.Toggle()
+  light=findLight(light_name)
+  if light is not None:
+    try:
+      _settings=light.validateUpdate(_payload)
+    except Exception as exc:
+      _returnValue["errors"]=[{"error": str(exc)}]
     else:
-      # The user changed values and we need to update the leds:
-      light.Update()
-    # Generate the HTML to return to the client:
-    html=f"<h1>POST - Updated light {light.name} - {light.state}</h1><br>"
-    html+=f"<a href='/light/{light.name}'>{light.name}</a>"
-    # Generate the return value with the updated status of the ledstrip:
-# ToDo: for some reason light.behaviorModuleName is always returning the ledstrip name instead of the behavior!!!
-    _returnValue["light"]={"name": light.name,
-                           "uri": request.host_url+f"light/{light.name}",
-                           "state": light.state,
-                           "led-count": light.ledCount,
-                           "color": {
-                             "red": light.redRGB,
-                             "green": light.greenRGB,
-                             "blue": light.blueRGB,
-                             "white": light.whiteRGB
-                           },
-                           "brightness": light.ledBrightness,
-                           "behavior": light._behaviorModule.name
-                          }
+      light.applyUpdate(_settings)
+    # Generate the return value with the (updated) status of the ledstrip:
+    _returnValue["light"]=lightDetails(light, request)
   else:
     # We can't find this light!  Oops...
     _errors=[]
@@ -283,6 +289,185 @@ def apiPOSTLight(path_vars, request) -> str:
   return json.dumps(_returnValue)
 
 
+def _pixelChannels(request, light, default: int=None) -> int:
+  """ Return the number of bytes per led of the frames in the body of a PUT request: from the 'format' argument
+  (?format=rgb or ?format=rgbw) or else from the length of the body or else the default.
+  """
+  _format=request.args.get("format")
+  if _format is not None:
+    if not _format.lower() in ("rgb", "rgbw"): raise Exception(f"Unknown frame format '{_format}' (rgb or rgbw)!")
+    return len(_format)
+  if default is None and request.content_length == light.ledCount * 4:
+    return 4
+  return default or 3
+
+
+def _readBody(request, limit: int) -> bytes:
+  """ Return the body of a request, read until it ends or until 'limit' bytes.
+  A read from the stream of a socket can return less than what was asked, so 1 read isn't enough.
+  """
+  _body=bytearray()
+  while len(_body) < limit:
+    _chunk=request.stream.read(limit - len(_body))
+    if not _chunk:
+      break
+    _body+=_chunk
+  return bytes(_body)
+
+
+def apiPUTLightFrame(path_vars, request) -> str:
+  """ Callback function for the PUT operation at the '/light/<light_name>/frame' endpoint.
+  The body is 1 raw frame for all the leds of the light: 3 bytes (red, green, blue) or 4 bytes (red, green, blue,
+  white) per led.  The bytes per led follow from the length of the body or from the 'format' argument:
+    curl -X PUT -H "Content-Type: application/octet-stream" --data-binary @frame.rgb http://<pi>:8888/light/Loft/frame
+    curl -X PUT -H "Content-Type: application/octet-stream" --data-binary @frame.rgbw http://<pi>:8888/light/Loft/frame
+  The frame is copied straight into the strip's buffer.  A running animation is stopped first.
+  """
+  log(f"apiPUTLightFrame: {request.full_path}", debug=True)
+  _returnValue={}
+  # Remove leading or trailing slashes and questionmarks.
+  # In real life, this is removing the leading slash and trailing questionmark
+  _self=request.host_url+request.full_path.strip("/").strip("?")
+  _returnValue["self"]=_self
+  light=findLight(path_vars.get("light_name"))
+  if light is not None:
+    try:
+      _channels=_pixelChannels(request, light)
+      # Read 1 byte more than a frame of RGBW leds to find out if the body is too long:
+      light.showPixels(_readBody(request, light.ledCount * 4 + 1), _channels)
+    except Exception as exc:
+      _returnValue["errors"]=[{"error": str(exc)}]
+    _returnValue["light"]=lightDetails(light, request)
+  else:
+    _returnValue["errors"]=[{"error": f"Light '{path_vars.get('light_name')}' not found!"}]
+  return json.dumps(_returnValue)
+
+
+def apiPUTLightFrames(path_vars, request) -> str:
+  """ Callback function for the PUT operation at the '/light/<light_name>/frames' endpoint.
+  The streaming variant of the '/light/<light_name>/frame' endpoint: the body is a stream of raw frames back to
+  back (usually a chunked body) and each frame is shown as soon as it's complete.  A client can drive an
+  animation at tens of frames per second over a single request.  The 'format' argument sets the bytes per led
+  (rgb by default):
+    ./effect.py | curl -X PUT -H "Content-Type: application/octet-stream" -T - http://<pi>:8888/light/Loft/frames?format=rgbw
+  Returns the number of frames that were shown when the body ends.
+  """
+  log(f"apiPUTLightFrames: {request.full_path}", debug=True)
+  _returnValue={}
+  # Remove leading or trailing slashes and questionmarks.
+  # In real life, this is removing the leading slash and trailing questionmark
+  _self=request.host_url+request.full_path.strip("/").strip("?")
+  _returnValue["self"]=_self
+  light=findLight(path_vars.get("light_name"))
+  if light is not None:
+    _frames=0
+    try:
+      _channels=_pixelChannels(request, light, default=3)
+      _size=light.ledCount * _channels
+      _frame=memoryview(bytearray(_size))
+      while True:
+        # The body comes in in pieces that have nothing to do with the frames.  Collect 1 whole frame:
+        _read=0
+        while _read < _size:
+          _chunk=request.stream.read(_size - _read)
+          if not _chunk:
+            break
+          _frame[_read:_read + len(_chunk)]=_chunk
+          _read+=len(_chunk)
+        if _read == 0:
+          break
+        if _read < _size: raise Exception(f"The last frame is {_read} bytes instead of {_size}!")
+        light.showPixels(_frame, _channels)
+        _frames+=1
+    except Exception as exc:
+      _returnValue["errors"]=[{"error": str(exc)}]
+    log(f"apiPUTLightFrames: {_frames} frames shown", debug=True)
+    _returnValue["frames"]=_frames
+    _returnValue["light"]=lightDetails(light, request)
+  else:
+    _returnValue["errors"]=[{"error": f"Light '{path_vars.get('light_name')}' not found!"}]
+  return json.dumps(_returnValue)
+
+
+def apiPOSTLights(path_vars, request) -> str:
+  """ Callback function for the POST operation at the '/lights' endpoint.
+  Updates multiple lights at once.  We assume a JSON payload like this (or just the list of lights):
+  {
+    "lights": [
+      {
+        "name": "Loft",
+        "state": true,
+        "brightness": 50,
+        "color": {"red": 255, "green": 160, "blue": 60, "white": 0}
+      },
+      {
+        "name": "Status",
+        "behavior": "Christmas",
+        "parameters": {"speed": 20}
+      }
+    ]
+  }
+  Each light takes the same fields as a POST on '/light/<light_name>'.
+  A payload with the name of a scene activates that scene instead: {"scene": "Movie night"}
+  All the updates are validated first: nothing gets changed if any of them is invalid.  The new frames of all
+  the lights are then shown together in the same render tick.
+  This returns a JSON object with the updated details of the lights (and the "errors" if there are any).
+  """
+  log(f"apiPOSTLights: {request.full_path}")
+  _payload=[]
+  _scene=None
+  if request.is_json:
+    log(f"apiPOSTLights: JSON payload -> {request.json}", debug=True)
+    _payload=request.json
+    if isinstance(_payload, dict):
+      _scene=_payload.get("scene")
+      _payload=_payload.get("lights") or []
+  _returnValue={}
+  # Remove leading or trailing slashes and questionmarks.
+  # In real life, this is removing the leading slash and trailing questionmark
+  _self=request.host_url+request.full_path.strip("/").strip("?")
+  _returnValue["self"]=_self
+  if _scene is not None:
+    # The scene's updates have been validated when it was loaded:
+    try:
+      scenes.activate(_scene)
+      _returnValue["lights"]=[lightDetails(light, request) for light in scenes.scene(_scene).targets]
+    except Exception as exc:
+      _returnValue["errors"]=[{"error": str(exc)}]
+    log(f"apiPOSTLights: returning -> {_returnValue}", debug=True)
+    return json.dumps(_returnValue)
+  # Validate all the updates before touching any of the lights:
+  _errors=[]
+  _updates=[]
+  if not isinstance(_payload, list) or len(_payload) == 0:
+    _errors.append({"error": "Expecting a list of light updates!"})
+  else:
+    for _update in _payload:
+      if not isinstance(_update, dict):
+        _errors.append({"error": f"Invalid light update: {_update}"})
+        continue
+      light=findLight(_update.get("name"))
+      if light is None:
+        _errors.append({"error": f"Light '{_update.get('name')}' not found!"})
+      elif light in [_light for _light, _ in _updates]:
+        _errors.append({"light": light.name, "error": f"Light '{light.name}' is updated more than once!"})
+      else:
+        try:
+          _updates.append((light, light.validateUpdate(_update)))
+        except Exception as exc:
+          _errors.append({"light": light.name, "error": str(exc)})
+  if len(_errors) > 0:
+    _returnValue["errors"]=_errors
+  else:
+    _lights=[_light for _light, _ in _updates]
+    with RenderTick(_lights):
+      for light, _settings in _updates:
+        light.applyUpdate(_settings)
+    _returnValue["lights"]=[lightDetails(light, request) for light in _lights]
+  log(f"apiPOSTLights: returning -> {_returnValue}", debug=True)
+  return json.dumps(_returnValue)
+
+
 #def apiGETLightSwitches(host_url, uri, path_vars, parms) -> str:
 def apiGETLightSwitches(path_vars, request) -> str:
   """ Callback function for the GET operation at the '/light/<light_name>/switches' endpoint. """
@@ -371,8 +556,17 @@ def apiGETBehaviors(path_vars, request) -> str:
   This returns a JSON object like this example:
   {
     "self": "http://localhost:8888/behaviors",
-    "behaviors": ["Default", "Christmas", "Fluid"]
+    "behaviors": ["Default", "Christmas", "Fluid"],
+    "schemas": [
+      {
+        "name": "Default",
+        "description": "Behavior Module to implement basic On/Off functionality.",
+        "parameters": {}
+      },
+      ...
+    ]
   }
+  Building the schemas imports all the behavior modules that were not selected by any light yet.
   """
   log(request.full_path, debug=True)
   for path_var in path_vars:
@@ -384,18 +578,529 @@ def apiGETBehaviors(path_vars, request) -> str:
   # In real life, this is removing the leading slash and trailing questionmark
   _self=request.host_url+request.full_path.strip("/").strip("?")
   _returnValue["self"]=_self
-  _returnValue["behaviors"]=BehaviorModule.knownBehaviors
+  _returnValue["behaviors"]=registry.names
+  _returnValue["schemas"]=registry.schemas()
+  return json.dumps(_returnValue)
+
+
+def sceneDetails(scene, request) -> dict:
+  """ Return the details of a scene as they are returned by the API. """
+  return {"name": scene.name,
+          "uri": request.host_url+f"scene/{scene.name}",
+          "lights": scene.lights
+         }
+
+
+def apiGETScenes(path_vars, request) -> str:
+  """ Callback function for the GET operation at the '/scenes' endpoint.
+  This returns a JSON object like this example:
+  {
+    "self": "http://localhost:8888/scenes",
+    "scenes": [
+        {
+            "name": "Movie night",
+            "uri": "http://localhost:8888/scene/Movie night"
+        }
+    ]
+  }
+  """
+  log(request.full_path, debug=True)
+  _returnValue={}
+  # Remove leading or trailing slashes and questionmarks.
+  # In real life, this is removing the leading slash and trailing questionmark
+  _self=request.host_url+request.full_path.strip("/").strip("?")
+  _returnValue["self"]=_self
+  _returnValue["scenes"]=[{"name": _name, "uri": request.host_url+f"scene/{_name}"} for _name in scenes.names]
+  return json.dumps(_returnValue)
+
+
+def apiPOSTScenes(path_vars, request) -> str:
+  """ Callback function for the POST operation at the '/scenes' endpoint.
+  Saves a new scene (or replaces an existing one).  We assume a JSON payload like this:
+  {
+    "name": "Movie night",
+    "activate": false,
+    "lights": [
+      {
+        "name": "Loft",
+        "brightness": 40,
+        "color": {"red": 255, "green": 120, "blue": 40, "white": 0}
+      }
+    ]
+  }
+  Each light takes the same fields as a POST on '/light/<light_name>'.  The optional "activate" flag activates
+  the scene right after saving it.
+  """
+  log(f"apiPOSTScenes: {request.full_path}")
+  _payload={}
+  if request.is_json and isinstance(request.json, dict):
+    log(f"apiPOSTScenes: JSON payload -> {request.json}", debug=True)
+    _payload=request.json
+  _returnValue={}
+  # Remove leading or trailing slashes and questionmarks.
+  # In real life, this is removing the leading slash and trailing questionmark
+  _self=request.host_url+request.full_path.strip("/").strip("?")
+  _returnValue["self"]=_self
+  try:
+    _scene=scenes.add(_payload.get("name"), _payload.get("lights"), {light.name: light for light in lights})
+    if _payload.get("activate"):
+      _scene.activate()
+    _returnValue["scene"]=sceneDetails(_scene, request)
+  except Exception as exc:
+    _returnValue["errors"]=[{"error": str(exc)}]
+  log(f"apiPOSTScenes: returning -> {_returnValue}", debug=True)
+  return json.dumps(_returnValue)
+
+
+def apiGETScene(path_vars, request) -> str:
+  """ Callback function for the GET operation at the '/scene/<scene_name>' endpoint.
+  This returns the scene with the updates of its lights.
+  """
+  log(request.full_path, debug=True)
+  _returnValue={}
+  # Remove leading or trailing slashes and questionmarks.
+  # In real life, this is removing the leading slash and trailing questionmark
+  _self=request.host_url+request.full_path.strip("/").strip("?")
+  _returnValue["self"]=_self
+  _scene=scenes.scene(path_vars.get("scene_name"))
+  if _scene is not None:
+    _returnValue["scene"]=sceneDetails(_scene, request)
+  else:
+    _returnValue["errors"]=[{"error": f"Scene '{path_vars.get('scene_name')}' not found!"}]
+  return json.dumps(_returnValue)
+
+
+def apiPOSTScene(path_vars, request) -> str:
+  """ Callback function for the POST operation at the '/scene/<scene_name>' endpoint.
+  Activates the scene.  A JSON payload {"action": "delete"} deletes the scene instead (only for scenes that were
+  saved through the API).
+  """
+  log(f"apiPOSTScene: {request.full_path}")
+  _action="activate"
+  if request.is_json and isinstance(request.json, dict):
+    _action=request.json.get("action", _action)
+  _name=path_vars.get("scene_name")
+  _returnValue={}
+  # Remove leading or trailing slashes and questionmarks.
+  # In real life, this is removing the leading slash and trailing questionmark
+  _self=request.host_url+request.full_path.strip("/").strip("?")
+  _returnValue["self"]=_self
+  try:
+    if _action == "delete":
+      scenes.remove(_name)
+    else:
+      scenes.activate(_name)
+      _returnValue["lights"]=[lightDetails(light, request) for light in scenes.scene(_name).targets]
+  except Exception as exc:
+    _returnValue["errors"]=[{"error": str(exc)}]
+  log(f"apiPOSTScene: returning -> {_returnValue}", debug=True)
   return json.dumps(_returnValue)
 
 
+def handleSIGHUP(signum, frame):
+  """ Reload the config-file on a SIGHUP (the switch loop picks up the request). """
+  global reloadRequested
+  reloadRequested=True
+
+
+def toggleLight(light):
+  """ Toggle a light from its switch.  The switch always turns the light on with white light and full brightness. """
+  if light.state:
+    # The light is on.  Turn it off without changing settings:
+    light.Off()
+  else:
+    # The light is off.
+    # Get the current settings:
+    _behaviorModuleName=light.behaviorModuleName
+    _red=light.redRGB
+    _green=light.greenRGB
+    _blue=light.blueRGB
+    _white=light.whiteRGB
+    _brightness=light.ledBrightness
+    # Change the settings to standard on/off, white with full brightness:
+    light.behaviorModuleName="Default"
+    light.redRGB=255
+    light.greenRGB=255
+    light.blueRGB=255
+    light.whiteRGB=0
+    light.ledBrightness=95
+    # Turn the light on:
+    light.On()
+    # Restore the settings:
+    light.behaviorModuleName=_behaviorModuleName
+    light.redRGB=_red
+    light.greenRGB=_green
+    light.blueRGB=_blue
+    light.whiteRGB=_white
+    light.ledBrightness=_brightness
+
+
+def cycleLight(light):
+  """ Turn on the next scene that has this light in it or, if there are no such scenes, the next behavior. """
+  _scenes=[]
+  if scenes is not None:
+    _scenes=[_name for _name in scenes.names if light in scenes.scene(_name).targets]
+  if len(_scenes) > 0:
+    _last=gestureScenes.get(light.name)
+    _next=_scenes[(_scenes.index(_last) + 1) % len(_scenes)] if _last in _scenes else _scenes[0]
+    gestureScenes[light.name]=_next
+    log(f"light {light.name}: activating scene '{_next}'")
+    scenes.activate(_next)
+    return
+  _behaviors=[_name for _name in gestureBehaviors.get(light.name, GESTURE_BEHAVIORS) if _name in registry.names]
+  if len(_behaviors) == 0:
+    log(f"light {light.name}: there are no behaviors to cycle through")
+    return
+  _current=light.settings["behavior"]
+  _next=_behaviors[(_behaviors.index(_current) + 1) % len(_behaviors)] if _current in _behaviors else _behaviors[0]
+  log(f"light {light.name}: switching to behavior '{_next}'")
+  light.applyUpdate({"behaviorModuleName": _next, "state": True})
+
+
+def dimLight(light):
+  """ Turn the light on at the next (lower) brightness step, starting over at full brightness after the dimmest. """
+  _levels=[_level for _level in DIM_LEVELS if _level < light.ledBrightness]
+  _next=_levels[0] if len(_levels) > 0 and light.state else DIM_LEVELS[0]
+  log(f"light {light.name}: dimming to {_next}")
+  light.applyUpdate({"ledBrightness": _next, "state": True})
+
+
+def switchesFlipped(light, flipped: list):
+  """ Handle the switches of a light that flipped during the same scan (see Light.switchMode).
+  If the light has gestures, a flip that changes the light may be a double flip or part of a back and forth instead.
+  """
+  _state=light.switchState(flipped)
+  if _state == light.state:
+    log(f"switch(es) {', '.join(_switch.name for _switch in flipped)} -> light {light.name} stays as it is", debug=True)
+    return
+  _gesture=FLIP
+  # The master switch turns the light on and off, no matter how fast it gets flipped:
+  if light.gestures is not None and not (light.switchMode == "master" and light.switches[0] in flipped):
+    _gesture=light.gestures.flip(min(_switch.flippedAt for _switch in flipped))
+  log(f"switch(es) {', '.join(_switch.name for _switch in flipped)} event ({_gesture}) -> light {light.name}", debug=True)
+  try:
+    if _gesture == FLIP:
+      toggleLight(light)
+    elif _gesture == DOUBLE_FLIP:
+      cycleLight(light)
+    elif _gesture == BACK_AND_FORTH:
+      dimLight(light)
+  except Exception as exc:
+    log(f"light {light.name}: can't handle the {_gesture}: {exc}")
+
+
+def createSwitch(switch_config: dict) -> Switch:
+  """ Create a Switch object from its config and set up its GPIO pin. """
+  log(" switch:")
+  log(f"switch config: {switch_config}", debug=True)
+  log(f"  name: {switch_config['name']}")
+  log(f"  GPIO pin: {switch_config['gpio_pin']}")
+  _switch=Switch(switch_config['name'])
+  _switch.debug=DEBUG
+  _switch.gpioPin=switch_config['gpio_pin']
+  _switch.init()
+  return _switch
+
+
+def createLight(light_config: dict) -> Light:
+  """ Create a Light object from its (validated) config, with its switches. """
+  log("Light:")
+  log(f"light: {light_config}", debug=True)
+  log(f" name: {light_config['name']}")
+  log(f" led count: {light_config['led_count']}")
+  log(f" brightness: {light_config['brightness']}")
+  log(f" GPIO pin: {light_config['gpio_pin']}")
+  log(f" behavior module: {light_config['behavior_module']}")
+  log(f" behavior parameters: {light_config['behavior_parameters']}")
+  log(f" max milliamps: {light_config['max_milliamps']}")
+  # Create a light instance and set its properties:
+  _light=Light(light_config['name'])
+  _light.debug=DEBUG
+  _light.ledCount=light_config['led_count']
+  _light.ledBrightness=light_config['brightness']
+  _light.stripGpioPin=light_config['gpio_pin']
+  _light.behaviorModuleName=light_config['behavior_module']
+  # The behavior parameters are optional:
+  if light_config['behavior_parameters']:
+    _light.behaviorParameters=light_config['behavior_parameters']
+  # The power budget is optional:
+  if light_config['max_milliamps']:
+    _light.maxMilliamps=light_config['max_milliamps']
+    if light_config['milliamps_per_channel']:
+      _light.powerLimiter.milliampsPerChannel=light_config['milliamps_per_channel']
+  log(f" switch mode: {light_config['switch_mode']}")
+  _light.switchMode=light_config['switch_mode']
+  # Double flips and flipping back and forth are optional:
+  log(f" gestures: {light_config['gestures']}")
+  if light_config['gestures']:
+    _light.gestures=GestureRecognizer(window=light_config['gesture_window'])
+  if light_config['gesture_behaviors'] is not None:
+    log(f" gesture behaviors: {light_config['gesture_behaviors']}")
+    gestureBehaviors[_light.name]=light_config['gesture_behaviors']
+  # Each light may have 0 or more switches to control it:
+  if len(light_config['switches']) == 0:
+    log("there are no switches configured for this light")
+  for switch_config in light_config['switches']:
+    _light.addSwitch(createSwitch(switch_config))
+  return _light
+
+
+def updateLight(light, old_config: dict, new_config: dict):
+  """ Apply the differences between the old and the new config of a light to the Light object.
+  The ledstrip is only set up again if its hardware settings (GPIO pin, number of leds) changed.
+  """
+  _changes=[_key for _key in new_config if new_config[_key] != old_config.get(_key)]
+  if len(_changes) == 0:
+    return
+  log(f"light {light.name}: reloading {', '.join(_changes)}")
+  light.reconfigureStrip(new_config['led_count'], new_config['gpio_pin'])
+  if new_config['behavior_module'] != old_config['behavior_module']:
+    light.behaviorModuleName=new_config['behavior_module']
+  if new_config['behavior_parameters'] != old_config['behavior_parameters'] and new_config['behavior_parameters']:
+    light.behaviorParameters=new_config['behavior_parameters']
+  if new_config['max_milliamps'] != old_config['max_milliamps'] or \
+     new_config['milliamps_per_channel'] != old_config['milliamps_per_channel']:
+    light.maxMilliamps=new_config['max_milliamps']
+    if new_config['max_milliamps'] and new_config['milliamps_per_channel']:
+      light.powerLimiter.milliampsPerChannel=new_config['milliamps_per_channel']
+  if new_config['brightness'] != old_config['brightness']:
+    light.ledBrightness=new_config['brightness']
+    if light.state:
+      light.Update()
+  if new_config['switch_mode'] != old_config.get('switch_mode'):
+    light.switchMode=new_config['switch_mode']
+  if new_config['gestures'] != old_config.get('gestures') or new_config['gesture_window'] != old_config.get('gesture_window'):
+    light.gestures=GestureRecognizer(window=new_config['gesture_window']) if new_config['gestures'] else None
+  if new_config['gesture_behaviors'] != old_config.get('gesture_behaviors'):
+    if new_config['gesture_behaviors'] is None:
+      gestureBehaviors.pop(light.name, None)
+    else:
+      gestureBehaviors[light.name]=new_config['gesture_behaviors']
+  # Switches are matched by name:
+  _oldSwitches={_switch['name']: _switch for _switch in old_config['switches']}
+  _newSwitches={_switch['name']: _switch for _switch in new_config['switches']}
+  for switch in list(light.switches):
+    if not switch.name in _newSwitches:
+      log(f"light {light.name}: removing switch {switch.name}")
+      switch.release()
+      light.delSwitch(switch)
+    elif _newSwitches[switch.name]['gpio_pin'] != switch.gpioPin:
+      log(f"light {light.name}: moving switch {switch.name} to GPIO pin {_newSwitches[switch.name]['gpio_pin']}")
+      switch.release()
+      switch.gpioPin=_newSwitches[switch.name]['gpio_pin']
+      switch.init()
+  for _name, switch_config in _newSwitches.items():
+    if not _name in _oldSwitches:
+      log(f"light {light.name}: adding switch {_name}")
+      light.addSwitch(createSwitch(switch_config))
+
+
+def reloadConfig():
+  """ Read the config-file again and apply only what changed to the existing Light and Switch objects.
+  Nothing changes if the new config-file is invalid.
+  """
+  global config, lights, scanSeconds
+  log(f"Reloading {CONFIG_FILE}...")
+  try:
+    _config=loadConfig(CONFIG_FILE)
+  except (ConfigError, OSError) as exc:
+    log(f"not reloading the config: {exc}")
+    return
+  # The config-file may have been cached before a behavior (plugin) changed.  Check the behaviors of all the lights
+  # before touching any of them:
+  for light_config in _config['lights']:
+    try:
+      registry.behaviorClass(light_config['behavior_module']).validateParameters(light_config['behavior_parameters'], \
+                                                                                 light_config['behavior_module'])
+    except Exception as exc:
+      log(f"not reloading the config: light {light_config['name']}: {exc}")
+      return
+  # Lights are matched by name.  Remove the lights that are gone first, to release their GPIO pins and DMA channels:
+  _oldLights={_light['name']: _light for _light in config['lights']}
+  _newLights={_light['name']: _light for _light in _config['lights']}
+  _lights=[light for light in lights if light.name in _newLights]
+  try:
+    for light in lights:
+      if light.name in _newLights:
+        continue
+      log(f"removing light {light.name}")
+      light.stateStore=None
+      for switch in list(light.switches):
+        switch.release()
+        light.delSwitch(switch)
+      light.releaseStrip()
+    for light in list(_lights):
+      # (a light that a failed reload added isn't in the old config: it was created from the config that we retry)
+      updateLight(light, _oldLights.get(light.name, _newLights[light.name]), _newLights[light.name])
+    for _name, light_config in _newLights.items():
+      if not _name in _oldLights and not _name in [light.name for light in _lights]:
+        log(f"adding light {_name}")
+        _light=createLight(light_config)
+        _light.stateStore=stateStore
+        _light.begin()
+        _lights.append(_light)
+  except Exception as exc:
+    # Keep the old config, so that the next reload applies the changes again:
+    log(f"reloading the config failed: {exc}")
+    lights=_lights
+    return
+  lights=_lights
+  # Animation cache budget:
+  _cache=_config['animation_cache'] or {}
+  if "max_kilobytes" in _cache:
+    cache.maxBytes=_cache["max_kilobytes"] * 1024
+  if "max_file_kilobytes" in _cache:
+    cache.maxFileBytes=_cache["max_file_kilobytes"] * 1024
+  # Switch scanning (the GPIO block stays mapped):
+  scanSeconds=1 / _config['switch_scan']['hz']
+  # The scenes may refer to lights that changed:
+  if scenes is not None:
+    scenes.reload(_config['scenes'], {light.name: light for light in lights})
+  # The names of the lights are in the mDNS announcement of the API server:
+  if apiServer is not None:
+    apiServer.serviceProperties={"lights": ",".join(light.name for light in lights)}
+  # Some things can't change while the app is running:
+  for _section in ('apiserver', 'state'):
+    if _config[_section] != config[_section]:
+      log(f"the '{_section}' section changed: restart the app to apply it")
+  config=_config
+  log("config reloaded")
+
+
+def startServices(apiserverConfig: dict, scenesConfig: list):
+  """ Start the parts of the app that the switches don't need, in the background: the scenes and the REST API
+  server.  Importing Flask alone takes seconds on a Pi Zero.
+
+  Arguments:
+    apiserverConfig (dict): the 'apiserver' section of the config-file (None -> no API server);
+    scenesConfig (list): the 'scenes' section of the config-file (may be None);
+  """
+  global apiServer, scenes
+  from scenes import SceneBook
+  _scenes=SceneBook(path="scenes.yaml")
+  _scenes.debug=DEBUG
+  _scenes.load(scenesConfig, {light.name: light for light in lights})
+  scenes=_scenes
+  log(f"Scenes: {scenes.names}")
+
+  # The API server is optional, so don't try to configure and start one if we don't have one set up:
+  if not apiserverConfig:
+    log("there's no config for an API server")
+    return
+  try:
+    from ledstrip_api import RESTserver
+    log("API Server:")
+    log(f" name: {apiserverConfig['name']}")
+    log(f" port: {apiserverConfig['port']}")
+    _apiServer=RESTserver(apiserverConfig["name"])
+    _apiServer.debug=DEBUG
+    _apiServer.port=apiserverConfig["port"]
+    # Advertise the server and its lights on the local network (mDNS), so the mobile apps find it:
+    _apiServer.advertise=apiserverConfig["advertise"]
+    _apiServer.serviceProperties={"lights": ",".join(light.name for light in lights)}
+    log(f" advertise: {_apiServer.advertise}")
+    log("Setting up routing rules in the API server...")
+    #  allowedMethods=['GET','POST','PUT','DELETE',])
+
+    # View the whole setup: http://0.0.0.0:80/
+    log("  setting up: /")
+    _apiServer.add_endpoint(endpoint='/', \
+                            endpoint_name='home', \
+                            getHandler=apiGETHome, \
+  #                          htmlTemplateFile='home.html', \
+  #                          htmlTemplateData={'title': 'Ledstrip', \
+  #                                            'name': '<oops>', \
+  #                                            'switches': '[oops]'}, \
+                            allowedMethods=['GET',])
+    # View all the Light objects in the setup: http://0.0.0.0:80/lights
+    # 'POST' to update multiple lights at once (list of updates in body as JSON payload);
+    log("  setting up: /lights")
+    _apiServer.add_endpoint(endpoint='/lights', \
+                            endpoint_name='lights', \
+                            getHandler=apiGETLights, \
+                            postHandler=apiPOSTLights, \
+                            allowedMethods=['GET','POST',])
+    # View the setup of 1 specific Light object: http://0.0.0.0:80/light/<name>
+    # 'GET' shows the config;
+    # 'POST' to update its config (config in body as JSON payload);
+    log("  setting up: /light/<light_name>")
+    _apiServer.add_endpoint(endpoint='/light/<light_name>', \
+                            endpoint_name='light', \
+                            getHandler=apiGETLight, \
+                            postHandler=apiPOSTLight, \
+                            allowedMethods=['GET','POST',])
+    # 'PUT' a raw frame of RGB or RGBW bytes for all the leds of a specific Light: http://0.0.0.0:80/light/<name>/frame
+    log("  setting up: /light/<light_name>/frame")
+    _apiServer.add_endpoint(endpoint='/light/<light_name>/frame', \
+                            endpoint_name='frame', \
+                            putHandler=apiPUTLightFrame, \
+                            allowedMethods=['PUT',])
+    # 'PUT' a stream of raw frames (chunked body) to animate a specific Light: http://0.0.0.0:80/light/<name>/frames
+    log("  setting up: /light/<light_name>/frames")
+    _apiServer.add_endpoint(endpoint='/light/<light_name>/frames', \
+                            endpoint_name='frames', \
+                            putHandler=apiPUTLightFrames, \
+                            allowedMethods=['PUT',])
+    # View all the Switch objects in the setup for a specific Light: http://0.0.0.0:80/light/<name>/switches
+    log("  setting up: /light/<light_name>/switches")
+    _apiServer.add_endpoint(endpoint='/light/<light_name>/switches', \
+                            endpoint_name='switches', \
+                            getHandler=apiGETLightSwitches, \
+                            allowedMethods=['GET',])
+    # View the setup of 1 specific Switch object for a specific Light: http://0.0.0.0:80/light/<name>/switch/<name>
+    log("  setting up: /light/<light_name>/switch/<switch_name>")
+    _apiServer.add_endpoint(endpoint='/light/<light_name>/switch/<switch_name>', \
+                            endpoint_name='switch', \
+                            getHandler=apiGETLightSwitch, \
+                            allowedMethods=['GET',])
+    # View all the BehaviorModules that are available: http://0.0.0.0:80/behaviors
+    log("  setting up: /behaviors")
+    _apiServer.add_endpoint(endpoint='/behaviors', \
+                            endpoint_name='behaviors', \
+                            getHandler=apiGETBehaviors, \
+                            allowedMethods=['GET',])
+
+    # View all the scenes: http://0.0.0.0:80/scenes
+    # 'POST' to save a scene (scene in body as JSON payload);
+    log("  setting up: /scenes")
+    _apiServer.add_endpoint(endpoint='/scenes', \
+                            endpoint_name='scenes', \
+                            getHandler=apiGETScenes, \
+                            postHandler=apiPOSTScenes, \
+                            allowedMethods=['GET','POST',])
+    # View 1 specific scene: http://0.0.0.0:80/scene/<name>
+    # 'POST' to activate (or delete) the scene;
+    log("  setting up: /scene/<scene_name>")
+    _apiServer.add_endpoint(endpoint='/scene/<scene_name>', \
+                            endpoint_name='scene', \
+                            getHandler=apiGETScene, \
+                            postHandler=apiPOSTScene, \
+                            allowedMethods=['GET','POST',])
+
+    log("Starting the REST API server...")
+    _apiServer.start()
+  except Exception as exc:
+    # The switches keep working without the API server:
+    log(f"can't start the REST API server: {exc}")
+    return
+  apiServer=_apiServer
+  log(f"REST API server started {monotonic() - STARTED:.3f} seconds after the start of the app")
+
+
 #--------------------------------------------------#
 # The app starts here...
 #--------------------------------------------------#
 if __name__ == '__main__':
   log(f"Debug: {DEBUG}")
+  registry.debug=DEBUG
+  strips.debug=DEBUG
+  scheduler.debug=DEBUG
   log("Reading the config...")
-  apiServer=None        # the REST API server wrapper
+  apiServer=None        # the REST API server wrapper (started in the background)
   lights=[]             # list of Light objects (typically 1)
+  scenes=None           # SceneBook with the named scenes from the config file and saved through the API (loaded in the background)
+  gestureScenes={}      # light name -> the last scene that a double flip activated on that light
+  gestureBehaviors={}   # light name -> the behaviors that a double flip cycles through (GESTURE_BEHAVIORS if not set)
 
   # We run this app as a daemon on the Raspberry PI, which means that we most probably run this from a different
   # directory.  The lights.yaml file is in the same directory as this app, so make sure we explicitly set the
@@ -405,109 +1110,102 @@ if __name__ == '__main__':
     log(f"Running this in directory: {_dir}")
     os.chdir(_dir)
 
-  # Now open the yaml config-file and read it:
-  with open("lights.yaml", 'r') as stream:
-    try:
-      config=yaml.safe_load(stream)
-    except yaml.YAMLError as exc:
-      log(exc)
-      sys.exit(1)
+  signal.signal(signal.SIGTERM, handleSIGTERM)
+
+  # Now read and validate the yaml config-file (or its cached copy if it didn't change since the last start):
+  try:
+    config=loadConfig(CONFIG_FILE)
+  except (ConfigError, OSError) as exc:
+    # A ConfigError reports all the problems in the config-file at once:
+    log(exc)
+    sys.exit(1)
 
   # There may be config for multiple lights in the yaml-file.
   # Lets set them all up:
   log(f"config: {config}", debug=True)
 
-  # The API server is optional:
-  try:
-    apiserver_config=config["apiserver"]
-    _name=apiserver_config["name"]
-    _port=apiserver_config["port"]
-    log("API Server:")
-    log(f" name: {_name}")
-    log(f" port: {_port}")
-    apiServer=RESTserver(_name)
-    apiServer.debug=DEBUG
-    apiServer.port=_port
-    del apiserver_config   # No longer need this config in memory
-    del _name
-    del _port
-  except:
-    log("there's no config for an API server")
+  # The API server is optional.  It's started in the background after the switches are up:
+  apiserver_config=config.get("apiserver")
+
+  # The size of the cache for precomputed animations is optional:
+  animation_cache_config=config.get("animation_cache")
+  if animation_cache_config:
+    log("Animation cache:")
+    log(f" max kilobytes: {animation_cache_config.get('max_kilobytes')}")
+    log(f" max file kilobytes: {animation_cache_config.get('max_file_kilobytes')}")
+    if "max_kilobytes" in animation_cache_config:
+      cache.maxBytes=animation_cache_config["max_kilobytes"] * 1024
+    if "max_file_kilobytes" in animation_cache_config:
+      cache.maxFileBytes=animation_cache_config["max_file_kilobytes"] * 1024
+  del animation_cache_config
+  cache.debug=DEBUG
+
+  # Saving the state of the lights across restarts is optional:
+  stateStore=None
+  savedStates={}
+  restoreStates=False
+  state_config=config.get("state")
+  if state_config:
+    log("State store:")
+    log(f" file: {state_config.get('file', 'lights.state')}")
+    log(f" fsync seconds: {state_config.get('fsync_seconds', 5)}")
+    log(f" restore after power loss: {state_config.get('restore_after_power_loss', False)}")
+    stateStore=StateStore(state_config.get("file", "lights.state"), interval=state_config.get("fsync_seconds", 5))
+    stateStore.debug=DEBUG
+    savedStates, _cleanShutdown=stateStore.load()
+    # Turning all the lights on after a power outage is not what we want when nobody is at home or in the
+    # middle of the night when everyone is asleep.  Only restore them after a clean restart, unless configured:
+    restoreStates=_cleanShutdown or state_config.get("restore_after_power_loss", False)
+    del _cleanShutdown
+  del state_config
+
+  # The switches are scanned a number of times per second.  All their levels are read at once if possible:
+  switch_scan_config=config["switch_scan"]
+  log("Switch scan:")
+  log(f" hz: {switch_scan_config['hz']}")
+  log(f" gpiomem: {switch_scan_config['gpiomem']}")
+  scanSeconds=1 / switch_scan_config['hz']
+  switchBank=SwitchBank(switch_scan_config['gpiomem'])
+  switchBank.debug=DEBUG
+  switchBank.open()
+  del switch_scan_config
 
   lights_config=config["lights"]
   log(f"Number of light configurations: {len(lights_config)}", debug=True)
   log("===================")
   for light_config in lights_config:
-    log("Light:")
-    log(f"light: {light_config}", debug=True)
-    _name=light_config['name']
-    _ledCount=light_config['led_count']
-    _brightness=light_config['brightness']
-    _gpioPin=light_config['gpio_pin']
-    _behaviorModuleName=light_config['behavior_module']
-    log(f" name: {_name}")
-    log(f" led count: {_ledCount}")
-    log(f" brightness: {_brightness}")
-    log(f" GPIO pin: {_gpioPin}")
-    log(f" behavior module: {_behaviorModuleName}")
-    # Create a light instance and set its properties:
-    _light=Light(_name)
-    _light.debug=DEBUG
-    _light.ledCount=_ledCount
-    _light.ledBrightness=_brightness
-    _light.stripGpioPin=_gpioPin
-    _light.behaviorModuleName=_behaviorModuleName
-
-    # Each light may have 0 or more switches to control it.
-    try:
-      switches_config=light_config['switches']
-      # This handles the case when a 'switches' section is added to the yaml-file but no 'switch' items:
-      if switches_config is None:
-        switches_config=[]
-    except:
-      # There's no configuration for switches.  That's fine!
-      switches_config=[]
-
-    if len(switches_config) == 0:
-      log("there are no switches configured for this light")
-    else:
-      # Lets set them all up for this light:
-      for switch_config in switches_config:
-        log(" switch:")
-        log(f"switch config: {switch_config}", debug=True)
-        _name=switch_config['name']
-        _gpioPin=switch_config['gpio_pin']
-        log(f"  name: {_name}")
-        log(f"  GPIO pin: {_gpioPin}")
-        # Create the switch and set its properties:
-        _switch=Switch(_name)
-        _switch.debug=DEBUG
-        _switch.gpioPin=_gpioPin
-        _switch.init()
-        _light.addSwitch(_switch)
-
-#    # Turn the light off
-#    # ToDo: We may want to keep track of the previous state and restore state.
-#    #       Setting explicitly to off might be best though to avoid having any or all lights
-#    #       automatically turned on after a power outage.  Those sometimes happen when nobody
-#    #       is at home or in the middle of the night when everyone is asleep.
-#    _light.Off()
+    _light=createLight(light_config)
+
+    # Restore the state of the light from before the restart (if we saved one).  The lights stay off after a power loss
+    # (unless configured otherwise), but they do get the color and behavior that they had:
+    if _light.name in savedStates:
+      _settings=dict(savedStates[_light.name])
+      if not restoreStates:
+        _settings["state"]=False
+      try:
+        log(f" restoring state: {_settings}")
+        _light.applyUpdate(_light.validateUpdate(_settings))
+      except Exception as exc:
+        log(f" can't restore the state of the light: {exc}")
+      del _settings
+    _light.stateStore=stateStore
+    # Initialize the strip now rather than when the light gets turned on for the first time:
+    _light.begin()
     # Add the light to the list and move on to the next one (if any)
     lights.append(_light)
 
+  # The scenes are optional.  They're loaded in the background, once the switches are up:
+  scenes_config=config.get("scenes")
+
   # Everything has been set up.  No longer need these config objects in memory:
   # (this app is running for months or even years without reboots on a resource limited device)
-  del _name
-  del _gpioPin
-  del _ledCount
-  del _brightness
-  del _switch
+  # We do keep the (small) config itself to compare against when the config-file gets reloaded.
   del _light
-  del switch_config
-  del switches_config
   del light_config
   del lights_config
-  del config
+  configModified=os.stat(CONFIG_FILE).st_mtime_ns
+  reloadRequested=False
+  signal.signal(signal.SIGHUP, handleSIGHUP)
 
   # List the Lights and their Switch objects (if any):
   if DEBUG:
@@ -519,105 +1217,59 @@ if __name__ == '__main__':
     log("---------------")
 
   log("===================")
-  # The API server is optional, so don't try to configure and start one if we don't have one set up:
-  if isinstance(apiServer, RESTserver):
-    log("Setting up routing rules in the API server...")
-    #  allowedMethods=['GET','POST','PUT','DELETE',])
+  # Load the scenes and start the API server in the background.  The switches don't need to wait for them:
+  threading.Thread(target=startServices, args=(apiserver_config, scenes_config), \
+                   name="Services", daemon=True).start()
+  del apiserver_config
+  del scenes_config
 
-    # View the whole setup: http://0.0.0.0:80/
-    log("  setting up: /")
-    apiServer.add_endpoint(endpoint='/', \
-                           endpoint_name='home', \
-                           getHandler=apiGETHome, \
-#                           htmlTemplateFile='home.html', \
-#                           htmlTemplateData={'title': 'Ledstrip', \
-#                                             'name': '<oops>', \
-#                                             'switches': '[oops]'}, \
-                           allowedMethods=['GET',])
-    # View all the Light objects in the setup: http://0.0.0.0:80/lights
-    log("  setting up: /lights")
-    apiServer.add_endpoint(endpoint='/lights', \
-                           endpoint_name='lights', \
-                           getHandler=apiGETLights, \
-                           allowedMethods=['GET',])
-    # View the setup of 1 specific Light object: http://0.0.0.0:80/light/<name>
-    # 'GET' shows the config;
-    # 'POST' to update its config (config in body as JSON payload);
-    log("  setting up: /light/<light_name>")
-    apiServer.add_endpoint(endpoint='/light/<light_name>', \
-                           endpoint_name='light', \
-                           getHandler=apiGETLight, \
-                           postHandler=apiPOSTLight, \
-                           allowedMethods=['GET','POST',])
-    # View all the Switch objects in the setup for a specific Light: http://0.0.0.0:80/light/<name>/switches
-    log("  setting up: /light/<light_name>/switches")
-    apiServer.add_endpoint(endpoint='/light/<light_name>/switches', \
-                           endpoint_name='switches', \
-                           getHandler=apiGETLightSwitches, \
-                           allowedMethods=['GET',])
-    # View the setup of 1 specific Switch object for a specific Light: http://0.0.0.0:80/light/<name>/switch/<name>
-    log("  setting up: /light/<light_name>/switch/<switch_name>")
-    apiServer.add_endpoint(endpoint='/light/<light_name>/switch/<switch_name>', \
-                           endpoint_name='switch', \
-                           getHandler=apiGETLightSwitch, \
-                           allowedMethods=['GET',])
-    # View all the BehaviorModules that are available: http://0.0.0.0:80/behaviors
-    log("  setting up: /behaviors")
-    apiServer.add_endpoint(endpoint='/behaviors', \
-                           endpoint_name='behaviors', \
-                           getHandler=apiGETBehaviors, \
-                           allowedMethods=['GET',])
-
-    log("Starting the REST API server...")
-    apiServer.start()
+  if stateStore is not None:
+    stateStore.start()
+  del savedStates
 
+  log(f"switches ready {monotonic() - STARTED:.3f} seconds after the start of the app")
   log('Press Ctrl-C to quit.')
 
   try:
+    configChecked=monotonic()
+    nextScan=monotonic()
     while True:
       # Infinite loop, checking each button status every so many milliseconds and toggling the lights
-      # if a change in one of the switches is detected:
-      sleep(0.5)
+      # if a change in one of the switches is detected.  The scans keep their pace, no matter how long the
+      # previous one took (unless we're falling behind):
+      _now=monotonic()
+      nextScan=max(nextScan + scanSeconds, _now)
+      sleep(max(0, nextScan - _now))
 #      log("checking switches...", debug=True)
+      # Reload the config-file when it was changed or when we got a SIGHUP ('systemctl reload lights'):
+      _modified=configModified
+      if reloadRequested or monotonic() - configChecked >= CONFIG_CHECK_SECONDS:
+        configChecked=monotonic()
+        try:
+          _modified=os.stat(CONFIG_FILE).st_mtime_ns
+        except OSError:
+          # An editor may delete or rename the file while it saves it.  Check again the next time:
+          pass
+      if reloadRequested or _modified != configModified:
+        reloadRequested=False
+        configModified=_modified
+        reloadConfig()
+      # Read the levels of all the switches at once (None if the switches need to read their own pin):
+      _levels=switchBank.read()
       for light in lights:
-        for switch in light.switches:
-          if switch.hasChanged():
-            log(f"switch {switch.name} event -> toggling light {light.name}", debug=True)
-            # We want the switch to always turn on the ledstrip with white light and full brightness.
-            if light.state:
-              # The light is on.  Turn it off without changing settings:
-              light.Off()
-            else:
-              # The light is off.
-              # Get the current settings:
-              _behaviorModuleName=light.behaviorModuleName
-              _red=light.redRGB
-              _green=light.greenRGB
-              _blue=light.blueRGB
-              _white=light.whiteRGB
-              _brightness=light.ledBrightness
-              # Change the settings to standard on/off, white with full brightness:
-              light.behaviorModuleName="Default"
-              light.redRGB=255
-              light.greenRGB=255
-              light.blueRGB=255
-              light.whiteRGB=0
-              light.ledBrightness=95
-              # Turn the light on:
-              light.On()
-              # Restore the settings:
-              light.behaviorModuleName=_behaviorModuleName
-              light.redRGB=_red
-              light.greenRGB=_green
-              light.blueRGB=_blue
-              light.whiteRGB=_white
-              light.ledBrightness=_brightness
+        # Scan all the switches of the light before acting on them, so they're evaluated from the same levels:
+        _flipped=[switch for switch in light.switches if switch.hasChanged(_levels)]
+        if len(_flipped) > 0:
+          switchesFlipped(light, _flipped)
 
   except KeyboardInterrupt:
     # Ctrl-C was hit!
     log("...ending app...")
 
   finally:
+    # Save the last changes before the lights get turned off:
+    if stateStore is not None:
+      stateStore.close()
     # Destroy the objects, invoking their destructors, which will turn off the light and clean up all the resources:
     del apiServer
     for light in lights:
@@ -628,5 +1280,7 @@ if __name__ == '__main__':
       del light
     # Release the ports that were setup on the RPi for this app:
     Switch.cleanUp()
+    switchBank.close()
+    strips.releaseAll()
     # Then stop the app...
     log("I'm out of here! Adios...\n")
\ No newline at end of file
@@ -1,3 +1,4 @@
 #!/bin/bash
 LED_PATH=/data/ledstrips
-sudo PYTHONPATH=".:${LED_PATH}/rpi_ws281x-python/library/build/lib.linux-armv7l-3.7" /usr/bin/python3 ${LED_PATH}/ceiling_lights/lights.py
+# exec: systemd signals (SIGTERM to stop, SIGHUP to reload the config) go to sudo, which relays them to the app.
+exec sudo PYTHONPATH=".:${LED_PATH}/rpi_ws281x-python/library/build/lib.linux-armv7l-3.7" /usr/bin/python3 ${LED_PATH}/ceiling_lights/lights.py
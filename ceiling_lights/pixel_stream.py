@@ -0,0 +1,327 @@
+"""
+This module contains the receiver of the Stream behavior: it takes frames of pixels from lighting software over UDP.
+
+2 protocols are supported:
+- E1.31 (sACN, UDP port 5568): each packet carries the 512 DMX channels of 1 universe.  A universe holds 170 RGB
+  or 128 RGBW pixels, so a strip of 250+ leds spans a number of consecutive universes.  A frame is complete when
+  all its universes came in (or on the E1.31 synchronization packet when the sender uses one).  Packets that
+  are older than the last packet of their universe (by their sequence number) are dropped as late;
+- DDP (UDP port 4048): each packet carries a span of channels at a byte offset in the frame and the packet with
+  the 'push' flag completes the frame;
+
+The channel data of a packet is copied straight into a frame in the layout of the strip's led buffer with 1
+strided memoryview copy per color channel (see framebuffer.copyPixels()), so there's no Python object per pixel.
+A complete frame replaces the frame that's waiting to be shown: when frames come in faster than the strip can
+show them, the late ones are dropped instead of queued, so the strip never lags behind the sender.
+
+All the sockets are served by 1 asyncio event loop in its own thread.  Lights that listen on the same port (each
+on its own universes) share the socket.
+
+Classes in this module:
+- 'StreamFrame': assembles the frames of 1 light from the packets and hands the newest complete frame over;
+- 'StreamReceiver': the asyncio event loop with the UDP sockets;
+
+This module requires these modules:
+- asyncio, struct and threading modules from the Python standard library;
+- framebuffer module to copy the pixels into the layout of the led buffer;
+"""
+
+import asyncio
+import struct
+import sys
+import threading
+from framebuffer import copyPixels, LED_BYTES, LED_TYPECODE
+
+E131_PORT=5568
+DDP_PORT=4048
+# The number of DMX channels in an E1.31 universe:
+E131_CHANNELS=512
+# The channels in the data of a DDP packet (a multiple of both 3 and 4):
+DDP_CHANNELS=1440
+
+_E131_IDENTIFIER=b"ASC-E1.17\x00\x00\x00"
+_E131_ROOT_DATA=0x00000004
+_E131_ROOT_EXTENDED=0x00000008
+_E131_FRAMING_DATA=0x00000002
+_E131_FRAMING_SYNC=0x00000001
+# Offset of the DMX data (after the start code) in an E1.31 data packet:
+_E131_DATA=126
+_DDP_VERSION=0x40
+_DDP_PUSH=0x01
+_DDP_TIMECODE=0x10
+
+
+def e131Packet(universe: int, sequence: int, data: bytes, syncAddress: int=0, source: str="ledstrips") -> bytes:
+  """ Return an E1.31 data packet with the channels of a universe (used by the benchmark to stream frames). """
+  _length=_E131_DATA + len(data)
+  return struct.pack("!HH12sHI16sHI64sBHBBHHBBHHHB", 0x0010, 0, _E131_IDENTIFIER, 0x7000 | (_length - 16), \
+                     _E131_ROOT_DATA, b"ledstrips-stream", 0x7000 | (_length - 38), _E131_FRAMING_DATA, \
+                     source.encode(), 100, syncAddress, sequence & 255, 0, universe, 0x7000 | (_length - 115), \
+                     0x02, 0xa1, 0, 1, len(data) + 1, 0) + bytes(data)
+
+
+def e131SyncPacket(syncAddress: int, sequence: int) -> bytes:
+  """ Return an E1.31 synchronization packet. """
+  return struct.pack("!HH12sHI16sHIBHH", 0x0010, 0, _E131_IDENTIFIER, 0x7000 | (49 - 16), _E131_ROOT_EXTENDED, \
+                     b"ledstrips-stream", 0x7000 | (49 - 38), _E131_FRAMING_SYNC, sequence & 255, syncAddress, 0)
+
+
+def ddpPacket(offset: int, data: bytes, sequence: int, push: bool=False) -> bytes:
+  """ Return a DDP packet with the channels at a byte offset in the frame. """
+  return struct.pack("!BBBBIH", _DDP_VERSION | (_DDP_PUSH if push else 0), (sequence % 15) + 1, 0x0b, 1, offset, \
+                     len(data)) + bytes(data)
+
+
+class StreamFrame:
+  """
+  Class that assembles the frames of 1 light from the channel data of the packets.
+  """
+
+  def __init__(self, ledCount: int, protocol: str="e131", universe: int=1, channels: int=3):
+    """ Constructor.
+
+    Arguments:
+      ledCount (int): the number of leds on the strip;
+      protocol (str): "e131" or "ddp" (default=e131);
+      universe (int): the first E1.31 universe of the strip (default=1);
+      channels (int): 3 for RGB or 4 for RGBW pixels (default=3);
+    """
+    if not channels in (3, 4): raise Exception("A pixel needs 3 (RGB) or 4 (RGBW) channels!")
+    if not protocol in ("e131", "ddp"): raise Exception(f"Unknown stream protocol '{protocol}'!")
+    self._ledCount=ledCount
+    self._protocol=protocol
+    self._channels=channels
+    self._universe=universe
+    # Pixels don't straddle universes: a universe holds 170 RGB or 128 RGBW pixels:
+    self._pixelsPerUniverse=E131_CHANNELS // channels
+    self._universes=-(-ledCount // self._pixelsPerUniverse)
+    # The frame that's being assembled, the newest complete frame and the frame that's being shown, all in the
+    # layout of the led buffer:
+    self._back=memoryview(bytearray(ledCount * LED_BYTES))
+    self._ready=memoryview(bytearray(ledCount * LED_BYTES))
+    self._front=memoryview(bytearray(ledCount * LED_BYTES))
+    self._received=set()          # universes received for the frame that's being assembled
+    self._sequences={}            # universe -> sequence number of its last packet
+    self._sync=False              # the sender completes its frames with synchronization packets
+    self._pending=False           # a complete frame is waiting to be shown
+    self._frame=0                 # number of frames completed
+    self._condition=threading.Condition()
+    self._packets=0               # number of packets with data for the strip
+    self._late=0                  # number of packets dropped because they were older than the last one
+    self._invalid=0               # number of packets that couldn't be used
+    self._dropped=0               # number of complete frames that were replaced before they were shown
+
+  @property
+  def protocol(self) -> str:
+    """ Return the protocol of the stream. """
+    return self._protocol
+
+  @property
+  def universes(self) -> range:
+    """ Return the E1.31 universes of the strip. """
+    return range(self._universe, self._universe + self._universes)
+
+  @property
+  def stats(self) -> dict:
+    """ Return the number of packets and frames that were received and dropped. """
+    with self._condition:
+      return {"packets": self._packets,
+              "frames": self._frame,
+              "dropped-frames": self._dropped,
+              "late-packets": self._late,
+              "invalid-packets": self._invalid
+             }
+
+  def _complete(self):
+    """ Hand the assembled frame over to be shown (the lock needs to be held). """
+    if self._pending:
+      # The frame before it wasn't shown yet.  Drop it rather than lag behind:
+      self._dropped+=1
+    self._back, self._ready=self._ready, self._back
+    # Universes that don't come in for the next frame keep their pixels:
+    self._back[:]=self._ready
+    self._received=set()
+    self._pending=True
+    self._frame+=1
+    self._condition.notify_all()
+
+  def e131(self, universe: int, sequence: int, syncAddress: int, data: memoryview):
+    """ Process the DMX data of an E1.31 packet for 1 of the strip's universes. """
+    with self._condition:
+      _last=self._sequences.get(universe)
+      # E1.31 drops a packet that is up to 20 sequence numbers behind the last one of its universe:
+      if _last is not None and -20 < ((sequence - _last + 128) & 255) - 128 <= 0:
+        self._late+=1
+        return
+      self._sequences[universe]=sequence
+      self._packets+=1
+      if universe in self._received and not self._sync:
+        # The sender skipped a universe of the frame before this one:
+        self._complete()
+      copyPixels(self._back, data, self._channels, (universe - self._universe) * self._pixelsPerUniverse)
+      self._received.add(universe)
+      self._sync=syncAddress != 0
+      if not self._sync and len(self._received) == self._universes:
+        self._complete()
+
+  def e131Sync(self):
+    """ Process an E1.31 synchronization packet: the universes that came in since the last one make a frame. """
+    with self._condition:
+      if self._sync and len(self._received) > 0:
+        self._complete()
+
+  def ddp(self, offset: int, push: bool, data: memoryview):
+    """ Process the channel data of a DDP packet. """
+    with self._condition:
+      if offset % self._channels != 0:
+        # The data needs to start at a pixel:
+        self._invalid+=1
+        return
+      self._packets+=1
+      copyPixels(self._back, data, self._channels, offset // self._channels)
+      if push:
+        self._complete()
+
+  def next(self, frame: int, timeout: float=None) -> tuple:
+    """ Wait for a frame newer than 'frame' and return (frame number, the frame as 32-bit colors), or None if
+    there's no newer frame before the timeout.  The frame is only valid until the next call.
+
+    Arguments:
+      frame (int): the number of the last frame that the caller got (0 for none);
+      timeout (float): maximum number of seconds to wait (default=None -> wait for as long as it takes);
+    """
+    with self._condition:
+      if not self._condition.wait_for(lambda: self._frame > frame, timeout):
+        return None
+      self._pending=False
+      # Copy it out, so the frame can be shown without holding up the packets of the next one:
+      self._front[:]=self._ready
+      return (self._frame, self._front.cast(LED_TYPECODE))
+
+
+class _Protocol(asyncio.DatagramProtocol):
+  """
+  The asyncio protocol of 1 UDP socket: it parses the packets and passes them to the frames of the lights.
+  """
+
+  def __init__(self, receiver, port: int, protocol: str):
+    self._receiver=receiver
+    self._port=port
+    self._protocol=protocol
+
+  def datagram_received(self, data: bytes, address: tuple):
+    try:
+      self._receiver._packet(self._port, self._protocol, data)
+    except Exception as exc:
+      self._receiver.log(f"bad packet from {address}: {exc}", debug=True)
+
+
+class StreamReceiver:
+  """
+  Class that runs the UDP sockets of the Stream behaviors on 1 asyncio event loop in its own thread.
+  """
+
+  def __init__(self):
+    """ Constructor. """
+    self._debug=False
+    self._loop=None
+    self._thread=None
+    self._lock=threading.Lock()
+    self._sockets={}              # port -> (protocol, asyncio transport)
+    self._frames={}               # port -> list of StreamFrame objects
+
+  @property
+  def debug(self) -> bool:
+    """ Return the debug-flag that is set for the receiver. """
+    return self._debug
+
+  @debug.setter
+  def debug(self, flag: bool):
+    """ Set the debug level. """
+    self._debug=flag
+
+  def log(self, *args, debug: bool=False):
+    """ Simple function to log messages to the console. """
+    _log=True
+    if debug and not self._debug:
+      _log=False
+    if _log:
+      # We don't want to log the message as a list between '()' if we only got 1 element in the argument list:
+      if len(args) == 1:
+        print(f"{type(self)}: {args[0]}")
+      else:
+        print(f"{type(self)}: {args}")
+      # We need to flush the stdout buffer in python for log statements to reach the Linux systemd journal:
+      sys.stdout.flush()
+
+  def attach(self, frame: StreamFrame, port: int=None, host: str="0.0.0.0"):
+    """ Start passing the packets on a UDP port to a frame, opening the port if it isn't open yet.
+
+    Arguments:
+      frame (StreamFrame): the frame of the light;
+      port (int): the UDP port (default=None -> the port of the frame's protocol);
+      host (str): the address to listen on (default=0.0.0.0 -> all interfaces);
+    """
+    if port is None:
+      port=E131_PORT if frame.protocol == "e131" else DDP_PORT
+    with self._lock:
+      if port in self._sockets:
+        if self._sockets[port][0] != frame.protocol:
+          raise Exception(f"UDP port {port} is listening for {self._sockets[port][0]} packets already!")
+      else:
+        if self._loop is None:
+          self._loop=asyncio.new_event_loop()
+          self._thread=threading.Thread(target=self._loop.run_forever, name="StreamReceiver", daemon=True)
+          self._thread.start()
+        _endpoint=self._loop.create_datagram_endpoint(lambda: _Protocol(self, port, frame.protocol), \
+                                                      local_addr=(host, port))
+        _transport, _=asyncio.run_coroutine_threadsafe(_endpoint, self._loop).result(5)
+        self._sockets[port]=(frame.protocol, _transport)
+        self.log(f"listening for {frame.protocol} packets on UDP port {port}")
+      # Replace the list instead of changing it, so the event loop can use it without the lock:
+      self._frames[port]=self._frames.get(port, []) + [frame]
+
+  def detach(self, frame: StreamFrame):
+    """ Stop passing packets to a frame, closing the ports that nothing listens to anymore. """
+    with self._lock:
+      for _port in list(self._frames.keys()):
+        if frame in self._frames[_port]:
+          self._frames[_port]=[_frame for _frame in self._frames[_port] if _frame is not frame]
+          if len(self._frames[_port]) == 0:
+            del self._frames[_port]
+            self._loop.call_soon_threadsafe(self._sockets.pop(_port)[1].close)
+            self.log(f"closed UDP port {_port}")
+
+  def _packet(self, port: int, protocol: str, data: bytes):
+    """ Parse a packet and pass its channel data to the frames on the port (called from the event loop). """
+    _frames=self._frames.get(port, [])
+    _packet=memoryview(data)
+    if protocol == "ddp":
+      _flags, _, _, _, _offset, _length=struct.unpack_from("!BBBBIH", data)
+      if _flags & 0xc0 != _DDP_VERSION:
+        return
+      _data=10 + (4 if _flags & _DDP_TIMECODE else 0)
+      for _frame in _frames:
+        _frame.ddp(_offset, bool(_flags & _DDP_PUSH), _packet[_data:_data + _length])
+      return
+    if data[4:16] != _E131_IDENTIFIER:
+      return
+    _vector=struct.unpack_from("!I", data, 18)[0]
+    if _vector == _E131_ROOT_EXTENDED and struct.unpack_from("!I", data, 40)[0] == _E131_FRAMING_SYNC:
+      for _frame in _frames:
+        _frame.e131Sync()
+      return
+    if _vector != _E131_ROOT_DATA or len(data) < _E131_DATA:
+      return
+    _syncAddress, _sequence, _options, _universe=struct.unpack_from("!HBBH", data, 109)
+    _count=struct.unpack_from("!H", data, 123)[0]
+    # Skip preview data and packets that don't carry DMX levels (start code 0):
+    if _options & 0x80 or data[125] != 0:
+      return
+    for _frame in _frames:
+      if _universe in _frame.universes:
+        _frame.e131(_universe, _sequence, _syncAddress, _packet[_E131_DATA:_E131_DATA + _count - 1])
+
+
+# The receiver that serves the Stream behaviors of all the lights:
+receiver=StreamReceiver()
@@ -0,0 +1,128 @@
+"""
+This module contains the power limiter that keeps a ledstrip within the budget of its power supply.
+
+A 250 led SK6812 RGBW strip with all 4 leds at full power draws way more current than a typical power supply
+can deliver.  The limiter estimates the current that the next frame is going to draw from the colors in the
+strip's buffer and lowers the brightness of the strip just enough to stay within the budget:
+  current = ledCount * idle + brightness / 255 * sum(channel values / 255 * milliamps of the channel)
+
+The channel values are summed straight from the led buffer (with NumPy when it's installed), which costs a
+fraction of a millisecond per frame, even for 1000 leds.
+
+This module requires these modules:
+- framebuffer module to get to the led buffer of the strip;
+- NumPy (optional, to sum the channel values faster);
+"""
+
+from framebuffer import readFrame
+
+# NumPy is imported the first time that a frame gets measured (importing it takes a while on a Pi Zero):
+numpy=None
+
+
+class PowerLimiter:
+  """
+  Class to estimate the current of a ledstrip's frames and to limit its brightness to a budget.
+  """
+  # Current in milliamps of 1 led channel at full power and of 1 led that's off:
+  DEFAULT_MILLIAMPS_PER_CHANNEL={"red": 12.0, "green": 12.0, "blue": 12.0, "white": 12.0}
+  DEFAULT_IDLE_MILLIAMPS=1.0
+
+  def __init__(self, maxMilliamps: float, milliampsPerChannel: dict=None, idleMilliamps: float=None):
+    """ Constructor.
+
+    Arguments:
+      maxMilliamps (float): the budget in milliamps for the strip;
+      milliampsPerChannel (dict): current of 1 led channel at full power ({"red": .., "green": .., "blue": .., "white": ..});
+      idleMilliamps (float): current of 1 led that's off;
+    """
+    self._maxMilliamps=0
+    self._coefficients=(0, 0, 0, 0)
+    self._milliampsPerChannel=dict(self.DEFAULT_MILLIAMPS_PER_CHANNEL)
+    self._idleMilliamps=self.DEFAULT_IDLE_MILLIAMPS
+    self._lastMilliamps=0
+    self._limitedFrames=0
+    self.maxMilliamps=maxMilliamps
+    self.idleMilliamps=idleMilliamps if idleMilliamps is not None else self.DEFAULT_IDLE_MILLIAMPS
+    self.milliampsPerChannel=milliampsPerChannel or {}
+
+  @property
+  def maxMilliamps(self) -> float:
+    """ Return the budget in milliamps. """
+    return self._maxMilliamps
+
+  @maxMilliamps.setter
+  def maxMilliamps(self, value: float):
+    """ Set the budget in milliamps. """
+    if not (value > 0): raise Exception("The maximum current needs to be more than 0 milliamps!")
+    self._maxMilliamps=value
+
+  @property
+  def milliampsPerChannel(self) -> dict:
+    """ Return the current in milliamps of 1 led channel at full power. """
+    return dict(self._milliampsPerChannel)
+
+  @milliampsPerChannel.setter
+  def milliampsPerChannel(self, values: dict):
+    """ Set the current in milliamps of (some of) the led channels at full power. """
+    for _channel, _value in values.items():
+      if not _channel in self._milliampsPerChannel: raise Exception(f"Unknown led channel '{_channel}'!")
+      if _value < 0: raise Exception(f"The current of the {_channel} channel can't be negative!")
+      self._milliampsPerChannel[_channel]=float(_value)
+    # Precompute the coefficients in the order of the bytes of a Color() value in memory: blue, green, red, white
+    self._coefficients=tuple(self._milliampsPerChannel[_channel] / 255 / 255 for _channel in ("blue", "green", "red", "white"))
+
+  @property
+  def idleMilliamps(self) -> float:
+    """ Return the current in milliamps of 1 led that's off. """
+    return self._idleMilliamps
+
+  @idleMilliamps.setter
+  def idleMilliamps(self, value: float):
+    """ Set the current in milliamps of 1 led that's off. """
+    if value < 0: raise Exception("The idle current can't be negative!")
+    self._idleMilliamps=float(value)
+
+  @property
+  def stats(self) -> dict:
+    """ Return the estimated current of the last frame and the number of frames that were dimmed. """
+    return {"milliamps": round(self._lastMilliamps),
+            "max-milliamps": self._maxMilliamps,
+            "limited-frames": self._limitedFrames
+           }
+
+  def channelSums(self, frame) -> tuple:
+    """ Return the sums of the blue, green, red and white values of all the leds in the frame. """
+    global numpy
+    if numpy is None:
+      try:
+        import numpy
+      except ImportError:
+        numpy=False
+    _bytes=memoryview(frame).cast("B")
+    if numpy:
+      return tuple(int(_sum) for _sum in numpy.frombuffer(_bytes, dtype=numpy.uint8).reshape(-1, 4).sum(axis=0, dtype=numpy.uint32))
+    # Strided slices of a memoryview are summed in C without creating a Python object per byte:
+    return (sum(_bytes[0::4]), sum(_bytes[1::4]), sum(_bytes[2::4]), sum(_bytes[3::4]))
+
+  def _dynamicMilliamps(self, frame) -> float:
+    """ Return the current in milliamps of the frame per step of brightness (on top of the idle current). """
+    return sum(_sum * _coefficient for _sum, _coefficient in zip(self.channelSums(frame), self._coefficients))
+
+  def estimate(self, frame, brightness: int) -> float:
+    """ Return the estimated current in milliamps of the frame at this brightness. """
+    return len(frame) * self._idleMilliamps + self._dynamicMilliamps(frame) * brightness
+
+  def limit(self, strip, brightness: int) -> int:
+    """ Return the highest brightness (up to the requested one) at which the strip's buffer stays within budget. """
+    _frame=readFrame(strip)
+    _idle=len(_frame) * self._idleMilliamps
+    _dynamic=self._dynamicMilliamps(_frame)
+    self._lastMilliamps=_idle + _dynamic * brightness
+    if self._lastMilliamps <= self._maxMilliamps or _dynamic == 0:
+      return brightness
+    # Scale the brightness down to the budget:
+    self._limitedFrames+=1
+    brightness=max(0, min(brightness, int((self._maxMilliamps - _idle) / _dynamic)))
+    self._lastMilliamps=_idle + _dynamic * brightness
+    return brightness
@@ -2,27 +2,43 @@
 This is a mock file to get the app running on a host that doesn't have the
 Raspberry PI ws281x libraries and modules installed.
 """
-class Color:
-  def __init__(self, v1, v2, v3, v4):
-    pass
+def Color(red, green, blue, white=0):
+  return (white << 24) | (red << 16) | (green << 8) | blue
 
 
 class PixelStrip:
-  def __init__(self, v1, v2, v3, v4, v5, v6, v7, v8):
+  def __init__(self, num, pin, freq_hz=800000, dma=10, invert=False, brightness=255, channel=0, strip_type=None, gamma=None):
+    self._leds=[0] * num
+    self._brightness=brightness
+
+  def _cleanup(self):
     pass
 
   def begin(self):
     pass
 
   def numPixels(self):
-    return 1
+    return len(self._leds)
 
-  def setPixelColor(self, v1, v2):
-    pass
+  def setPixelColor(self, n, color):
+    self._leds[n]=color
+
+  def getPixelColor(self, n):
+    return self._leds[n]
+
+  def getPixels(self):
+    return self._leds
+
+  def setBrightness(self, brightness):
+    self._brightness=brightness
+
+  def getBrightness(self):
+    return self._brightness
 
   def show(self):
     pass
 
 
 class ws:
-  SK6812_STRIP_RGBW = None
\ No newline at end of file
+  SK6812_STRIP_RGBW = None
+  SK6812_STRIP_GRBW = None
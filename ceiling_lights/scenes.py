@@ -0,0 +1,256 @@
+"""
+This module contains the scenes: named combinations of settings for multiple lights ("movie night", "cleaning",
+"all off", ...) that are activated all at once.
+
+Scenes are defined in the 'scenes' section of lights.yaml or saved through the API (in scenes.yaml, next to
+lights.yaml).  Each scene holds an update for 1 or more lights, with the same fields as a POST on the
+'/light/<light_name>' endpoint:
+  scenes:
+    - name: Movie night
+      lights:
+        - name: Loft
+          brightness: 40
+          color: {red: 255, green: 120, blue: 40, white: 0}
+        - name: Status
+          state: false
+
+Lights in a scene turn on unless the scene sets their "state" to false.  Lights without a "behavior" use the
+Default behavior.  Their frame (1 color on all the leds) is rendered when the scene is loaded, so activating the
+scene is a single memory copy into each strip's buffer.  Missing colors and brightness are taken from the light
+when the scene is loaded.
+
+Classes in this module:
+- 'Scene': the settings and pre-rendered frames of 1 scene;
+- 'SceneBook': all the scenes of the app, by name;
+
+This module requires these modules:
+- yaml module to save the scenes that are created through the API;
+- framebuffer module for the pre-rendered frames;
+- ledstrip module to update the lights in the same render tick;
+"""
+
+import os
+import sys
+import threading
+import yaml
+from rpi_ws281x import Color
+from framebuffer import newFrame
+from ledstrip import RenderTick
+from behavior_registry import registry
+
+
+class Scene:
+  """
+  Class for a named combination of light settings with a pre-rendered frame per light.
+  """
+
+  def __init__(self, name: str, lights: list):
+    """ Constructor.
+
+    Arguments:
+      name (str): the name of the scene;
+      lights (list): the updates of the lights in the scene (dicts with the "name" of the light and the same fields
+                     as a POST on the '/light/<light_name>' endpoint);
+    """
+    if not name: raise Exception("A scene needs a name!")
+    if not isinstance(lights, list) or len(lights) == 0: raise Exception(f"Scene '{name}' needs a list of lights!")
+    self._name=name
+    self._lights=lights
+    self._updates=[]      # list of (Light, settings, frame) tuples, set by compile()
+
+  @property
+  def name(self) -> str:
+    """ Return the name of the scene. """
+    return self._name
+
+  @property
+  def lights(self) -> list:
+    """ Return the updates of the lights in the scene, as they were defined. """
+    return self._lights
+
+  @property
+  def targets(self) -> list:
+    """ Return the Light objects in the scene (empty until the scene is compiled). """
+    return [light for light, _, _ in self._updates]
+
+  def compile(self, lightsByName: dict):
+    """ Validate the scene against the lights and pre-render the frames of the lights with the Default behavior.
+    Raises an exception if the scene is invalid.
+
+    Arguments:
+      lightsByName (dict): the Light objects of the app by name;
+    """
+    _updates=[]
+    for _update in self._lights:
+      if not isinstance(_update, dict): raise Exception(f"Scene '{self._name}' has an invalid light: {_update}")
+      light=lightsByName.get(_update.get("name"))
+      if light is None: raise Exception(f"Scene '{self._name}': light '{_update.get('name')}' not found!")
+      if light in [_light for _light, _, _ in _updates]:
+        raise Exception(f"Scene '{self._name}': light '{light.name}' is in the scene more than once!")
+      _settings=light.validateUpdate(_update)
+      # Scenes turn lights on or off.  They never toggle them:
+      _settings.pop("toggle", None)
+      _settings.setdefault("state", True)
+      _frame=None
+      if _settings.setdefault("behaviorModuleName", registry.DEFAULT_BEHAVIOR) == registry.DEFAULT_BEHAVIOR:
+        for _setting in ("ledBrightness", "redRGB", "greenRGB", "blueRGB", "whiteRGB"):
+          _settings.setdefault(_setting, getattr(light, _setting))
+        if _settings["state"]:
+          _frame=newFrame(light.ledCount, Color(_settings["redRGB"], _settings["greenRGB"], \
+                                                _settings["blueRGB"], _settings["whiteRGB"]))
+        else:
+          _frame=newFrame(light.ledCount)
+      _updates.append((light, _settings, _frame))
+    self._updates=_updates
+
+  def activate(self):
+    """ Apply the scene to all its lights in the same render tick. """
+    if len(self._updates) == 0: raise Exception(f"Scene '{self._name}' has not been compiled!")
+    with RenderTick(self.targets):
+      for light, _settings, _frame in self._updates:
+        light.applyScene(_settings, _frame)
+
+
+class SceneBook:
+  """
+  Class that holds all the scenes of the app: the scenes from the config file and the scenes saved through the API.
+  """
+
+  def __init__(self, path: str=None):
+    """ Constructor.
+
+    Arguments:
+      path (str): yaml file to save the scenes that are created through the API in (default=None -> don't save);
+    """
+    self._debug=False
+    self._path=path
+    self._scenes={}       # name -> Scene
+    self._saved=[]        # names of the scenes that were saved through the API
+    self._lock=threading.Lock()
+
+  @property
+  def debug(self) -> bool:
+    """ Return the debug-flag that is set for the scenes. """
+    return self._debug
+
+  @debug.setter
+  def debug(self, flag: bool):
+    """ Set the debug level. """
+    self._debug=flag
+
+  @property
+  def names(self) -> list:
+    """ Return the names of all the scenes. """
+    return list(self._scenes.keys())
+
+  def log(self, *args, debug: bool=False):
+    """ Simple function to log messages to the console. """
+    _log=True
+    if debug and not self._debug:
+      _log=False
+    if _log:
+      # We don't want to log the message as a list between '()' if we only got 1 element in the argument list:
+      if len(args) == 1:
+        print(f"{type(self)}: {args[0]}")
+      else:
+        print(f"{type(self)}: {args}")
+      # We need to flush the stdout buffer in python for log statements to reach the Linux systemd journal:
+      sys.stdout.flush()
+
+  def scene(self, name: str) -> Scene:
+    """ Return the scene with this name or None if there's no such scene. """
+    return self._scenes.get(name)
+
+  def load(self, scenesConfig: list, lightsByName: dict):
+    """ Load the scenes from the config file and from the file with the saved scenes.
+    Invalid scenes are logged and skipped.
+
+    Arguments:
+      scenesConfig (list): the 'scenes' section of the config file (may be None);
+      lightsByName (dict): the Light objects of the app by name;
+    """
+    for _config in scenesConfig or []:
+      self._load(_config, lightsByName, saved=False)
+    if self._path is not None and os.path.exists(self._path):
+      with open(self._path, "r") as stream:
+        _saved=yaml.safe_load(stream) or {}
+      for _config in _saved.get("scenes") or []:
+        self._load(_config, lightsByName, saved=True)
+
+  def reload(self, scenesConfig: list, lightsByName: dict):
+    """ Replace the scenes from the config file with the new ones and pre-render the saved scenes again.
+
+    Arguments:
+      scenesConfig (list): the new 'scenes' section of the config file (may be None);
+      lightsByName (dict): the Light objects of the app by name;
+    """
+    with self._lock:
+      self._scenes={_name: _scene for _name, _scene in self._scenes.items() if _name in self._saved}
+    for _config in scenesConfig or []:
+      if not _config.get("name") in self._saved:
+        self._load(_config, lightsByName, saved=False)
+    self.compile(lightsByName)
+
+  def _load(self, config: dict, lightsByName: dict, saved: bool):
+    """ Load 1 scene from its config. """
+    try:
+      self.add(config.get("name"), config.get("lights"), lightsByName, save=False)
+      if saved:
+        self._saved.append(config.get("name"))
+      self.log(f"loaded scene '{config.get('name')}'", debug=True)
+    except Exception as exc:
+      self.log(f"skipping scene: {exc}")
+
+  def compile(self, lightsByName: dict):
+    """ Pre-render the frames of all the scenes again (after the lights changed). """
+    for _scene in list(self._scenes.values()):
+      try:
+        _scene.compile(lightsByName)
+      except Exception as exc:
+        self.log(f"scene '{_scene.name}' no longer matches the lights: {exc}")
+
+  def add(self, name: str, lights: list, lightsByName: dict, save: bool=True) -> Scene:
+    """ Create (or replace) a scene.  Raises an exception if the scene is invalid.
+
+    Arguments:
+      name (str): the name of the scene;
+      lights (list): the updates of the lights in the scene;
+      lightsByName (dict): the Light objects of the app by name;
+      save (bool): save the scene in the scenes file (default=True);
+    """
+    _scene=Scene(name, lights)
+    _scene.compile(lightsByName)
+    with self._lock:
+      self._scenes[name]=_scene
+      if save and not name in self._saved:
+        self._saved.append(name)
+      if save:
+        self._write()
+    return _scene
+
+  def remove(self, name: str):
+    """ Delete a scene that was saved through the API. """
+    with self._lock:
+      if not name in self._scenes: raise Exception(f"Scene '{name}' not found!")
+      if not name in self._saved: raise Exception(f"Scene '{name}' is defined in the config file!")
+      del self._scenes[name]
+      self._saved.remove(name)
+      self._write()
+
+  def activate(self, name: str):
+    """ Activate the scene with this name. """
+    _scene=self._scenes.get(name)
+    if _scene is None: raise Exception(f"Scene '{name}' not found!")
+    self.log(f"activating scene '{name}'", debug=True)
+    _scene.activate()
+
+  def _write(self):
+    """ Write the scenes that were saved through the API into the scenes file. """
+    if self._path is None:
+      return
+    _scenes=[{"name": _name, "lights": self._scenes[_name].lights} for _name in self._saved]
+    # Write to a temporary file first so that we never leave a half written file behind on the SD card:
+    _tmp=f"{self._path}.tmp"
+    with open(_tmp, "w") as stream:
+      yaml.safe_dump({"scenes": _scenes}, stream, sort_keys=False)
+    os.replace(_tmp, self._path)
@@ -0,0 +1,188 @@
+"""
+This module contains the store that keeps the state of the lights across restarts of the app.
+
+The state of each light (on/off, brightness, color, behavior and its parameters) is journaled into a small
+append-only file, 1 JSON record per line:
+  {"light": "Loft", "settings": {"state": true, "brightness": 50, "color": {...}, "behavior": "Default", ...}}
+  {"shutdown": true}
+
+The SD card of a Raspberry PI doesn't like lots of small writes.  Changes are collected in memory and written
+by a background thread at most once every 'interval' seconds, with a single fsync.  A light that changes 10
+times within that interval only gets 1 record.  The journal is compacted (rewritten with only the latest record
+of each light) when it grows too long and every time the app starts.
+
+A clean shutdown appends a "shutdown" record.  If that record is missing at startup, the app was not stopped
+cleanly (typically a power loss) and the app may decide to keep the lights off instead of restoring them.
+A record that was only partially written when the power went out is ignored.
+
+This module requires these modules:
+- json, os and threading modules from the Python standard library;
+"""
+
+import json
+import os
+import sys
+import threading
+from time import sleep
+
+
+class StateStore:
+  """
+  Class to journal the state of the lights into a file and to restore it.
+  """
+
+  def __init__(self, path: str, interval: float=5.0, compactRecords: int=200):
+    """ Constructor.
+
+    Arguments:
+      path (str): the journal file;
+      interval (float): the minimum number of seconds between 2 writes to the file (default=5);
+      compactRecords (int): compact the journal when it has more records than this (default=200);
+    """
+    if not (interval > 0): raise Exception("The state store interval needs to be more than 0 seconds!")
+    self._debug=False
+    self._path=path
+    self._interval=interval
+    self._compactRecords=compactRecords
+    self._states={}               # light name -> latest settings that were written or loaded
+    self._pending={}              # light name -> Light object that changed since the last write
+    self._records=0               # number of records in the journal
+    self._lock=threading.Lock()
+    self._wakeup=threading.Event()
+    self._thread=None
+    self._closed=False
+
+  @property
+  def debug(self) -> bool:
+    """ Return the debug-flag that is set for the store. """
+    return self._debug
+
+  @debug.setter
+  def debug(self, flag: bool):
+    """ Set the debug level. """
+    self._debug=flag
+
+  @property
+  def path(self) -> str:
+    """ Return the path of the journal file. """
+    return self._path
+
+  def log(self, *args, debug: bool=False):
+    """ Simple function to log messages to the console. """
+    _log=True
+    if debug and not self._debug:
+      _log=False
+    if _log:
+      # We don't want to log the message as a list between '()' if we only got 1 element in the argument list:
+      if len(args) == 1:
+        print(f"{type(self)}: {args[0]}")
+      else:
+        print(f"{type(self)}: {args}")
+      # We need to flush the stdout buffer in python for log statements to reach the Linux systemd journal:
+      sys.stdout.flush()
+
+  def load(self) -> tuple:
+    """ Read the journal and return a tuple with the latest settings per light name (dict) and a flag that tells
+    if the app was shut down cleanly the last time (bool).
+    The journal is compacted right away so that the next start can tell if this run ends cleanly.
+    """
+    _states={}
+    _clean=True
+    _records=0
+    if os.path.exists(self._path):
+      with open(self._path, "r") as _file:
+        for _line in _file:
+          try:
+            _record=json.loads(_line)
+          except ValueError:
+            # The last record was only partially written when the power went out:
+            self.log(f"ignoring a corrupt record in {self._path}")
+            continue
+          _records+=1
+          if _record.get("shutdown"):
+            _clean=True
+          elif "light" in _record:
+            _states[_record["light"]]=_record.get("settings") or {}
+            _clean=False
+    self.log(f"loaded the state of {len(_states)} light(s) from {_records} record(s); clean shutdown: {_clean}", debug=True)
+    with self._lock:
+      self._states=dict(_states)
+      self._compact()
+    return (_states, _clean)
+
+  def start(self):
+    """ Start the background thread that writes the changes into the journal. """
+    if self._thread is None:
+      self._thread=threading.Thread(target=self._run, name="StateStore", daemon=True)
+      self._thread.start()
+
+  def changed(self, light):
+    """ Mark the light as changed.  Its settings are read and written when the next write is due. """
+    if self._closed:
+      return
+    with self._lock:
+      self._pending[light.name]=light
+    self._wakeup.set()
+
+  def _run(self):
+    """ Write the changes at most once per interval. """
+    while not self._closed:
+      self._wakeup.wait()
+      if self._closed:
+        break
+      # Give the light (and others) some time to settle before writing.  Everything that changes within the
+      # interval ends up in the same write:
+      self._wakeup.clear()
+      sleep(self._interval)
+      self.flush()
+
+  def flush(self):
+    """ Write the pending changes into the journal (with 1 fsync) and compact it when it's too long. """
+    with self._lock:
+      _pending=self._pending
+      self._pending={}
+      _lines=[]
+      for _name, light in _pending.items():
+        _settings=light.settings
+        if self._states.get(_name) != _settings:
+          self._states[_name]=_settings
+          _lines.append(json.dumps({"light": _name, "settings": _settings}))
+      if len(_lines) == 0:
+        return
+      if self._records + len(_lines) > self._compactRecords:
+        self._compact()
+      else:
+        self._append(_lines)
+    self.log(f"saved the state of {len(_lines)} light(s)", debug=True)
+
+  def close(self):
+    """ Write the pending changes and a "shutdown" record.  Changes after this are ignored. """
+    if self._closed:
+      return
+    self.flush()
+    self._closed=True
+    self._wakeup.set()
+    with self._lock:
+      self._append([json.dumps({"shutdown": True})])
+
+  def _append(self, lines: list):
+    """ Append records to the journal and make sure they're on the SD card. """
+    with open(self._path, "a") as _file:
+      _file.write("\n".join(lines) + "\n")
+      _file.flush()
+      os.fsync(_file.fileno())
+    self._records+=len(lines)
+
+  def _compact(self):
+    """ Rewrite the journal with only the latest record of each light. """
+    _lines=[json.dumps({"light": _name, "settings": _settings}) for _name, _settings in self._states.items()]
+    # Write a new file and swap it in, so that a power loss leaves either the old or the new journal behind:
+    _tmp=f"{self._path}.tmp"
+    with open(_tmp, "w") as _file:
+      if len(_lines) > 0:
+        _file.write("\n".join(_lines) + "\n")
+      _file.flush()
+      os.fsync(_file.fileno())
+    os.replace(_tmp, self._path)
+    self._records=len(_lines)
+    self.log(f"compacted {self._path} to {self._records} record(s)", debug=True)
@@ -0,0 +1,127 @@
+"""
+This module contains the manager of the ledstrip hardware resources.
+
+Setting up a rpi_ws281x PixelStrip (begin()) allocates a DMA channel, a PWM/PCM/SPI peripheral and a GPIO pin
+and tearing it down (ws2811_fini) releases them again, which blanks the strip.  The StripManager owns 1
+PixelStrip per GPIO pin and channel for the lifetime of the process.  The behaviors of a light ask the manager for
+the strip instead of creating their own, so switching between behaviors never sets up the hardware again.
+A strip only gets set up again when its hardware settings (number of leds, DMA channel, frequency, ...) change.
+
+This module requires these modules:
+- PixelStrip class from the rpi_ws281x module;
+- threading module (the behaviors ask for the strip from their own threads);
+"""
+
+import sys
+import threading
+from rpi_ws281x import PixelStrip
+
+
+class StripManager:
+  """
+  Class that owns the PixelStrip objects of the app, 1 per GPIO pin and channel.
+  """
+
+  def __init__(self):
+    """ Constructor. """
+    self._debug=False
+    self._strips={}               # (GPIO pin, channel) -> (hardware settings, PixelStrip)
+    self._lock=threading.Lock()
+    self._initializations=0       # number of times that a strip was set up (begin())
+    self._releases=0              # number of times that a strip was released (ws2811_fini)
+
+  @property
+  def debug(self) -> bool:
+    """ Return the debug-flag that is set for the manager. """
+    return self._debug
+
+  @debug.setter
+  def debug(self, flag: bool):
+    """ Set the debug level. """
+    self._debug=flag
+
+  @property
+  def stats(self) -> dict:
+    """ Return the number of strips and how many times strips were set up and released. """
+    with self._lock:
+      return {"strips": len(self._strips),
+              "initializations": self._initializations,
+              "releases": self._releases
+             }
+
+  def log(self, *args, debug: bool=False):
+    """ Simple function to log messages to the console. """
+    _log=True
+    if debug and not self._debug:
+      _log=False
+    if _log:
+      # We don't want to log the message as a list between '()' if we only got 1 element in the argument list:
+      if len(args) == 1:
+        print(f"{type(self)}: {args[0]}")
+      else:
+        print(f"{type(self)}: {args}")
+      # We need to flush the stdout buffer in python for log statements to reach the Linux systemd journal:
+      sys.stdout.flush()
+
+  @staticmethod
+  def _hardware(ledSettings: dict, stripType) -> tuple:
+    """ Return the hardware settings of a strip: the settings that need a new PixelStrip when they change. """
+    return (ledSettings["ledCount"], ledSettings["ledFrequency"], ledSettings["ledDmaChannel"], \
+            ledSettings["ledInvert"], stripType)
+
+  def acquire(self, ledSettings: dict, stripType) -> PixelStrip:
+    """ Return the strip on the GPIO pin and channel of the light's settings, setting it up the first time.
+
+    Arguments:
+      ledSettings (dict): the settings of the light (see ledstrip.Light);
+      stripType: the rpi_ws281x strip type (ws.SK6812_STRIP_GRBW, ...);
+    """
+    _key=(ledSettings["stripGpioPin"], ledSettings["ledChannel"])
+    _hardware=self._hardware(ledSettings, stripType)
+    with self._lock:
+      if _key in self._strips:
+        _current, _strip=self._strips[_key]
+        if _current == _hardware:
+          return _strip
+        # The hardware settings changed.  The strip needs to be set up again:
+        self.log(f"hardware settings of the strip on GPIO pin {_key[0]} changed: {_current} -> {_hardware}")
+        self._release(_key)
+      self.log(f"setting up the strip on GPIO pin {_key[0]} channel {_key[1]}: {ledSettings['ledCount']} leds")
+      # PixelStrip.__init__(self, num, pin, freq_hz=800000, dma=10, invert=False, brightness=255, \
+      #                           channel=0, strip_type=None, gamma=None):
+      _strip=PixelStrip(num=ledSettings["ledCount"], \
+                        pin=ledSettings["stripGpioPin"], \
+                        freq_hz=ledSettings["ledFrequency"], \
+                        dma=ledSettings["ledDmaChannel"], \
+                        invert=ledSettings["ledInvert"], \
+                        brightness=ledSettings["ledBrightness"], \
+                        channel=ledSettings["ledChannel"], \
+                        strip_type=stripType)
+      # Initialize the library (must be called once before other functions):
+      _strip.begin()
+      self._initializations+=1
+      self._strips[_key]=(_hardware, _strip)
+      return _strip
+
+  def release(self, gpioPin: int, channel: int=0):
+    """ Release the strip on a GPIO pin and channel (if there's one), freeing its DMA channel. """
+    with self._lock:
+      self._release((gpioPin, channel))
+
+  def _release(self, key: tuple):
+    """ Release a strip (the lock needs to be held). """
+    if key in self._strips:
+      _, _strip=self._strips.pop(key)
+      _strip._cleanup()
+      self._releases+=1
+      self.log(f"released the strip on GPIO pin {key[0]} channel {key[1]}", debug=True)
+
+  def releaseAll(self):
+    """ Release all the strips. """
+    with self._lock:
+      for _key in list(self._strips.keys()):
+        self._release(_key)
+
+
+# The manager that owns all the strips of the app:
+strips=StripManager()
@@ -0,0 +1,125 @@
+"""
+This module contains the switch bank: it reads the levels of all the GPIO input pins at once.
+
+Reading the switches 1 by 1 through RPi.GPIO costs a call into the library (and a register read) per switch.
+The levels of GPIO pins 0-31 are all in the same register of the GPIO block (GPLEV0) and /dev/gpiomem maps that
+block into user space without root access.  The switch bank reads that register once per scan and the switches
+take their own bit from it (see Switch.hasChanged()).  That makes scanning the switches at 1 kHz cheap enough.
+
+The chip is looked up in the device tree before the block gets mapped.  On hosts without /dev/gpiomem or with
+another chip (like the BCM2712 of the Raspberry PI 5, which has a GPIO block with another layout), read() returns
+None and the switches read their own pin through RPi.GPIO, like before.
+
+This module requires these modules:
+- mmap and os modules from the Python standard library;
+"""
+
+import mmap
+import os
+import sys
+
+
+class SwitchBank:
+  """
+  Class that reads the levels of GPIO pins 0-31 with a single register read.
+  """
+  # Offset of the GPIO Pin Level register 0 (pins 0-31) in the GPIO block of the BCM2835, BCM2836, BCM2837
+  # and BCM2711 chips:
+  GPLEV0=0x34
+  # Size of the GPIO block that /dev/gpiomem maps:
+  BLOCK_SIZE=4096
+  # The chips with that layout, as they show up in the device tree:
+  CHIPS=("brcm,bcm2835", "brcm,bcm2836", "brcm,bcm2837", "brcm,bcm2711")
+  # The chips (and boards) that the host is compatible with, as NUL-separated strings:
+  COMPATIBLE="/proc/device-tree/compatible"
+
+  def __init__(self, device: str="/dev/gpiomem"):
+    """ Constructor.
+
+    Arguments:
+      device (str): the device that maps the GPIO block (default=/dev/gpiomem);
+    """
+    self._debug=False
+    self._device=device
+    self._map=None                # mmap of the GPIO block
+    self._registers=None          # the GPIO block as 32-bit registers
+
+  @property
+  def debug(self) -> bool:
+    """ Return the debug-flag that is set for the switch bank. """
+    return self._debug
+
+  @debug.setter
+  def debug(self, flag: bool):
+    """ Set the debug level. """
+    self._debug=flag
+
+  @property
+  def device(self) -> str:
+    """ Return the device that maps the GPIO block. """
+    return self._device
+
+  @property
+  def mapped(self) -> bool:
+    """ Return True if the levels are read from the GPIO block and False if the switches read their own pin. """
+    return self._registers is not None
+
+  def log(self, *args, debug: bool=False):
+    """ Simple function to log messages to the console. """
+    _log=True
+    if debug and not self._debug:
+      _log=False
+    if _log:
+      # We don't want to log the message as a list between '()' if we only got 1 element in the argument list:
+      if len(args) == 1:
+        print(f"{type(self)}: {args[0]}")
+      else:
+        print(f"{type(self)}: {args}")
+      # We need to flush the stdout buffer in python for log statements to reach the Linux systemd journal:
+      sys.stdout.flush()
+
+  def open(self):
+    """ Map the GPIO block.  The switches read their own pins if that doesn't work on this host. """
+    if self._registers is not None or self._device is None:
+      return
+    _chip=self.chip()
+    if _chip is None:
+      self.log("unknown GPIO layout on this host: the switches read their own GPIO pin")
+      return
+    try:
+      _fd=os.open(self._device, os.O_RDONLY | os.O_SYNC)
+      try:
+        self._map=mmap.mmap(_fd, self.BLOCK_SIZE, mmap.MAP_SHARED, mmap.PROT_READ)
+      finally:
+        os.close(_fd)
+      # Index the block as 32-bit words so that a level read is a single 32-bit load:
+      self._registers=memoryview(self._map).cast("I")
+      self.log(f"reading the switches through {self._device} ({_chip})")
+    except (OSError, ValueError) as exc:
+      self.log(f"can't map {self._device} ({exc}): the switches read their own GPIO pin")
+
+  def chip(self) -> str:
+    """ Return the chip of the host if its GPIO block has the layout that we read (None if not or unknown). """
+    try:
+      with open(self.COMPATIBLE, "rb") as _file:
+        _compatible=_file.read().decode("ascii", "replace").split("\0")
+    except OSError:
+      return None
+    for _chip in self.CHIPS:
+      if _chip in _compatible:
+        return _chip
+    return None
+
+  def close(self):
+    """ Unmap the GPIO block. """
+    if self._registers is not None:
+      self._registers.release()
+      self._registers=None
+      self._map.close()
+      self._map=None
+
+  def read(self) -> int:
+    """ Return the levels of GPIO pins 0-31 as a bit mask (bit N is pin N) or None if the block isn't mapped. """
+    if self._registers is None:
+      return None
+    return self._registers[self.GPLEV0 >> 2]
@@ -1,5 +1,5 @@
-import urllib.request
-import asyncio
+import os
+import sys
 import json
 import flet
 from flet import (
@@ -17,6 +17,10 @@ from flet import (
 # https://github.com/flet-dev/flet-contrib/blob/main/flet_contrib/color_picker/src/color_picker.py
 from flet_contrib.color_picker import ColorPicker
 from typing import List
+# The client library is shared with the Kivy app.  Copy it next to this file before packaging the app:
+#   /> cp ../../../mobile_client/ledstrips_client.py .
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "mobile_client"))
+from ledstrips_client import LightsClient
 
 
 #---------------------------
@@ -25,11 +29,23 @@ from typing import List
 class App():
     def __init__(self):
         self._ledstrips: List[LedStrip] = list()
+        # The last known state of the lights is kept in a cache file, so the GUI doesn't wait for the network:
+        self._client = LightsClient(cachePath=os.path.join(os.path.expanduser("~"), ".ledstrips_cache.json"))
 
     def addStrip(self):
-#        self._ledstrips.append(LedStrip(name="Luna", endpoint="http://192.168.5.12:8888/light/Luna"))
-#        self._ledstrips.append(LedStrip(name="Bedroom", endpoint="http://192.168.5.10:8888/light/Bedroom"))
-        self._ledstrips.append(LedStrip(name="Loft", endpoint="http://192.168.5.11:8888/light/Loft"))
+#        self._ledstrips.append(LedStrip(name="Luna", endpoint="http://192.168.5.12:8888/light/Luna", client=self._client))
+#        self._ledstrips.append(LedStrip(name="Bedroom", endpoint="http://192.168.5.10:8888/light/Bedroom", client=self._client))
+        self._ledstrips.append(LedStrip(name="Loft", endpoint="http://192.168.5.11:8888/light/Loft", client=self._client))
+
+    def refresh(self):
+        # Fetch the state of all the strips at the same time (each strip updates as soon as its Pi answers):
+        self._client.fetchAll([strip._API_endpoint for strip in self._ledstrips],
+                              callback=lambda url, light: self._refreshed(url, light))
+
+    def _refreshed(self, url: str, light):
+        for strip in self._ledstrips:
+            if strip._API_endpoint == url:
+                strip.setMetadata(light)
 
     def list(self):
         for strip in self._ledstrips:
@@ -47,6 +63,8 @@ class App():
         ledstripsGUI.setPage(page)  # Needed for the Markdown control to open hyperlinks
         ledstripsGUI.setLedstrip(self._ledstrips[0])
         page.add(ledstripsGUI)
+        # The GUI was drawn from the cached state.  Get the current state in the background:
+        self.refresh()
 
 
 #---------------------------
@@ -63,30 +81,39 @@ class LedStrip():
     _WhiteValue: int = 0
     _BrightnessValue: int = 1
     _MetaData = None
-    def __init__(self, name: str, endpoint: str):
+    def __init__(self, name: str, endpoint: str, client: LightsClient):
         self._Name=name
         self._API_endpoint=endpoint
-        asyncio.run(self.getMetadata())
+        self._client=client
+        # Function to call when the state of the strip changes (set by the GUI):
+        self.on_change=None
+        # Start from the last known state (if any) until the Pi answers:
+        _light=self._client.cached(endpoint)
+        if _light is not None:
+            self.setMetadata(_light)
 
     def __str__(self) -> str:
         return f"Name: {self._Name} (led_count:{self._LedCount}, status:{self._Status})"
 
-    async def getMetadata(self):
-        # Get the status of the ledstrip:
-        try:
-            req=urllib.request.urlopen(self._API_endpoint)
-            res=req.read()
-            self._MetaData = json.loads(res.decode("utf-8"))
-            print(str(self._MetaData))
-            self._Status=self._MetaData["light"]["state"]
-            self._LedCount=self._MetaData["light"]["led-count"]
-            self._BrightnessValue=self._MetaData["light"]["brightness"]
-            self._RedValue=self._MetaData["light"]["color"]["red"]
-            self._GreenValue=self._MetaData["light"]["color"]["green"]
-            self._BlueValue=self._MetaData["light"]["color"]["blue"]
-            self._WhiteValue=self._MetaData["light"]["color"]["white"]
-        except Exception as e:
-            print(str(e))
+    def getMetadata(self):
+        # Get the status of the ledstrip in the background:
+        self._client.fetch(self._API_endpoint, callback=lambda url, light: self.setMetadata(light))
+
+    def setMetadata(self, light):
+        # The state of the ledstrip (or the exception if the Pi didn't answer):
+        if isinstance(light, Exception):
+            print(str(light))
+            return
+        self._MetaData = {"light": light}
+        self._Status=light["state"]
+        self._LedCount=light["led-count"]
+        self._BrightnessValue=light["brightness"]
+        self._RedValue=light["color"]["red"]
+        self._GreenValue=light["color"]["green"]
+        self._BlueValue=light["color"]["blue"]
+        self._WhiteValue=light["color"]["white"]
+        if self.on_change is not None:
+            self.on_change(self)
 
     def _sendData(self, toggle: bool):
         _behavior = "Default"   # "Default" or "Christmas"
@@ -103,15 +130,19 @@ class LedStrip():
                     "white": self._WhiteValue
                 }
             }
-            data=json.dumps(data)
-            data=data.encode('utf-8')
-            req=urllib.request.Request(self._API_endpoint, data=data)
-            req.add_header("Content-Type", "application/json")
-            contents = urllib.request.urlopen(req).read()
-            print(str(contents))
+            # Sent in the background over a kept-alive connection.  The answer has the new state of the strip.
+            # Color and brightness changes come in fast while the user plays with the controls.  Only the
+            # latest one matters, but each toggle needs to go out:
+            self._client.send(self._API_endpoint, data, callback=self._sent, replace=not toggle)
         except Exception as e:
             print(str(e))
 
+    def _sent(self, url: str, response):
+        if isinstance(response, Exception) or not "light" in response:
+            print(str(response))
+            return
+        self.setMetadata(response["light"])
+
     def toggle(self):
         self._sendData(toggle=True)
 
@@ -222,12 +253,17 @@ class LedstripContainer(Container):
             # Remove the pound sign ("#") from the color and feed it to the ledstrip:
             self._ledstrip.setColorHEX(color_picker.color[1:])
 
-        def toggle(e):
-            self._ledstrip.toggle()
-            self._ledstrip.getMetadata()
+        def changed(ledstrip):
+            # Called from the client's thread when the new state of the strip comes in:
+            self.result.value=ledstrip.getColorHEX()
             self.GenerateContainer()
             self._page.update()
 
+        def toggle(e):
+            self._ledstrip.toggle()
+
+        self._ledstrip.on_change=changed
+
         return flet.Column(
             [
                 color_picker,
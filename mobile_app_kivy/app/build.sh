@@ -2,6 +2,8 @@
 
 # Copy the .py file from project folder:
 cp ../ledstrips.py main.py
+# Copy the client library that is shared with the Flet app:
+cp ../../mobile_client/ledstrips_client.py .
 
 # Add comment to app:
 sed -i '1 i\#' main.py
@@ -2,10 +2,6 @@
 # THIS FILE IS AN EXACT COPY OF ledstrips.py!!!!
 # THIS FILE IS REQUIRED FOR BUILDOZER TO GENERATE THE ANDROID APP
 #
-# ToDo: - create a light class
-#       - turn each light into a light instance so we don't duplicate all the code
-#       - 
-
 # 20220119 - Kivy and KivyMD seem to have issues running in Python 3.10
 #            run: /> python3.9 ledstrips.py
 
@@ -26,11 +22,20 @@
 # For the APK build, make sure to have these installed (in Fedora in my case):
 #   https://buildozer.readthedocs.io/en/latest/installation.html#targeting-android
 #
-import urllib.request
-import json
+import os
+import sys
+
+# The client library is shared with the Flet app.  The Android build copies it next to main.py (see app/build.sh):
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "mobile_client"))
+from ledstrips_client import LightsClient
 
 import kivy
 kivy.require('2.2.1')
+from kivy.clock import Clock
+from kivy.metrics import dp
+from kivy.uix.boxlayout import BoxLayout
+from kivy.uix.gridlayout import GridLayout
+from kivy.uix.scrollview import ScrollView
 
 import kivymd
 from kivymd.app import MDApp
@@ -57,201 +62,255 @@ from kivymd.uix.selectioncontrol import MDCheckbox, MDSwitch
 #          kivymd                    0.104.1            pyhd8ed1ab_0    conda-forge
 #   /> conda update kivymd
 
+class LedStrip():
+  """
+  Class for the model of a ledstrip, with its state as returned by the '/light/<name>' endpoint of its Raspberry PI.
+  """
+  def __init__(self, url: str, name: str):
+    self.url=url
+    self.name=name
+    self.state=False
+    self.ledCount=0
+    self.red=0
+    self.green=0
+    self.blue=0
+    self.white=0
+    self.brightness=1
+    self.behavior="Default"
+
+  def update(self, light: dict):
+    """ Update the state of the strip with the state that came in from its Pi (or from the cache). """
+    self.name=light.get("name", self.name)
+    self.state=light["state"]
+    self.ledCount=light["led-count"]
+    self.brightness=light["brightness"]
+    self.red=light["color"]["red"]
+    self.green=light["color"]["green"]
+    self.blue=light["color"]["blue"]
+    self.white=light["color"]["white"]
+    self.behavior=light.get("behavior", self.behavior)
+
+  def payload(self, toggle: bool) -> dict:
+    """ Return the POST payload with the values of the strip. """
+    return {"action": "update",
+            "toggle": toggle,
+            "behavior": self.behavior,
+            "led-count": self.ledCount,
+            "brightness": self.brightness,
+            "color": {
+              "red": self.red,
+              "green": self.green,
+              "blue": self.blue,
+              "white": self.white
+            }
+    }
+
+
+class LedStripPanel(BoxLayout):
+  """
+  Class for the widgets of a ledstrip: a switch, a button with its name, a checkbox for the Christmas mode and
+  a slider per value.  The sliders are only created once the panel scrolls into view.
+  """
+  # The values of a strip that have a slider: (name, color, minimum)
+  _sliders=[("red", "red", 0),
+            ("green", "green", 0),
+            ("blue", "blue", 0),
+            ("white", "white", 0),
+            ("brightness", "black", 1)]
+  _headerHeight=dp(56)
+  _sliderHeight=dp(30)
+
+  def __init__(self, app, strip: LedStrip, **kwargs):
+    super().__init__(orientation="vertical",
+                     size_hint_y=None,
+                     height=self._headerHeight+len(self._sliders)*self._sliderHeight,
+                     **kwargs)
+    self._app=app
+    self.strip=strip
+    self.sliders=None
+    _header=BoxLayout(size_hint_y=None, height=self._headerHeight)
+    self.switch=MDSwitch(
+      active=strip.state,
+      size_hint_x=0.25,
+      on_release=lambda x: app.toggle(self)
+    )
+    _header.add_widget(self.switch)
+    self.button=MDFillRoundFlatButton(
+      text=strip.name,
+      font_size=24,
+      pos_hint={"center_y": 0.5},
+      on_press=lambda x: app.toggle(self)
+    )
+    _header.add_widget(self.button)
+    self.chkMode=MDCheckbox(
+      active=(strip.behavior == "Christmas"),
+      size_hint_x=0.25
+    )
+    _header.add_widget(self.chkMode)
+    self.add_widget(_header)
+    # The sliders go in here when the panel becomes visible:
+    self._body=BoxLayout(orientation="vertical")
+    self.add_widget(self._body)
+
+  def realize(self):
+    """ Create the sliders (the first time that the panel is visible). """
+    if self.sliders is not None:
+      return
+    self.sliders={}
+    for _value, _color, _min in self._sliders:
+      _slider=MDSlider(
+        min=_min,
+        max=255,
+        value=getattr(self.strip, _value),
+        color=_color,
+        hint=True,
+        hint_radius=4,
+        hint_bg_color=_color,
+        hint_text_color='black',
+        size_hint_x=0.9,
+        pos_hint={"center_x": 0.5}
+      )
+      _slider.bind(value=lambda slider, value: self._app.slide(self))
+      self.sliders[_value]=_slider
+      self._body.add_widget(_slider)
+
+  def show(self):
+    """ Update the widgets with the state of the strip. """
+    self.button.text=self.strip.name
+    self.switch.active=self.strip.state
+    if self.sliders is not None:
+      for _value in self.sliders:
+        self.sliders[_value].value=getattr(self.strip, _value)
+
+  def values(self) -> dict:
+    """ Return the values of the sliders (the values of the strip if there are no sliders yet). """
+    if self.sliders is None:
+      return {_value: getattr(self.strip, _value) for _value, _, _ in self._sliders}
+    return {_value: int(self.sliders[_value].value) for _value in self.sliders}
+
+  def behavior(self) -> str:
+    """ Return the behavior that is selected with the checkbox. """
+    return "Christmas" if self.chkMode.active else "Default"
+
+
 class LedstripsApp(MDApp):
-  _version = "v0.1.9"
-
-  _LunaURL="http://192.168.5.12:8888/light/Luna"
-  _LunaStatus=False
-  _LunaLedCount=0
-  _LunaRed=0
-  _LunaGreen=0
-  _LunaBlue=0
-  _LunaWhite=0
-  _LunaBrightness=1
-
-  _bedroomURL="http://192.168.5.10:8888/light/Bedroom"
-  _bedroomStatus=False
-  _bedroomLedCount=0
-  _bedroomRed=0
-  _bedroomGreen=0
-  _bedroomBlue=0
-  _bedroomWhite=0
-  _bedroomBrightness=1
-
-  _loftURL="http://192.168.5.11:8888/light/Loft"
-  _loftStatus=False
-  _loftLedCount=0
-  _loftRed=0
-  _loftGreen=0
-  _loftBlue=0
-  _loftWhite=0
-  _loftBrightness=1
+  _version = "v0.2.0"
+  # The Raspberry PIs that we know about.  The others are found on the network through mDNS.
+  # The lights of each Pi are found through its '/lights' endpoint:
+  _controllers=["http://192.168.5.11:8888",
+                "http://192.168.5.10:8888",
+                "http://192.168.5.12:8888"]
 
   def exit(self):
     MDApp.get_running_app().stop()
 
 
-  def loft(self, args):
-    self.text_log.text = ""
-    try:
-      # Determine if we should toggle the light on/off or simply update its values:
-      _red = int(self.sliderRed_loft.value)
-      _green = int(self.sliderGreen_loft.value)
-      _blue = int(self.sliderBlue_loft.value)
-      _white = int(self.sliderWhite_loft.value)
-      _brightness = int(self.sliderBrightness_loft.value)
-      if self._loftRed != _red or \
-         self._loftGreen != _green or \
-         self._loftBlue != _blue or \
-         self._loftWhite != _white or \
-         self._loftBrightness != _brightness:
-           _toggle=False
-      else:
-        _toggle=True
-
-      if self.chkMode_loft.active:
-        _behavior="Christmas"
-      else:
-        _behavior="Default"
-
-      data={"action": "update",
-            "toggle": _toggle,
-            "behavior": _behavior,
-            "led-count": self._loftLedCount,
-            "brightness": _brightness,
-            "color": {
-              "red": _red,
-              "green": _green,
-              "blue": _blue,
-              "white": _white
-            }
-      }
-#      print(data)
-      data=json.dumps(data)
-      data=data.encode('utf-8')
-      req=urllib.request.Request(self._loftURL, data=data)
-      req.add_header("Content-Type", "application/json")
-      contents = urllib.request.urlopen(req).read()
-      print(contents)
-      self.text_log.text = str(contents)
-      # Update the locally saved values:
-      self._loftRed=_red
-      self._loftGreen=_green
-      self._loftBlue=_blue
-      self._loftWhite=_white
-      self._loftBrightness=_brightness
-      # Update the switch in the GUI:
-      self._loftStatus=not self._loftStatus
-      self.switchStatus_loft.active=self._loftStatus
-    except Exception as e:
-      self.text_log.text = str(e)
+  def on_stop(self):
+    self._client.close()
 
 
-  def bedroom(self, args):
-    self.text_log.text = ""
-    try:
-      # Determine if we should toggle the light on/off or simply update its values:
-      _red = int(self.sliderRed_bedroom.value)
-      _green = int(self.sliderGreen_bedroom.value)
-      _blue = int(self.sliderBlue_bedroom.value)
-      _white = int(self.sliderWhite_bedroom.value)
-      _brightness = int(self.sliderBrightness_bedroom.value)
-      if self._bedroomRed != _red or \
-         self._bedroomGreen != _green or \
-         self._bedroomBlue != _blue or \
-         self._bedroomWhite != _white or \
-         self._bedroomBrightness != _brightness:
-           _toggle=False
-      else:
-        _toggle=True
-
-      if self.chkMode_bedroom.active:
-        _behavior="Christmas"
-      else:
-        _behavior="Default"
-
-      data={"action": "update",
-            "toggle": _toggle,
-            "behavior": _behavior,
-            "led-count": self._bedroomLedCount,
-            "brightness": _brightness,
-            "color": {
-              "red": _red,
-              "green": _green,
-              "blue": _blue,
-              "white": _white
-            }
-      }
-#      print(data)
-      data=json.dumps(data)
-      data=data.encode('utf-8')
-      req=urllib.request.Request(self._bedroomURL, data=data)
-      req.add_header("Content-Type", "application/json")
-      contents = urllib.request.urlopen(req).read()
-      self.text_log.text = str(contents)
-      # Update the locally saved values:
-      self._bedroomRed=_red
-      self._bedroomGreen=_green
-      self._bedroomBlue=_blue
-      self._bedroomWhite=_white
-      self._bedroomBrightness=_brightness
-    except Exception as e:
-      self.text_log.text = str(e)
-
-
-  def Luna(self, args):
+  def toggle(self, panel):
+    # The switch or the button of a strip got pressed.  Turn the strip on or off, or send the new values if the
+    # sliders moved while the strip was off:
     self.text_log.text = ""
-    try:
-      # Determine if we should toggle the light on/off or simply update its values:
-      _red = int(self.sliderRed_Luna.value)
-      _green = int(self.sliderGreen_Luna.value)
-      _blue = int(self.sliderBlue_Luna.value)
-      _white = int(self.sliderWhite_Luna.value)
-      _brightness = int(self.sliderBrightness_Luna.value)
-      if self._LunaRed != _red or \
-         self._LunaGreen != _green or \
-         self._LunaBlue != _blue or \
-         self._LunaWhite != _white or \
-         self._LunaBrightness != _brightness:
-           _toggle=False
-      else:
-        _toggle=True
-
-      if self.chkMode_Luna.active:
-        _behavior="Christmas"
-      else:
-        _behavior="Default"
-
-      data={"action": "update",
-            "toggle": _toggle,
-            "behavior": _behavior,
-            "led-count": self._LunaLedCount,
-            "brightness": _brightness,
-            "color": {
-              "red": _red,
-              "green": _green,
-              "blue": _blue,
-              "white": _white
-            }
-      }
-#      print(data)
-      data=json.dumps(data)
-      data=data.encode('utf-8')
-      req=urllib.request.Request(self._LunaURL, data=data)
-      req.add_header("Content-Type", "application/json")
-      contents = urllib.request.urlopen(req).read()
-      self.text_log.text = str(contents)
-      # Update the locally saved values:
-      self._LunaRed=_red
-      self._LunaGreen=_green
-      self._LunaBlue=_blue
-      self._LunaWhite=_white
-      self._LunaBrightness=_brightness
-    except Exception as e:
-      self.text_log.text = str(e)
+    _strip=panel.strip
+    _values=panel.values()
+    _toggle=all(_values[_value] == getattr(_strip, _value) for _value in _values)
+    for _value in _values:
+      setattr(_strip, _value, _values[_value])
+    _strip.behavior=panel.behavior()
+    # Sent in the background over a kept-alive connection (a toggle is never dropped):
+    self._client.send(_strip.url, _strip.payload(_toggle), callback=self._posted, replace=not _toggle)
+    if _toggle:
+      # Update the switch in the GUI:
+      _strip.state=not _strip.state
+      panel.switch.active=_strip.state
+
+
+  def slide(self, panel):
+    # Called for every move of a slider of a strip.  A strip that is on follows the sliders while they're dragged.
+    # The client only sends the latest values, at most 'maxRate' times per second:
+    _strip=panel.strip
+    if not _strip.state:
+      return
+    _values=panel.values()
+    if all(_values[_value] == getattr(_strip, _value) for _value in _values):
+      # Nothing changed (or the sliders got set to the state that came in from the Pi):
+      return
+    for _value in _values:
+      setattr(_strip, _value, _values[_value])
+    _strip.behavior=panel.behavior()
+    self._client.send(_strip.url, _strip.payload(False), callback=self._posted)
+
+
+  def _posted(self, url, response):
+    # Called from the thread of the client with the answer of the Pi (or the exception):
+    Clock.schedule_once(lambda dt: setattr(self.text_log, "text", str(response)))
+
+
+  def _browsed(self, new, moved):
+    # Called from the thread of the client when Pis showed up on the network or got a new address:
+    Clock.schedule_once(lambda dt: self._forget(moved))
+    self._client.discover(new, callback=self._discovered)
+
+
+  def _forget(self, controllers):
+    # Remove the panels of the strips of Pis that moved (they come back under their new address):
+    _prefixes=tuple(_controller + "/light/" for _controller in controllers)
+    for _url in [_url for _url in self._panels if _url.startswith(_prefixes)]:
+      self._list.remove_widget(self._panels.pop(_url))
+
+
+  def _discovered(self, url, light):
+    # Called from the thread of the client each time a light answered (or a Pi failed to).
+    # Widgets can only be touched from the Kivy thread:
+    Clock.schedule_once(lambda dt: self._refresh(url, light))
+
+
+  def _refresh(self, url, light):
+    if isinstance(light, Exception):
+      self.text_log.text = f"{url}: {light}"
+      return
+    _panel=self._panels.get(url)
+    if light is None:
+      # The strip is gone from its Pi:
+      if _panel is not None:
+        self._list.remove_widget(self._panels.pop(url))
+      return
+    if _panel is None:
+      _panel=self._addStrip(url, light)
+    _panel.strip.update(light)
+    _panel.show()
+
+
+  def _addStrip(self, url, light) -> LedStripPanel:
+    # Add the panel of a strip to the list:
+    _strip=LedStrip(url, light.get("name", url))
+    _strip.update(light)
+    _panel=LedStripPanel(self, _strip)
+    self._panels[url]=_panel
+    self._list.add_widget(_panel)
+    # The panel may be visible once the list has been laid out again:
+    _panel.bind(pos=self._realizeTrigger)
+    return _panel
+
+
+  def _realizeVisible(self, *args):
+    # Create the sliders of the panels that are (partly) visible in the scroll view:
+    _bottom=self._scroll.to_window(self._scroll.x, self._scroll.y)[1]
+    _top=_bottom+self._scroll.height
+    for _panel in self._panels.values():
+      if _panel.sliders is None:
+        _y=_panel.to_window(_panel.x, _panel.y)[1]
+        if _y < _top and _y+_panel.height > _bottom:
+          _panel.realize()
 
 
   def build(self):
+    # Talks to the Pis in the background and remembers the last known state of the lights:
+    self._client=LightsClient(cachePath=os.path.join(self.user_data_dir, "lights_cache.json"),
+                              registryPath=os.path.join(self.user_data_dir, "controllers.json"))
+    self._panels={}             # url -> LedStripPanel
     screen = MDScreen(
       md_bg_color=MDApp.get_running_app().theme_cls.primary_color
     )
@@ -282,369 +341,34 @@ class LedstripsApp(MDApp):
     )
     screen.add_widget(self.text_log)
 
-
-    #
-    # Button Loft:
-    #
-    # Get the status of the ledstrip:
-    try:
-      req=urllib.request.urlopen(self._loftURL)
-      res=req.read()
-      contents = json.loads(res.decode("utf-8"))
-#      self.text_log.text = str(contents)
-      print(contents)
-      self._loftStatus=contents["light"]["state"]
-      self._loftLedCount=contents["light"]["led-count"]
-      self._loftBrightness=contents["light"]["brightness"]
-      self._loftRed=contents["light"]["color"]["red"]
-      self._loftGreen=contents["light"]["color"]["green"]
-      self._loftBlue=contents["light"]["color"]["blue"]
-      self._loftWhite=contents["light"]["color"]["white"]
-    except Exception as e:
-      self.text_log.text = str(e)
-
-    _loft_pos=0.80
-    self.switchStatus_loft = MDSwitch(
-      active=self._loftStatus,
-      pos_hint={"center_x": 0.15, "center_y": _loft_pos},
-      size_hint_x=0.10,
-      size_hint_y=0.10,
-      on_release = self.loft
-    )
-    screen.add_widget(self.switchStatus_loft)
-    screen.add_widget(MDFillRoundFlatButton(
-      text="Loft",
-      font_size = 24,
-      pos_hint = {"center_x": 0.5, "center_y": _loft_pos},
-      on_press = self.loft
-    ))
-    self.chkMode_loft = MDCheckbox(
-      active=False,
-      pos_hint={"center_x": 0.80, "center_y": _loft_pos},
-      size_hint_x=0.10,
-      size_hint_y=0.10
+    # The list of ledstrips:
+    self._scroll=ScrollView(
+      pos_hint={"center_x": 0.5, "top": 0.92},
+      size_hint=(1, 0.78)
     )
-    screen.add_widget(self.chkMode_loft)
-    self.sliderRed_loft = MDSlider(
-      min=0,
-      max=255,
-      value=self._loftRed,
-      color='red',
-      hint=True,
-      hint_radius=4,
-      hint_bg_color='red',
-      hint_text_color='black',
-      pos_hint = {"center_x": 0.5, "center_y": _loft_pos-0.07},
-      size_hint_x=0.9,
-      size_hint_y=0.04
+    self._list=GridLayout(
+      cols=1,
+      spacing=dp(16),
+      size_hint_y=None
     )
-    screen.add_widget(self.sliderRed_loft)
-    self.sliderGreen_loft = MDSlider(
-      min=0,
-      max=255,
-      value=self._loftGreen,
-      color='green',
-      hint=True,
-      hint_radius=4,
-      hint_bg_color='green',
-      hint_text_color='black',
-      pos_hint = {"center_x": 0.5, "center_y": _loft_pos-0.10},
-      size_hint_x=0.9,
-      size_hint_y=0.04
-    )
-    screen.add_widget(self.sliderGreen_loft)
-    self.sliderBlue_loft = MDSlider(
-      min=0,
-      max=255,
-      value=self._loftBlue,
-      color='blue',
-      hint=True,
-      hint_radius=4,
-      hint_bg_color='blue',
-      hint_text_color='black',
-      pos_hint = {"center_x": 0.5, "center_y": _loft_pos-0.13},
-      size_hint_x=0.9,
-      size_hint_y=0.04
-    )
-    screen.add_widget(self.sliderBlue_loft)
-    self.sliderWhite_loft = MDSlider(
-      min=0,
-      max=255,
-      value=self._loftWhite,
-      color='white',
-      hint=True,
-      hint_radius=4,
-      hint_bg_color='white',
-      hint_text_color='black',
-      pos_hint = {"center_x": 0.5, "center_y": _loft_pos-0.16},
-      size_hint_x=0.9,
-      size_hint_y=0.04
-    )
-    screen.add_widget(self.sliderWhite_loft)
-    self.sliderBrightness_loft = MDSlider(
-      min=1,
-      max=255,
-      value=self._loftBrightness,
-      color='black',
-      hint=True,
-      hint_radius=4,
-      hint_bg_color='black',
-      hint_text_color='black',
-      pos_hint = {"center_x": 0.5, "center_y": _loft_pos-0.19},
-      size_hint_x=0.9,
-      size_hint_y=0.04
-    )
-    screen.add_widget(self.sliderBrightness_loft)
-
-
-    #
-    # Button Bedroom:
-    #
-    # Get the status of the ledstrip:
-    try:
-      req=urllib.request.urlopen(self._bedroomURL)
-      res=req.read()
-      contents = json.loads(res.decode("utf-8"))
-#      self.text_log.text = str(contents)
-      self._bedroomStatus=contents["light"]["state"]
-      self._bedroomLedCount=contents["light"]["led-count"]
-      self._bedroomBrightness=contents["light"]["brightness"]
-      self._bedroomRed=contents["light"]["color"]["red"]
-      self._bedroomGreen=contents["light"]["color"]["green"]
-      self._bedroomBlue=contents["light"]["color"]["blue"]
-      self._bedroomBlue=contents["light"]["color"]["white"]
-    except Exception as e:
-      self.text_log.text = str(e)
-
-    _bedroom_pos=0.55
-    self.switchStatus_bedroom = MDSwitch(
-      active=self._bedroomStatus,
-      pos_hint={"center_x": 0.15, "center_y": _bedroom_pos},
-      size_hint_x=0.10,
-      size_hint_y=0.10,
-      on_release = self.bedroom
-    )
-    screen.add_widget(self.switchStatus_bedroom)
-    screen.add_widget(MDFillRoundFlatButton(
-      text="Bedroom",
-      font_size = 24,
-      pos_hint = {"center_x": 0.5, "center_y": _bedroom_pos},
-      on_press = self.bedroom
-    ))
-    self.chkMode_bedroom = MDCheckbox(
-      active=False,
-      pos_hint={"center_x": 0.80, "center_y": _bedroom_pos},
-      size_hint_x=0.10,
-      size_hint_y=0.10
-    )
-    screen.add_widget(self.chkMode_bedroom)
-    self.sliderRed_bedroom = MDSlider(
-      min=0,
-      max=255,
-      value=self._bedroomRed,
-      color='red',
-      hint=True,
-      hint_radius=4,
-      hint_bg_color='red',
-      hint_text_color='black',
-      pos_hint = {"center_x": 0.5, "center_y": _bedroom_pos-0.07},
-      size_hint_x=0.9,
-      size_hint_y=0.04
-    )
-    screen.add_widget(self.sliderRed_bedroom)
-    self.sliderGreen_bedroom = MDSlider(
-      min=0,
-      max=255,
-      value=self._bedroomGreen,
-      color='green',
-      hint=True,
-      hint_radius=4,
-      hint_bg_color='green',
-      hint_text_color='black',
-      pos_hint = {"center_x": 0.5, "center_y": _bedroom_pos-0.10},
-      size_hint_x=0.9,
-      size_hint_y=0.04
-    )
-    screen.add_widget(self.sliderGreen_bedroom)
-    self.sliderBlue_bedroom = MDSlider(
-      min=0,
-      max=255,
-      value=self._bedroomBlue,
-      color='blue',
-      hint=True,
-      hint_radius=4,
-      hint_bg_color='blue',
-      hint_text_color='black',
-      pos_hint = {"center_x": 0.5, "center_y": _bedroom_pos-0.13},
-      size_hint_x=0.9,
-      size_hint_y=0.04
-    )
-    screen.add_widget(self.sliderBlue_bedroom)
-    self.sliderWhite_bedroom = MDSlider(
-      min=0,
-      max=255,
-      value=self._bedroomWhite,
-      color='white',
-      hint=True,
-      hint_radius=4,
-      hint_bg_color='white',
-      hint_text_color='black',
-      pos_hint = {"center_x": 0.5, "center_y": _bedroom_pos-0.16},
-      size_hint_x=0.9,
-      size_hint_y=0.04
-    )
-    screen.add_widget(self.sliderWhite_bedroom)
-    self.sliderBrightness_bedroom = MDSlider(
-      min=1,
-      max=255,
-      value=self._bedroomBrightness,
-      color='black',
-      hint=True,
-      hint_radius=4,
-      hint_bg_color='black',
-      hint_text_color='black',
-      pos_hint = {"center_x": 0.5, "center_y": _bedroom_pos-0.19},
-      size_hint_x=0.9,
-      size_hint_y=0.04
-    )
-    screen.add_widget(self.sliderBrightness_bedroom)
-
-
-    #
-    # Button Luna:
-    #
-    # Get the status of the ledstrip:
-    # {
-    #    "self": "http://192.168.5.12:8888/light/Luna",
-    #    "light": {
-    #      "name": "Luna",
-    #      "uri": "http://192.168.5.12:8888/light/Luna",
-    #      "state": false,
-    #      "led-count": 140,
-    #      "color": {
-    #        "red": 1,
-    #        "green": 1,
-    #        "blue": 1,
-    #        "white": 1
-    #      },
-    #      "brightness": 255
-    #    },
-    #    "switches": [
-    #      {
-    #        "name": "Desk",
-    #        "uri": "http://192.168.5.12:8888/light/Luna/switch/Desk",
-    #        "state": 1
-    #      }
-    #    ]
-    #  }
-    try:
-      req=urllib.request.urlopen(self._LunaURL)
-      res=req.read()
-      contents = json.loads(res.decode("utf-8"))
-#      self.text_log.text = str(contents)
-      self._LunaStatus=contents["light"]["state"]
-      self._LunaLedCount=contents["light"]["led-count"]
-      self._LunaBrightness=contents["light"]["brightness"]
-      self._LunaRed=contents["light"]["color"]["red"]
-      self._LunaGreen=contents["light"]["color"]["green"]
-      self._LunaBlue=contents["light"]["color"]["blue"]
-      self._LunaBlue=contents["light"]["color"]["white"]
-    except Exception as e:
-      self.text_log.text = str(e)
-
-    _Luna_pos=0.30
-    self.switchStatus_Luna = MDSwitch(
-      active=self._LunaStatus,
-      pos_hint={"center_x": 0.15, "center_y": _Luna_pos},
-      size_hint_x=0.10,
-      size_hint_y=0.10,
-      on_release = self.Luna
-    )
-    screen.add_widget(self.switchStatus_Luna)
-    screen.add_widget(MDFillRoundFlatButton(
-      text="Luna",
-      font_size = 24,
-      pos_hint = {"center_x": 0.5, "center_y": _Luna_pos},
-      on_press = self.Luna
-    ))
-    self.chkMode_Luna = MDCheckbox(
-      active=False,
-      pos_hint={"center_x": 0.80, "center_y": _Luna_pos},
-      size_hint_x=0.10,
-      size_hint_y=0.10
-    )
-    screen.add_widget(self.chkMode_Luna)
-    self.sliderRed_Luna = MDSlider(
-      min=0,
-      max=255,
-      value=self._LunaRed,
-      color='red',
-      hint=True,
-      hint_radius=4,
-      hint_bg_color='red',
-      hint_text_color='black',
-      pos_hint = {"center_x": 0.5, "center_y": _Luna_pos-0.07},
-      size_hint_x=0.9,
-      size_hint_y=0.04
-    )
-    screen.add_widget(self.sliderRed_Luna)
-    self.sliderGreen_Luna = MDSlider(
-      min=0,
-      max=255,
-      value=self._LunaGreen,
-      color='green',
-      hint=True,
-      hint_radius=4,
-      hint_bg_color='green',
-      hint_text_color='black',
-      pos_hint = {"center_x": 0.5, "center_y": _Luna_pos-0.10},
-      size_hint_x=0.9,
-      size_hint_y=0.04
-    )
-    screen.add_widget(self.sliderGreen_Luna)
-    self.sliderBlue_Luna = MDSlider(
-      min=0,
-      max=255,
-      value=self._LunaBlue,
-      color='blue',
-      hint=True,
-      hint_radius=4,
-      hint_bg_color='blue',
-      hint_text_color='black',
-      pos_hint = {"center_x": 0.5, "center_y": _Luna_pos-0.13},
-      size_hint_x=0.9,
-      size_hint_y=0.04
-    )
-    screen.add_widget(self.sliderBlue_Luna)
-    self.sliderWhite_Luna = MDSlider(
-      min=0,
-      max=255,
-      value=self._LunaWhite,
-      color='white',
-      hint=True,
-      hint_radius=4,
-      hint_bg_color='white',
-      hint_text_color='black',
-      pos_hint = {"center_x": 0.5, "center_y": _Luna_pos-0.16},
-      size_hint_x=0.9,
-      size_hint_y=0.04
-    )
-    screen.add_widget(self.sliderWhite_Luna)
-    self.sliderBrightness_Luna = MDSlider(
-      min=1,
-      max=255,
-      value=self._LunaBrightness,
-      color='black',
-      hint=True,
-      hint_radius=4,
-      hint_bg_color='black',
-      hint_text_color='black',
-      pos_hint = {"center_x": 0.5, "center_y": _Luna_pos-0.19},
-      size_hint_x=0.9,
-      size_hint_y=0.04
-    )
-    screen.add_widget(self.sliderBrightness_Luna)
-
+    self._list.bind(minimum_height=self._list.setter("height"))
+    self._scroll.add_widget(self._list)
+    # Check which panels are visible after scrolling or a new layout (once per frame at most):
+    self._realizeTrigger=Clock.create_trigger(self._realizeVisible)
+    self._scroll.bind(scroll_y=self._realizeTrigger, size=self._realizeTrigger)
+    self._list.bind(pos=self._realizeTrigger, height=self._realizeTrigger)
+    screen.add_widget(self._scroll)
+
+    # The Pis that were found on the network before and the ones that we know about:
+    _controllers=self._client.controllers(self._controllers)
+    # Start from the strips that were found the last time (the screen doesn't wait for the network):
+    for _url in self._client.cachedUrls(_controllers):
+      self._addStrip(_url, self._client.cached(_url))
+    # Find the strips of all the Pis and get their state at the same time.  Each strip shows up (or gets updated)
+    # as soon as its Pi answers:
+    self._client.discover(_controllers, callback=self._discovered)
+    # Meanwhile, look for Pis on the network (now and every minute):
+    self._client.browse(callback=self._browsed, interval=60)
 
     # Setting it in stone:
     return screen
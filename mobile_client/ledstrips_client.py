@@ -0,0 +1,842 @@
+"""
+This module contains the client library that the mobile apps use to talk to the ceiling lights controllers.
+
+The apps used to fetch the state of each light with a blocking urllib call, 1 light after the other, so the UI
+only showed up after all the controllers answered (or timed out).  This library:
+- runs an asyncio event loop in a background thread, so the UI thread never waits for the network;
+- keeps a pool of keep-alive connections per controller, so repeated POSTs (like dragging a slider) reuse the
+  same connection instead of setting up a new one per request;
+- fetches the state of all the lights in parallel, with a timeout per controller, so a dead Raspberry PI only
+  delays its own lights;
+- keeps the last known state of each light in a cache file, so the UI can be drawn right away at startup and
+  gets updated when the fresh state comes in;
+- finds the controllers on the local network through mDNS (DNS-SD), and remembers them in a registry file, so
+  the apps talk to all of them at startup without hard-coded IP addresses or waiting on addresses that changed;
+- sends the commands of the UI latest-wins: a slider that gets dragged produces a stream of updates of which
+  only the newest one per light matters.  Updates that didn't go out yet get replaced, a request that is still
+  on its way gets cancelled when a newer update comes in and the number of requests per second is limited, so
+  the Raspberry PI doesn't get flooded;
+
+Classes in this module:
+- 'Response': the status, headers and body of an HTTP response;
+- 'HttpClient': an asyncio HTTP/1.1 client with a pool of keep-alive connections per host;
+- 'StateCache': the last known state of the lights, saved in a JSON file;
+- 'CommandSender': sends the commands to the lights latest-wins and rate limited;
+- 'ServiceBrowser': finds the controllers on the local network with an mDNS query;
+- 'ControllerRegistry': the controllers that were found, saved in a JSON file;
+- 'LightsClient': runs the HTTP client on a background event loop for the (synchronous) UI code;
+
+This module only needs the Python standard library, so it runs on Android as it is.
+"""
+
+import asyncio
+import json
+import os
+import socket
+import ssl
+import struct
+import sys
+import threading
+from urllib.parse import urlsplit
+
+# The mDNS (DNS-SD) service type that the lights service advertises itself as (see ceiling_lights/ledstrip_api.py):
+SERVICE_TYPE="_ledstrips._tcp.local."
+_MDNS_ADDRESS=("224.0.0.251", 5353)
+# DNS record types:
+_A=1
+_PTR=12
+_TXT=16
+_SRV=33
+
+
+class Response:
+  """
+  Class with the status, headers and body of an HTTP response.
+  """
+
+  def __init__(self, status: int, headers: dict, body: bytes):
+    """ Constructor.
+
+    Arguments:
+      status (int): the HTTP status code;
+      headers (dict): the headers (with lower case names);
+      body (bytes): the body;
+    """
+    self.status=status
+    self.headers=headers
+    self.body=body
+
+  def json(self):
+    """ Return the body parsed as JSON. """
+    return json.loads(self.body.decode("utf-8"))
+
+
+class HttpClient:
+  """
+  Class for an asyncio HTTP/1.1 client that keeps the connections to each host open for the next request.
+  All the methods need to be called from the same event loop.
+  """
+
+  def __init__(self, timeout: float=3, timeouts: dict=None, maxConnections: int=4):
+    """ Constructor.
+
+    Arguments:
+      timeout (float): the default number of seconds that a request may take (default=3);
+      timeouts (dict): host -> number of seconds, for the hosts that need another timeout (default=None);
+      maxConnections (int): the maximum number of connections per host (default=4);
+    """
+    self._debug=False
+    self._timeout=timeout
+    self._timeouts=dict(timeouts or {})
+    self._maxConnections=maxConnections
+    self._idle={}                 # (scheme, host, port) -> list of idle (reader, writer) connections
+    self._slots={}                # (scheme, host, port) -> semaphore that limits the connections to the host
+    self._connections=0           # number of connections that were opened
+    self._requests=0              # number of requests that were sent
+
+  @property
+  def debug(self) -> bool:
+    """ Return the debug-flag that is set for the client. """
+    return self._debug
+
+  @debug.setter
+  def debug(self, flag: bool):
+    """ Set the debug level. """
+    self._debug=flag
+
+  @property
+  def stats(self) -> dict:
+    """ Return the number of requests and the number of connections that were opened for them. """
+    return {"requests": self._requests, "connections": self._connections}
+
+  def log(self, *args, debug: bool=False):
+    """ Simple function to log messages to the console. """
+    _log=True
+    if debug and not self._debug:
+      _log=False
+    if _log:
+      # We don't want to log the message as a list between '()' if we only got 1 element in the argument list:
+      if len(args) == 1:
+        print(f"{type(self)}: {args[0]}")
+      else:
+        print(f"{type(self)}: {args}")
+      sys.stdout.flush()
+
+  def timeout(self, host: str) -> float:
+    """ Return the number of seconds that a request to a host may take. """
+    return self._timeouts.get(host, self._timeout)
+
+  def setTimeout(self, host: str, seconds: float):
+    """ Set the number of seconds that a request to a host may take. """
+    if not (seconds > 0): raise Exception("The timeout needs to be more than 0 seconds!")
+    self._timeouts[host]=seconds
+
+  async def request(self, method: str, url: str, body: bytes=None, headers: dict=None, timeout: float=None) -> Response:
+    """ Send a request and return the response.  Raises an exception if the host doesn't answer in time.
+
+    Arguments:
+      method (str): GET, POST, PUT, ...;
+      url (str): http:// or https:// url;
+      body (bytes): the body of the request (default=None);
+      headers (dict): extra headers (default=None);
+      timeout (float): number of seconds that the request may take (default=None -> the timeout of the host);
+    """
+    _url=urlsplit(url)
+    if not _url.scheme in ("http", "https"): raise Exception(f"Can't send a request to '{url}'!")
+    _key=(_url.scheme, _url.hostname, _url.port or (443 if _url.scheme == "https" else 80))
+    _path=(_url.path or "/") + (f"?{_url.query}" if _url.query else "")
+    _headers={"Host": _url.netloc, "Connection": "keep-alive", "Content-Length": str(len(body or b""))}
+    _headers.update(headers or {})
+    _request=f"{method} {_path} HTTP/1.1\r\n".encode("latin-1") + \
+             "".join(f"{_name}: {_value}\r\n" for _name, _value in _headers.items()).encode("latin-1") + \
+             b"\r\n" + (body or b"")
+    return await asyncio.wait_for(self._send(_key, _request), timeout or self.timeout(_url.hostname))
+
+  async def _send(self, key: tuple, request: bytes) -> Response:
+    """ Send a request over a pooled connection to the host (or a new one) and read the response. """
+    if not key in self._slots:
+      # Created here, so that the semaphore belongs to the event loop that runs the requests:
+      self._slots[key]=asyncio.Semaphore(self._maxConnections)
+    async with self._slots[key]:
+      self._requests+=1
+      while True:
+        _idle=self._idle.get(key, [])
+        _reused=len(_idle) > 0
+        if _reused:
+          reader, writer=_idle.pop()
+        else:
+          reader, writer=await asyncio.open_connection(key[1], key[2], ssl=ssl.create_default_context() if key[0] == "https" else None)
+          self._connections+=1
+          self.log(f"connected to {key[1]}:{key[2]}", debug=True)
+        _keep=False
+        try:
+          writer.write(request)
+          await writer.drain()
+          response, _keep=await self._readResponse(reader)
+          return response
+        except (ConnectionError, asyncio.IncompleteReadError) as exc:
+          if not _reused:
+            raise
+          # The host closed the connection while it was idle.  Try again on a new connection:
+          self.log(f"idle connection to {key[1]}:{key[2]} was closed ({exc})", debug=True)
+        finally:
+          if _keep:
+            self._idle.setdefault(key, []).append((reader, writer))
+          else:
+            # Also when the request timed out or got cancelled halfway: the connection is of no use anymore.
+            writer.close()
+
+  async def _readResponse(self, reader) -> tuple:
+    """ Read a response and return it with a flag that tells if the connection can be used again. """
+    _status=(await reader.readline()).decode("latin-1").split(None, 2)
+    if len(_status) < 2: raise ConnectionError("the connection was closed")
+    _version=_status[0]
+    _headers={}
+    while True:
+      _line=(await reader.readline()).decode("latin-1").strip()
+      if _line == "":
+        break
+      _name, _, _value=_line.partition(":")
+      _headers[_name.strip().lower()]=_value.strip()
+    _connection=_headers.get("connection", "").lower()
+    _keep=(_version == "HTTP/1.1" and _connection != "close") or _connection == "keep-alive"
+    if _headers.get("transfer-encoding", "").lower() == "chunked":
+      _body=bytearray()
+      while True:
+        _size=int((await reader.readline()).split(b";")[0], 16)
+        if _size == 0:
+          # Skip the trailers:
+          while (await reader.readline()).strip() != b"":
+            pass
+          break
+        _body+=await reader.readexactly(_size)
+        await reader.readexactly(2)
+      _body=bytes(_body)
+    elif "content-length" in _headers:
+      _body=await reader.readexactly(int(_headers["content-length"]))
+    else:
+      # The body ends when the host closes the connection:
+      _body=await reader.read()
+      _keep=False
+    return Response(int(_status[1]), _headers, _body), _keep
+
+  async def getJSON(self, url: str, timeout: float=None):
+    """ Return the JSON body of a GET request. """
+    return (await self.request("GET", url, timeout=timeout)).json()
+
+  async def postJSON(self, url: str, payload, timeout: float=None):
+    """ POST a JSON payload and return the JSON body of the response. """
+    _response=await self.request("POST", url, body=json.dumps(payload).encode("utf-8"), \
+                                  headers={"Content-Type": "application/json"}, timeout=timeout)
+    return _response.json()
+
+  async def close(self):
+    """ Close the idle connections. """
+    for _connections in self._idle.values():
+      for _, writer in _connections:
+        writer.close()
+    self._idle={}
+
+
+class StateCache:
+  """
+  Class that keeps the last known state of the lights (as returned by the '/light/<name>' endpoint) in a JSON file.
+  """
+
+  def __init__(self, path: str=None):
+    """ Constructor loading the cache file (if there is one).
+
+    Arguments:
+      path (str): the cache file (default=None -> only keep the states in memory);
+    """
+    self._path=path
+    self._lights={}               # url of the light -> its last known state
+    self._lock=threading.Lock()
+    if path is not None and os.path.exists(path):
+      try:
+        with open(path, "r") as _file:
+          self._lights=json.load(_file)
+      except (OSError, ValueError):
+        # A broken cache is no reason not to start.  It gets written again with the next state:
+        self._lights={}
+
+  @property
+  def urls(self) -> list:
+    """ Return the urls of the lights in the cache. """
+    with self._lock:
+      return list(self._lights.keys())
+
+  def get(self, url: str) -> dict:
+    """ Return the last known state of a light (None if it's not in the cache). """
+    with self._lock:
+      return self._lights.get(url)
+
+  def put(self, url: str, light: dict):
+    """ Save the state of a light. """
+    with self._lock:
+      if self._lights.get(url) == light:
+        return
+      self._lights[url]=light
+      self._save()
+
+  def remove(self, url: str):
+    """ Forget a light. """
+    with self._lock:
+      if self._lights.pop(url, None) is not None:
+        self._save()
+
+  def _save(self):
+    """ Write the cache file (with the lock held). """
+    if self._path is not None:
+      try:
+        # Write a new file and swap it in, so that a crash never leaves half a cache behind:
+        with open(self._path + ".tmp", "w") as _file:
+          json.dump(self._lights, _file)
+        os.replace(self._path + ".tmp", self._path)
+      except OSError:
+        pass
+
+
+class CommandSender:
+  """
+  Class that sends commands (POST payloads) to the lights.  Each light has its own queue:
+  - a command that can be replaced (like the values of a slider that is being dragged) replaces the commands of
+    the light that can be replaced and are still waiting;
+  - a request that can be replaced and that takes longer than 1/maxRate seconds gets cancelled as soon as there's
+    a newer command, so a light that is slow to answer doesn't hold back the newest values.  Requests that are
+    answered in time are not cancelled: the light got them anyway and the connection can be used again;
+  - a command that can't be replaced (like a toggle) is always sent, in the order that it came in;
+  - the requests to a light are spaced at least 1/maxRate seconds apart;
+  The callbacks are only called with the answer to the newest command of a light.  The answers to older commands
+  are outdated by the time they come in.
+  All the methods need to be called from the event loop of the HTTP client (LightsClient.send() takes care of that).
+  """
+
+  def __init__(self, http: HttpClient, cache: StateCache, maxRate: float=10):
+    """ Constructor.
+
+    Arguments:
+      http (HttpClient): the client that sends the requests;
+      cache (StateCache): gets the state of the lights from the answers;
+      maxRate (float): the maximum number of requests per second per light (default=10);
+    """
+    self._http=http
+    self._cache=cache
+    self.maxRate=maxRate
+    self._queues={}               # url -> list of (payload, callback, replace) that still need to be sent
+    self._inflight={}             # url -> (task, cancel) of the request that is on its way
+    self._workers={}              # url -> task sending the queue of the light
+    self._lastSent={}             # url -> loop time of the last request to the light
+    self._sent=0                  # number of requests that were sent
+    self._replaced=0              # number of commands that got replaced before they were sent
+    self._cancelled=0             # number of requests that got cancelled on their way
+
+  @property
+  def maxRate(self) -> float:
+    """ Return the maximum number of requests per second per light. """
+    return self._maxRate
+
+  @maxRate.setter
+  def maxRate(self, value: float):
+    """ Set the maximum number of requests per second per light. """
+    if not (value > 0): raise Exception("The maximum request rate needs to be more than 0!")
+    self._maxRate=value
+
+  @property
+  def stats(self) -> dict:
+    """ Return the number of requests that were sent, the commands that got replaced before they went out and the
+    requests that got cancelled on their way.
+    """
+    return {"sent": self._sent, "replaced": self._replaced, "cancelled": self._cancelled}
+
+  def queue(self, url: str, payload: dict, callback=None, replace: bool=True):
+    """ Queue a command for a light.
+
+    Arguments:
+      url (str): the '/light/<name>' url of the light;
+      payload (dict): the JSON payload;
+      callback: optional function(url, response) that is called with the JSON response or the exception;
+      replace (bool): True if a newer command may replace this one (default=True);
+    """
+    _queue=self._queues.setdefault(url, [])
+    if replace:
+      # Drop the replaceable commands at the end of the queue (those after the last command that needs to go out):
+      while len(_queue) > 0 and _queue[-1][2]:
+        _queue.pop()
+        self._replaced+=1
+      self._cancel(url)
+    _queue.append((payload, callback, replace))
+    if not url in self._workers:
+      self._workers[url]=asyncio.get_event_loop().create_task(self._send(url))
+
+  def _cancel(self, url: str):
+    """ Cancel the request of a light that is on its way if it's overdue and may be replaced. """
+    _inflight=self._inflight.get(url)
+    if _inflight is not None and _inflight[1] and not _inflight[0].done():
+      _inflight[0].cancel()
+      self._cancelled+=1
+
+  async def _send(self, url: str):
+    """ Send the queue of a light until it's empty. """
+    _loop=asyncio.get_event_loop()
+    _queue=self._queues[url]
+    try:
+      while len(_queue) > 0:
+        _wait=self._lastSent.get(url, 0) + 1 / self._maxRate - _loop.time()
+        if _wait > 0:
+          # Newer commands that come in while we wait replace the one at the end of the queue:
+          await asyncio.sleep(_wait)
+        payload, callback, replace=_queue.pop(0)
+        self._lastSent[url]=_loop.time()
+        self._sent+=1
+        _task=_loop.create_task(self._http.postJSON(url, payload))
+        self._inflight[url]=(_task, False)
+        # Not 'await _task', which would cancel us too when the request gets cancelled:
+        _done, _=await asyncio.wait([_task], timeout=1 / self._maxRate)
+        if len(_done) == 0:
+          # The light is slow to answer.  From here on a newer command cancels the request:
+          self._inflight[url]=(_task, replace)
+          if len(_queue) > 0 and _queue[-1][2]:
+            self._cancel(url)
+          await asyncio.wait([_task])
+        del self._inflight[url]
+        if _task.cancelled():
+          continue
+        try:
+          _result=_task.result()
+        except Exception as exc:
+          _result=exc
+        if len(_queue) > 0:
+          # There's a newer command on its way, which makes this answer outdated:
+          continue
+        if not isinstance(_result, Exception) and _result.get("light") is not None:
+          self._cache.put(url, _result["light"])
+        if callback is not None:
+          callback(url, _result)
+    finally:
+      del self._workers[url]
+
+
+def _dnsName(name: str) -> bytes:
+  """ Return a domain name in the DNS wire format. """
+  return b"".join(bytes([len(_label)]) + _label for _label in \
+                  [_part.encode("utf-8") for _part in name.rstrip(".").split(".")]) + b"\0"
+
+
+def _readName(packet: bytes, offset: int) -> tuple:
+  """ Read a (compressed) domain name from a DNS packet and return it with the offset of what comes after it. """
+  _labels=[]
+  _end=None
+  # The number of jumps is limited, so that a broken packet can't send us in circles:
+  for _ in range(128):
+    _length=packet[offset]
+    if _length >= 0xC0:
+      # Pointer to a name (or the end of it) somewhere else in the packet:
+      if _end is None:
+        _end=offset+2
+      offset=((_length & 0x3F) << 8) | packet[offset+1]
+    elif _length == 0:
+      return ".".join(_labels) + ".", offset+1 if _end is None else _end
+    else:
+      _labels.append(packet[offset+1:offset+1+_length].decode("utf-8", "replace"))
+      offset+=1+_length
+  raise ValueError("the DNS name doesn't end")
+
+
+def _readRecords(packet: bytes) -> list:
+  """ Return the resource records (name, type, data) in a DNS response.  The data of the record types that we
+  need is decoded: PTR -> name; SRV -> (port, target); TXT -> dictionary; A -> IPv4 address.
+  """
+  _questions, _answers, _authorities, _additionals=struct.unpack("!4H", packet[4:12])
+  _offset=12
+  for _ in range(_questions):
+    _, _offset=_readName(packet, _offset)
+    _offset+=4
+  _records=[]
+  for _ in range(_answers + _authorities + _additionals):
+    _name, _offset=_readName(packet, _offset)
+    _type, _, _, _length=struct.unpack("!HHIH", packet[_offset:_offset+10])
+    _offset+=10
+    _data=packet[_offset:_offset+_length]
+    if _type == _PTR:
+      _data=_readName(packet, _offset)[0]
+    elif _type == _SRV:
+      _data=(struct.unpack("!H", _data[4:6])[0], _readName(packet, _offset+6)[0])
+    elif _type == _TXT:
+      _properties={}
+      _index=0
+      while _index < len(_data):
+        _key, _, _value=_data[_index+1:_index+1+_data[_index]].decode("utf-8", "replace").partition("=")
+        _properties[_key]=_value
+        _index+=1+_data[_index]
+      _data=_properties
+    elif _type == _A and _length == 4:
+      _data=socket.inet_ntoa(_data)
+    _records.append((_name, _type, _data))
+    _offset+=_length
+  return _records
+
+
+class _MdnsProtocol(asyncio.DatagramProtocol):
+  """ Collects the answers to an mDNS query. """
+
+  def __init__(self):
+    self.packets=[]
+
+  def datagram_received(self, data: bytes, address: tuple):
+    self.packets.append((data, address))
+
+
+class ServiceBrowser:
+  """
+  Class that finds the lights controllers on the local network with an mDNS (DNS-SD) query.
+  The query goes out from a random port instead of the mDNS port, which makes the controllers answer straight
+  to us.  So we don't need to join the mDNS multicast group (Android only lets apps with a multicast lock do that).
+  """
+
+  def __init__(self, serviceType: str=SERVICE_TYPE, timeout: float=1.5):
+    """ Constructor.
+
+    Arguments:
+      serviceType (str): the DNS-SD service type to look for (default='_ledstrips._tcp.local.');
+      timeout (float): the number of seconds to wait for answers (default=1.5);
+    """
+    self._serviceType=serviceType
+    self._timeout=timeout
+
+  def query(self) -> bytes:
+    """ Return the mDNS query for the PTR records of the service type. """
+    # 1 question, asking for a unicast answer (top bit of the class):
+    return struct.pack("!6H", 0, 0, 1, 0, 0, 0) + _dnsName(self._serviceType) + struct.pack("!HH", _PTR, 0x8001)
+
+  async def browse(self) -> list:
+    """ Query the network and return the controllers that answered, as a list of dictionaries:
+      {"name": <instance name>, "url": "http://<address>:<port>", "lights": [<names>], "properties": {<TXT record>}}
+    """
+    _loop=asyncio.get_event_loop()
+    _protocol=_MdnsProtocol()
+    _socket=socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    _socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 255)
+    _socket.bind(("", 0))
+    _socket.setblocking(False)
+    _transport, _=await _loop.create_datagram_endpoint(lambda: _protocol, sock=_socket)
+    try:
+      # Ask twice, in case the first query gets lost (multicast over WiFi isn't reliable):
+      _transport.sendto(self.query(), _MDNS_ADDRESS)
+      await asyncio.sleep(self._timeout / 3)
+      _transport.sendto(self.query(), _MDNS_ADDRESS)
+      await asyncio.sleep(self._timeout * 2 / 3)
+    finally:
+      _transport.close()
+    return self.services(_protocol.packets)
+
+  def services(self, packets: list) -> list:
+    """ Return the controllers in the answers (list of (packet, address)). """
+    _services={}
+    for _packet, _address in packets:
+      try:
+        _records=_readRecords(_packet)
+      except (ValueError, IndexError, struct.error):
+        continue
+      # DNS names are not case sensitive:
+      _instances=[_data for _name, _type, _data in _records if _type == _PTR and _name.lower() == self._serviceType.lower()]
+      _srv={_name.lower(): _data for _name, _type, _data in _records if _type == _SRV}
+      _txt={_name.lower(): _data for _name, _type, _data in _records if _type == _TXT}
+      _addresses={}
+      for _name, _type, _data in _records:
+        if _type == _A and isinstance(_data, str):
+          _addresses.setdefault(_name.lower(), []).append(_data)
+      for _instance in _instances:
+        if not _instance.lower() in _srv:
+          continue
+        _port, _target=_srv[_instance.lower()]
+        # Prefer the address that the answer came from, which we know we can reach:
+        _ips=_addresses.get(_target.lower(), [])
+        _ip=_address[0] if (_address[0] in _ips or len(_ips) == 0) else _ips[0]
+        _properties=_txt.get(_instance.lower(), {})
+        _name=_instance[:-len(self._serviceType)-1] if _instance.lower().endswith("." + self._serviceType.lower()) else _instance
+        _services[_name]={"name": _name,
+                          "url": f"http://{_ip}:{_port}",
+                          "lights": [_light for _light in _properties.get("lights", "").split(",") if _light != ""],
+                          "properties": _properties}
+    return list(_services.values())
+
+
+class ControllerRegistry:
+  """
+  Class that keeps the controllers that were found on the network in a JSON file, so that the apps can talk to
+  them right away at the next start, while the network gets browsed again in the background.
+  """
+
+  def __init__(self, path: str=None):
+    """ Constructor loading the registry file (if there is one).
+
+    Arguments:
+      path (str): the registry file (default=None -> only keep the controllers in memory);
+    """
+    self._path=path
+    self._controllers={}          # instance name -> {"url": .., "lights": [..]}
+    self._lock=threading.Lock()
+    if path is not None and os.path.exists(path):
+      try:
+        with open(path, "r") as _file:
+          self._controllers=json.load(_file)
+      except (OSError, ValueError):
+        self._controllers={}
+
+  @property
+  def controllers(self) -> list:
+    """ Return the urls of the controllers in the registry. """
+    with self._lock:
+      return [_controller["url"] for _controller in self._controllers.values()]
+
+  def get(self, name: str) -> dict:
+    """ Return a controller ({"url": .., "lights": [..]}) by its instance name (None if it's not in the registry). """
+    with self._lock:
+      return self._controllers.get(name)
+
+  def update(self, services: list) -> tuple:
+    """ Save the controllers that were found by a ServiceBrowser.  Return the urls of the controllers that are new
+    or got a new address, and the old urls of the controllers that moved.
+    """
+    _new=[]
+    _moved=[]
+    _changed=False
+    with self._lock:
+      for _service in services:
+        _controller=self._controllers.get(_service["name"])
+        if _controller is not None and _controller["url"] == _service["url"] and _controller["lights"] == _service["lights"]:
+          continue
+        if _controller is None or _controller["url"] != _service["url"]:
+          _new.append(_service["url"])
+          if _controller is not None:
+            _moved.append(_controller["url"])
+        self._controllers[_service["name"]]={"url": _service["url"], "lights": _service["lights"]}
+        _changed=True
+      if _changed and self._path is not None:
+        try:
+          with open(self._path + ".tmp", "w") as _file:
+            json.dump(self._controllers, _file)
+          os.replace(self._path + ".tmp", self._path)
+        except OSError:
+          pass
+    return _new, _moved
+
+
+class LightsClient:
+  """
+  Class that runs the HTTP client on an asyncio event loop in a background thread.  The methods can be called
+  from the UI thread: they return right away with a concurrent.futures.Future and the callbacks are called from
+  the background thread when the answer comes in (the UI framework needs to take it from there to its own thread).
+  """
+
+  def __init__(self, cachePath: str=None, timeout: float=3, timeouts: dict=None, maxRate: float=10, registryPath: str=None):
+    """ Constructor starting the background event loop.
+
+    Arguments:
+      cachePath (str): the file with the last known state of the lights (default=None -> no file);
+      registryPath (str): the file with the controllers that were found on the network (default=None -> no file);
+      timeout (float): the default number of seconds that a request may take (default=3);
+      timeouts (dict): host -> number of seconds, for the hosts that need another timeout (default=None);
+      maxRate (float): the maximum number of commands per second that send() sends to a light (default=10);
+    """
+    self._cache=StateCache(cachePath)
+    self._http=HttpClient(timeout=timeout, timeouts=timeouts)
+    self._sender=CommandSender(self._http, self._cache, maxRate=maxRate)
+    self._registry=ControllerRegistry(registryPath)
+    self._browser=ServiceBrowser()
+    self._browsing=None
+    self._closed=False
+    self._loop=asyncio.new_event_loop()
+    self._thread=threading.Thread(target=self._loop.run_forever, name="LightsClient", daemon=True)
+    self._thread.start()
+
+  @property
+  def http(self) -> HttpClient:
+    """ Return the HTTP client (only to be used from the background event loop). """
+    return self._http
+
+  @property
+  def registry(self) -> ControllerRegistry:
+    """ Return the registry with the controllers that were found on the network. """
+    return self._registry
+
+  @property
+  def sender(self) -> CommandSender:
+    """ Return the sender of the commands (only to be used from the background event loop). """
+    return self._sender
+
+  @property
+  def cache(self) -> StateCache:
+    """ Return the cache with the last known state of the lights. """
+    return self._cache
+
+  def submit(self, coroutine):
+    """ Run a coroutine on the background event loop and return its concurrent.futures.Future. """
+    return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+  def cached(self, url: str) -> dict:
+    """ Return the last known state of a light (None if it was never fetched). """
+    return self._cache.get(url)
+
+  def controllers(self, known: list=None) -> list:
+    """ Return the urls of the controllers in the registry, followed by the known controllers that are not in it.
+
+    Arguments:
+      known (list): the urls of controllers that the app knows about (default=None);
+    """
+    _controllers=self._registry.controllers
+    for _controller in known or []:
+      if not _controller in _controllers:
+        _controllers.append(_controller)
+    return _controllers
+
+  async def _browse(self, callback=None, interval: float=None):
+    """ Browse the network for controllers (every 'interval' seconds). """
+    while True:
+      try:
+        _new, _moved=self._registry.update(await self._browser.browse())
+      except OSError as exc:
+        # No network (yet).  Try again later:
+        self._http.log(f"can't browse the network: {exc}", debug=True)
+      else:
+        # The lights of the controllers that moved are in the cache under their old url:
+        for _url in self.cachedUrls(_moved):
+          self._cache.remove(_url)
+        if (len(_new) > 0 or len(_moved) > 0) and callback is not None:
+          callback(_new, _moved)
+      if interval is None:
+        return
+      await asyncio.sleep(interval)
+
+  def browse(self, callback=None, interval: float=None):
+    """ Look for controllers on the local network (mDNS) in the background and save them in the registry.
+    Returns a Future.
+
+    Arguments:
+      callback: optional function(new, moved) that is called from the background thread when controllers were found
+                that are not in the registry yet or that got a new address, with the urls of those controllers and the
+                old urls of the controllers that moved;
+      interval (float): keep looking every so many seconds (default=None -> look once);
+    """
+    _future=self.submit(self._browse(callback, interval))
+    if interval is not None:
+      if self._browsing is not None:
+        self._browsing.cancel()
+      self._browsing=_future
+    return _future
+
+  def cachedUrls(self, controllers: list) -> list:
+    """ Return the urls of the lights of a number of controllers that are in the cache. """
+    _prefixes=tuple(_controller.rstrip("/") + "/light/" for _controller in controllers)
+    return [_url for _url in self._cache.urls if _url.startswith(_prefixes)]
+
+  async def _fetch(self, url: str, callback=None):
+    """ Fetch the state of a light, save it in the cache and pass it (or the exception) to the callback. """
+    try:
+      _light=(await self._http.getJSON(url))["light"]
+    except Exception as exc:
+      _light=exc
+    else:
+      self._cache.put(url, _light)
+    if callback is not None:
+      callback(url, _light)
+    return _light
+
+  async def _fetchAll(self, urls: list, callback=None) -> dict:
+    _lights=await asyncio.gather(*[self._fetch(_url, callback) for _url in urls])
+    return dict(zip(urls, _lights))
+
+  def fetch(self, url: str, callback=None):
+    """ Fetch the state of a light in the background.  Returns a Future with the state (or the exception).
+
+    Arguments:
+      url (str): the '/light/<name>' url of the light;
+      callback: optional function(url, state) that is called with the state or the exception;
+    """
+    return self.submit(self._fetch(url, callback))
+
+  async def _discover(self, controller: str, callback=None) -> dict:
+    """ Get the lights of a controller and fetch their state. """
+    try:
+      _lights=(await self._http.getJSON(controller.rstrip("/") + "/lights"))["lights"]
+    except Exception as exc:
+      if callback is not None:
+        callback(controller, exc)
+      return {}
+    _urls=[_light["uri"] for _light in _lights]
+    # Forget the lights that the controller doesn't have anymore:
+    for _url in self.cachedUrls([controller]):
+      if not _url in _urls:
+        self._cache.remove(_url)
+        if callback is not None:
+          callback(_url, None)
+    return await self._fetchAll(_urls, callback)
+
+  async def _discoverAll(self, controllers: list, callback=None) -> dict:
+    _found={}
+    for _lights in await asyncio.gather(*[self._discover(_controller, callback) for _controller in controllers]):
+      _found.update(_lights)
+    return _found
+
+  def discover(self, controllers: list, callback=None):
+    """ Find the lights of a number of controllers (through their '/lights' endpoint) and fetch their state.
+    All the controllers and lights are queried at the same time.  Returns a Future with a dictionary of
+    url -> state (or the exception) of the lights that were found.
+
+    Arguments:
+      controllers (list): the base url of each controller ('http://<host>:<port>');
+      callback: optional function(url, state) that is called for each light as soon as it answers.  Also called
+                with the url of a controller and the exception if the controller doesn't answer, and with None
+                as state for the lights in the cache that the controller doesn't have anymore;
+    """
+    return self.submit(self._discoverAll(list(controllers), callback))
+
+  def fetchAll(self, urls: list, callback=None):
+    """ Fetch the state of a number of lights at the same time.  Returns a Future with a dictionary of
+    url -> state (or the exception for the lights that didn't answer).  The callback is called for each light
+    as soon as it answers, so fast controllers don't wait for slow ones.
+    """
+    return self.submit(self._fetchAll(list(urls), callback))
+
+  async def _post(self, url: str, payload: dict, callback=None):
+    try:
+      _response=await self._http.postJSON(url, payload)
+      _light=_response.get("light")
+      if _light is not None:
+        self._cache.put(url, _light)
+      _result=_response
+    except Exception as exc:
+      _result=exc
+    if callback is not None:
+      callback(url, _result)
+    return _result
+
+  def post(self, url: str, payload: dict, callback=None):
+    """ POST a JSON payload to a light in the background over a pooled keep-alive connection.  Returns a Future
+    with the JSON response (or the exception).  The state in the response goes into the cache.
+    """
+    return self.submit(self._post(url, payload, callback))
+
+  def send(self, url: str, payload: dict, callback=None, replace: bool=True):
+    """ Send a command to a light in the background, latest-wins (see CommandSender).  Returns right away.
+    Use this for the updates of the UI controls that fire many times per second (sliders, color pickers, ...).
+
+    Arguments:
+      url (str): the '/light/<name>' url of the light;
+      payload (dict): the JSON payload;
+      callback: optional function(url, response) that is called with the JSON response or the exception;
+                (only for the newest command of the light)
+      replace (bool): False for commands that always need to be sent, like a toggle (default=True);
+    """
+    self._loop.call_soon_threadsafe(self._sender.queue, url, payload, callback, replace)
+
+  def close(self):
+    """ Close the connections and stop the background event loop. """
+    if self._closed:
+      return
+    self._closed=True
+    if self._browsing is not None:
+      self._browsing.cancel()
+    self.submit(self._http.close()).result(5)
+    self._loop.call_soon_threadsafe(self._loop.stop)